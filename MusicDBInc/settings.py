@@ -13,8 +13,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -28,8 +31,55 @@ ALLOWED_HOSTS = ['*']
 SECRET_KEY = 'django-insecure-session-key'
 
 # For our API, we will explicitly allow unauthenticated users
+# ?format= is an album filter, so renderer selection uses the Accept header
+# or the router's .json suffix instead of the query parameter.
+# Throttles are token buckets (dottify.throttling): "ip" and "user" apply to
+# every API view, the others to views with a matching throttle_scope.
+# NUM_PROXIES is how many trusted proxies append to X-Forwarded-For; with 0
+# the "ip" bucket is keyed on the peer address and the header is ignored.
 REST_FRAMEWORK = {
-    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny']}
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'URL_FORMAT_OVERRIDE': None,
+    'NUM_PROXIES': int(os.environ.get('DOTTIFY_NUM_PROXIES', '0')),
+    'DEFAULT_THROTTLE_CLASSES': [
+        'dottify.throttling.IPBucketThrottle',
+        'dottify.throttling.UserBucketThrottle',
+        'dottify.throttling.ScopedBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'ip': '600/min',
+        'user': '1200/min',
+        'songs': '300/min',
+        'albums': '300/min',
+        'comments': '300/min',
+        'ratings': '300/min',
+        'uploads': '600/min',
+        'statistics': '60/min',
+    },
+    # MessagePack is only offered when the msgpack package is installed.
+    'DEFAULT_RENDERER_CLASSES': [
+        'dottify.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'dottify.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'dottify.renderers.MessagePackParser',
+    ],
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS':
+        'dottify.renderers.AvailableContentNegotiation',
+}
+# Render API JSON with orjson when it is installed
+DOTTIFY_FAST_JSON = True
+# Build API list responses from .values_list() (dottify/readers.py)
+DOTTIFY_VALUES_READS = True
+DOTTIFY_THROTTLE_STORE = 'auto'
+# Throttle buckets when the cache is process-local (dottify/throttling.py)
+DOTTIFY_THROTTLE_SQLITE_PATH = BASE_DIR / 'throttle.sqlite3'
+# Tests keep the throttle buckets and other state in a temp directory
+TEST_RUNNER = 'dottify.testing.DottifyTestRunner'
 
 # Application definition
 
@@ -49,28 +99,87 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'dottify.middleware.MetricsMiddleware',
+    'dottify.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'dottify.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'dottify.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'MusicDBInc.urls'
 
+# Process roles: DOTTIFY_PROCESS_ROLE picks the apps, middleware and URLs a
+# process loads, so API workers and commands start without the admin,
+# data_wizard and crispy forms. "web" loads everything, "api" serves the
+# /api/ routes, "worker" runs flush_ratings, rank_albums and process_audio,
+# and "cli" runs the other dottify commands and collectstatic. migrate and
+# the admin commands need "web". report_import_time compares their startup.
+DOTTIFY_PROCESS_ROLE = os.environ.get('DOTTIFY_PROCESS_ROLE', 'web')
+WEB_ONLY_APPS = [
+    'django.contrib.admin',
+    'django.contrib.messages',
+    'data_wizard',
+    'data_wizard.sources',
+    'crispy_forms',
+    'crispy_bootstrap5',
+]
+ROLE_EXCLUDED_APPS = {
+    'web': [],
+    'api': WEB_ONLY_APPS,
+    'worker': WEB_ONLY_APPS + [
+        'django.contrib.sessions',
+        'django.contrib.staticfiles',
+        'rest_framework',
+    ],
+    'cli': WEB_ONLY_APPS,
+}
+if DOTTIFY_PROCESS_ROLE not in ROLE_EXCLUDED_APPS:
+    raise ImproperlyConfigured(
+        f'Unknown DOTTIFY_PROCESS_ROLE {DOTTIFY_PROCESS_ROLE!r}'
+    )
+if DOTTIFY_PROCESS_ROLE != 'web':
+    INSTALLED_APPS = [
+        app for app in INSTALLED_APPS
+        if app not in ROLE_EXCLUDED_APPS[DOTTIFY_PROCESS_ROLE]
+    ]
+    ROOT_URLCONF = 'dottify.api_urls'
+if DOTTIFY_PROCESS_ROLE == 'worker':
+    ROOT_URLCONF = 'dottify.worker_urls'
+if DOTTIFY_PROCESS_ROLE == 'api':
+    MIDDLEWARE = [
+        m for m in MIDDLEWARE
+        if m != 'django.contrib.messages.middleware.MessageMiddleware'
+    ]
+elif DOTTIFY_PROCESS_ROLE in ('worker', 'cli'):
+    # Commands do not serve requests.
+    MIDDLEWARE = []
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
+        'APP_DIRS': False,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Parsed templates stay in memory whatever DEBUG is; in
+            # development the autoreloader empties the cache when a
+            # template changes. precompile_templates fills it at boot.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -81,12 +190,39 @@ WSGI_APPLICATION = 'MusicDBInc.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# ratings_1 is a spare shard for ratings and comments (dottify/sharding.py).
+# It is only used once listed in DOTTIFY_RATING_SHARDS; run
+# "migrate --database ratings_1" and then "rebalance_shards" after adding it.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    'ratings_1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'ratings_1.sqlite3',
+    },
 }
+DATABASE_ROUTERS = ['dottify.sharding.ShardRouter']
+DOTTIFY_RATING_SHARDS = ['default']
+# Write-behind rating log (dottify/ingest.py), applied by flush_ratings.
+# Must be a directory that survives reboots and only this app can write to.
+DOTTIFY_RATING_LOG_DIR = BASE_DIR / 'rating_log'
+DOTTIFY_RATING_FLUSH_ROWS = 500
+DOTTIFY_RATING_FLUSH_MS = 200
+# POST /api/albums/<id>/ratings/ appends to the log instead of the database
+DOTTIFY_RATING_WRITE_BEHIND = False
+# Largest list accepted by the batch write endpoints
+DOTTIFY_API_BATCH_SIZE = 500
+DOTTIFY_COMMENT_PAGE_SIZE = 20
+# Longest time a cached user page can show renamed songs and albums
+DOTTIFY_PROFILE_CACHE_SECONDS = 300
+# runprefork (dottify/prefork.py)
+DOTTIFY_PREFORK_WORKERS = 4
+DOTTIFY_PREFORK_MAX_REQUESTS = 1000
+# Seconds a connection may stall before a worker drops it. runprefork is
+# not internet-facing; run it behind a buffering reverse proxy.
+DOTTIFY_PREFORK_TIMEOUT = 30
 
 
 # Password validation
@@ -138,10 +274,32 @@ LOCALE_PATHS = [BASE_DIR / 'dottify' / 'locale']
 # Static files
 STATIC_ROOT = BASE_DIR / 'static/'
 STATIC_URL = 'static/'
+# collectstatic writes hashed names plus .gz/.br copies (dottify/assets.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'dottify.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+# Browser cache lifetime for hashed static files
+DOTTIFY_STATIC_MAX_AGE = 365 * 24 * 3600
 
 # Media for uploaded files
 MEDIA_ROOT = BASE_DIR / 'media/'
 MEDIA_URL = 'media/'
+# None serves media from Django (dottify/media.py); "x-accel" (nginx) or
+# "x-sendfile" (Apache) hands the transfer to the proxy
+DOTTIFY_MEDIA_OFFLOAD = None
+DOTTIFY_MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Chunked Song.audio uploads (dottify/audio.py), checked by process_audio.
+# Unfinished uploads are kept here; only this app should be able to write.
+DOTTIFY_AUDIO_UPLOAD_DIR = BASE_DIR / 'audio_uploads'
+DOTTIFY_AUDIO_MAX_BYTES = 200 * 1024 * 1024
+DOTTIFY_AUDIO_UPLOAD_EXPIRY_HOURS = 24
+# Largest allowed difference, in seconds, between the file and Song.length
+DOTTIFY_AUDIO_LENGTH_TOLERANCE = 2
 
 # Set up for simple Bootstrap theming
 CRISPY_ALLOWED_TEMPLATE_PACKS = 'bootstrap5'
@@ -154,6 +312,15 @@ MESSAGE_TAGS = {
     messages.ERROR: 'alert-danger'
 }
 
+# Per-request SQL instrumentation (dottify.middleware), on 1% of requests
+DOTTIFY_SQL_SAMPLE_RATE = 0.01
+DOTTIFY_SLOW_REQUEST_MS = 500
+
+# /metrics (dottify.metrics); set DOTTIFY_METRICS_DIR for multi-worker servers
+# Only staff may read it, or a scraper sending this as a bearer token
+DOTTIFY_METRICS_TOKEN = os.environ.get('DOTTIFY_METRICS_TOKEN')
+DOTTIFY_METRICS_DIR = None
+
 # Account redirects
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_REDIRECT_URL = '/'
@@ -13,4 +13,10 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MusicDBInc.settings')
 
-application = get_wsgi_application()
+# Sets Django up, so it must come before anything that imports models.
+django_application = get_wsgi_application()
+
+# Static files are served before Django sees the request (dottify/assets.py).
+from dottify.assets import StaticFiles  # noqa: E402
+
+application = StaticFiles(django_application)
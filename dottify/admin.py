@@ -1,6 +1,15 @@
 # dottify/admin.py
+import json
+
 from django.contrib import admin
-from .models import Album, Song, Playlist, DottifyUser, Rating, Comment
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .models import (
+    Album, Song, Playlist, DottifyUser, Rating, Comment, AlbumRanking,
+    RequestProfile
+)
 
 
 @admin.register(Album)
@@ -36,3 +45,77 @@ class RatingAdmin(admin.ModelAdmin):
 class CommentAdmin(admin.ModelAdmin):
     list_display = ("album", "user", "comment_text")
     search_fields = ("comment_text",)
+
+
+@admin.register(AlbumRanking)
+class AlbumRankingAdmin(admin.ModelAdmin):
+    list_display = ("board", "rank", "album", "score", "computed_at")
+    list_filter = ("board",)
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        "created_at", "method", "path", "status_code", "duration_ms",
+        "query_count", "user", "downloads"
+    )
+    list_filter = ("view_name",)
+    exclude = ("stats",)
+    readonly_fields = (
+        "created_at", "expires_at", "user", "method", "path", "view_name",
+        "status_code", "duration_ms", "query_count", "sql"
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path(
+                "<int:pk>/pstats/",
+                self.admin_site.admin_view(self.download_pstats),
+                name="dottify_requestprofile_pstats"
+            ),
+            path(
+                "<int:pk>/speedscope/",
+                self.admin_site.admin_view(self.download_speedscope),
+                name="dottify_requestprofile_speedscope"
+            ),
+        ]
+        return urls + super().get_urls()
+
+    @admin.display(description="Download")
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">pstats</a> | <a href="{}">speedscope</a>',
+            reverse("admin:dottify_requestprofile_pstats", args=[obj.pk]),
+            reverse("admin:dottify_requestprofile_speedscope", args=[obj.pk])
+        )
+
+    def download_pstats(self, request, pk):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(
+            bytes(profile.stats),
+            content_type="application/octet-stream"
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="profile-{pk}.pstats"'
+        )
+        return response
+
+    def download_speedscope(self, request, pk):
+        # Imported here: only needed for downloads, not admin startup.
+        from .profiling import to_speedscope
+
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(
+            json.dumps(to_speedscope(profile)),
+            content_type="application/json"
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="profile-{pk}.speedscope.json"'
+        )
+        return response
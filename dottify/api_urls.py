@@ -0,0 +1,48 @@
+# The API routes. dottify.urls includes them for the web role, and the
+# api and cli roles (see settings.py) use this module as their
+# ROOT_URLCONF, so they never import the admin or data_wizard URLs.
+
+from django.urls import path, include
+from rest_framework_nested import routers
+
+from .api_views import (
+    AlbumViewSet,
+    AudioUploadViewSet,
+    SongViewSet,
+    PlaylistViewSet,
+    NestedSongViewSet,
+    NestedCommentViewSet,
+    NestedRatingViewSet,
+    StatisticsAPIView
+)
+from .views import metrics_view
+
+router = routers.DefaultRouter()
+router.register(r'albums', AlbumViewSet, basename="album")
+router.register(r'songs', SongViewSet, basename="song")
+router.register(r'playlists', PlaylistViewSet, basename="playlist")
+router.register(r'uploads', AudioUploadViewSet, basename="upload")
+
+album_router = routers.NestedSimpleRouter(router, r'albums', lookup='album')
+album_router.register(r'songs', NestedSongViewSet, basename='album_songs')
+album_router.register(
+    r'comments',
+    NestedCommentViewSet,
+    basename='album_comments_api'
+)
+album_router.register(
+    r'ratings',
+    NestedRatingViewSet,
+    basename='album_ratings_api'
+)
+
+urlpatterns = [
+    path(
+        "api/statistics/",
+        StatisticsAPIView.as_view(),
+        name="api-statistics"
+        ),
+    path("metrics", metrics_view, name="metrics"),
+    path("api/", include(router.urls)),
+    path("api/", include(album_router.urls)),
+]
@@ -1,42 +1,380 @@
 # Use this file for your API viewsets only
 # E.g., from rest_framework import ...
 
-from rest_framework import viewsets
-from .serializers import AlbumSerializer, SongSerializer, PlaylistSerializer
-from .models import Album, Song, Playlist, DottifyUser
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import (
+    NotFound,
+    PermissionDenied,
+    ValidationError
+)
+from rest_framework.permissions import (
+    SAFE_METHODS,
+    IsAuthenticated,
+    IsAuthenticatedOrReadOnly
+)
+from .serializers import (
+    AlbumSerializer,
+    AlbumRankingSerializer,
+    AudioUploadSerializer,
+    CommentSerializer,
+    SimilarSongSerializer,
+    SongSerializer,
+    PlaylistSerializer,
+    RatingSerializer
+)
+from .models import (
+    Album,
+    AudioUpload,
+    Comment,
+    Song,
+    Playlist,
+    DottifyUser
+)
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.views import APIView
-from django.db.models import Avg
+from django.db.models import Avg, Prefetch
+from rest_framework.utils.urls import replace_query_param
+from .audio import OffsetMismatch, discard, start_upload, write_chunk
+from .comments import comment_page, parse_cursor
+from .ingest import buffer_ratings, record_ratings
+from .filters import FieldFilter, IndexedOrderingFilter, SparseFieldsFilter
+from .rankings import LEADERBOARD_SIZE, TRENDING_WINDOWS, leaderboard
+from .readers import AlbumReader, PlaylistReader, SongReader, ValuesListMixin
+from .recommendations import similar_songs
+from .permissions import (
+    MusicOwnerPermission,
+    can_edit_album,
+    editable_albums,
+    editable_songs
+)
+from .roles import is_artist, is_admin, user_profile
+from .throttling import ThrottleFirstMixin
 
 # Create your views here.
 
 
-class AlbumViewSet(viewsets.ModelViewSet):
+API_FILTER_BACKENDS = [FieldFilter, IndexedOrderingFilter, SparseFieldsFilter]
+RANGE = ["gte", "lte"]
+
+
+class OwnedQuerysetMixin(ThrottleFirstMixin):
+    # Writes, and reads with ?editable=true, only see rows the user may
+    # edit, so ownership is checked in SQL rather than per object.
+    permission_classes = [MusicOwnerPermission]
+    editable_filter = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if (
+            self.request.method not in SAFE_METHODS
+            or self.request.query_params.get("editable") == "true"
+        ):
+            queryset = self.editable_filter(self.request.user, queryset)
+        return queryset
+
+    def check_album(self, album):
+        if not can_edit_album(self.request.user, album):
+            raise PermissionDenied("You can only use your own albums.")
+
+
+class AlbumViewSet(
+    ValuesListMixin, OwnedQuerysetMixin, viewsets.ModelViewSet
+):
     queryset = Album.objects.all()
     serializer_class = AlbumSerializer
+    reader_class = AlbumReader
+    editable_filter = staticmethod(editable_albums)
+    throttle_scope = "albums"
+    filter_backends = API_FILTER_BACKENDS
+    filter_fields = {
+        "artist_name": ["exact"],
+        "format": ["exact"],
+        "release_date": RANGE,
+        "retail_price": RANGE,
+        "song_count": RANGE,
+        "total_length": RANGE,
+        "rating_count": RANGE,
+        "rating_sum": RANGE,
+    }
+    ordering_fields = [
+        "id", "title", "artist_name", "release_date", "retail_price",
+        "song_count", "total_length", "rating_count", "rating_sum"
+    ]
+
+    def perform_create(self, serializer):
+        user = self.request.user
+        if is_artist(user) and not is_admin(user):
+            profile = user_profile(user)
+            if profile is None:
+                raise PermissionDenied("Artist profile missing.")
+            serializer.save(artist_account=profile)
+        else:
+            serializer.save()
+
+    def leaderboard_response(self, request, board):
+        try:
+            limit = int(request.query_params.get("limit", LEADERBOARD_SIZE))
+        except ValueError:
+            raise ValidationError("limit must be an integer.")
+        limit = max(1, min(limit, LEADERBOARD_SIZE))
+        serializer = AlbumRankingSerializer(
+            leaderboard(board, limit),
+            many=True
+        )
+        return Response(serializer.data)
 
+    @action(detail=False)
+    def top(self, request):
+        return self.leaderboard_response(request, "top")
 
-class SongViewSet(viewsets.ModelViewSet):
+    @action(detail=False)
+    def trending(self, request):
+        window = request.query_params.get("window", "7")
+        board = f"trending_{window}"
+        if board not in TRENDING_WINDOWS:
+            raise ValidationError("window must be 7 or 30.")
+        return self.leaderboard_response(request, board)
+
+
+class SongViewSet(
+    ValuesListMixin, OwnedQuerysetMixin, viewsets.ModelViewSet
+):
     queryset = Song.objects.all()
     serializer_class = SongSerializer
+    reader_class = SongReader
+    editable_filter = staticmethod(editable_songs)
+    throttle_scope = "songs"
+    filter_backends = API_FILTER_BACKENDS
+    filter_fields = {
+        "album": ["exact"],
+        "length": RANGE,
+    }
+    ordering_fields = ["id", "length"]
+
+    def perform_create(self, serializer):
+        self.check_album(serializer.validated_data["album"])
+        serializer.save()
+
+    def perform_update(self, serializer):
+        album = serializer.validated_data.get("album")
+        if album is not None:
+            self.check_album(album)
+        serializer.save()
 
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        songs = similar_songs(self.get_object().pk)
+        serializer = SimilarSongSerializer(songs, many=True)
+        return Response(serializer.data)
 
-class PlaylistViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=True, methods=["post"])
+    def audio(self, request, pk=None):
+        # Starts a chunked upload; the chunks go to the upload's URL.
+        song = self.get_object()
+        serializer = AudioUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = start_upload(
+                song, request.user, **serializer.validated_data
+            )
+        except DjangoValidationError as exc:
+            raise ValidationError(exc.message_dict)
+        location = reverse(
+            "upload-detail", kwargs={"pk": upload.pk}, request=request
+        )
+        return Response(
+            AudioUploadSerializer(upload).data,
+            status=status.HTTP_201_CREATED,
+            headers={"Location": location}
+        )
+
+
+class PlaylistViewSet(
+    ValuesListMixin, ThrottleFirstMixin, viewsets.ReadOnlyModelViewSet
+):
     serializer_class = PlaylistSerializer
+    reader_class = PlaylistReader
+    filter_backends = API_FILTER_BACKENDS
+    ordering_fields = ["id", "created_at"]
 
     def get_queryset(self):
-        return Playlist.objects.filter(visibility=2)
+        return (
+            Playlist.objects.filter(visibility=2)
+            .select_related("owner")
+            .prefetch_related(
+                Prefetch("songs", queryset=Song.objects.only("id"))
+            )
+        )
 
 
-class NestedSongViewSet(viewsets.ReadOnlyModelViewSet):
+class NestedSongViewSet(
+    ValuesListMixin, ThrottleFirstMixin, viewsets.ReadOnlyModelViewSet
+):
     serializer_class = SongSerializer
+    reader_class = SongReader
+    throttle_scope = "songs"
+    filter_backends = API_FILTER_BACKENDS
+    filter_fields = {"length": RANGE}
+    ordering_fields = ["id", "length"]
 
     def get_queryset(self):
         album_id = self.kwargs['album_pk']
         return Song.objects.filter(album_id=album_id)
 
 
-class StatisticsAPIView(APIView):
+class AlbumChildMixin(ThrottleFirstMixin):
+    # Endpoints under /api/albums/<album_pk>/. Writes take one object or a
+    # list of up to DOTTIFY_API_BATCH_SIZE objects.
+
+    def get_album_id(self):
+        try:
+            album_id = int(self.kwargs["album_pk"])
+        except ValueError:
+            raise NotFound()
+        if not Album.objects.filter(pk=album_id).exists():
+            raise NotFound()
+        return album_id
+
+    def get_items(self, request):
+        data = request.data
+        if not isinstance(data, list):
+            return [data], False
+        limit = getattr(settings, "DOTTIFY_API_BATCH_SIZE", 500)
+        if not data or len(data) > limit:
+            raise ValidationError(
+                f"Send between 1 and {limit} items at a time."
+            )
+        return data, True
+
+
+class NestedCommentViewSet(AlbumChildMixin, viewsets.GenericViewSet):
+    # Newest first, in keyset pages: "next" continues with ?before=<id>.
+    serializer_class = CommentSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    throttle_scope = "comments"
+
+    def list(self, request, album_pk=None):
+        try:
+            before = parse_cursor(request.query_params.get("before"))
+        except ValueError:
+            raise ValidationError("Cursor must be an id.")
+        album_id = self.get_album_id()
+        comments, next_cursor = comment_page(album_id, before)
+        next_url = None
+        if next_cursor is not None:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), "before", next_cursor
+            )
+        return Response({
+            "next": next_url,
+            "results": self.get_serializer(comments, many=True).data,
+        })
+
+    def create(self, request, album_pk=None):
+        profile = user_profile(request.user)
+        if profile is None:
+            raise PermissionDenied("Only Dottify users can comment.")
+        album_id = self.get_album_id()
+        items, many = self.get_items(request)
+        serializer = self.get_serializer(
+            data=items if many else items[0],
+            many=many
+        )
+        serializer.is_valid(raise_exception=True)
+        validated = serializer.validated_data if many else [
+            serializer.validated_data
+        ]
+        comments = Comment.objects.bulk_create([
+            Comment(album_id=album_id, user=profile, **data)
+            for data in validated
+        ])
+        data = self.get_serializer(comments, many=True).data
+        return Response(
+            data if many else data[0],
+            status=status.HTTP_201_CREATED
+        )
+
+
+class NestedRatingViewSet(AlbumChildMixin, viewsets.GenericViewSet):
+    # Adds ratings and updates the album summary once per request. With
+    # DOTTIFY_RATING_WRITE_BEHIND the ratings go to the log in ingest.py
+    # and the response is 202 Accepted.
+    serializer_class = RatingSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "ratings"
+
+    def create(self, request, album_pk=None):
+        album_id = self.get_album_id()
+        items, many = self.get_items(request)
+        values = [
+            item.get("stars") if isinstance(item, dict) else None
+            for item in items
+        ]
+        write_behind = getattr(settings, "DOTTIFY_RATING_WRITE_BEHIND", False)
+        try:
+            if write_behind:
+                count = buffer_ratings([(album_id, v) for v in values])
+            else:
+                count = record_ratings(album_id, values)
+        except DjangoValidationError as exc:
+            errors = exc.message_dict
+            raise ValidationError(errors if many else {"stars": errors["0"]})
+        return Response(
+            {"accepted": count},
+            status=(
+                status.HTTP_202_ACCEPTED if write_behind
+                else status.HTTP_201_CREATED
+            )
+        )
+
+
+class AudioUploadViewSet(
+    ThrottleFirstMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet
+):
+    # GET (or HEAD) reports the offset to resume from. PATCH appends the
+    # raw request body at the Upload-Offset header; a body that ends early
+    # is kept and the client resumes from the returned offset. 409 means
+    # the offset is stale. DELETE cancels the upload.
+    serializer_class = AudioUploadSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "uploads"
+
+    def get_queryset(self):
+        return AudioUpload.objects.filter(user=self.request.user)
+
+    def partial_update(self, request, pk=None):
+        upload = self.get_object()
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers["Content-Length"])
+        except (KeyError, ValueError):
+            raise ValidationError(
+                "Send Upload-Offset and Content-Length headers."
+            )
+        try:
+            write_chunk(upload, offset, request.stream, length)
+        except OffsetMismatch as exc:
+            return Response(
+                {"received": exc.offset},
+                status=status.HTTP_409_CONFLICT
+            )
+        except DjangoValidationError as exc:
+            raise ValidationError(exc.messages)
+        return Response(self.get_serializer(upload).data)
+
+    def perform_destroy(self, instance):
+        discard(instance)
+
+
+class StatisticsAPIView(ThrottleFirstMixin, APIView):
+    throttle_scope = "statistics"
 
     def get(self, request, format=None):
         agg = Song.objects.aggregate(avg_len=Avg("length"))
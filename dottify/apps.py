@@ -1,6 +1,12 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
 
 
 class DottifyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dottify'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+
+        if apps.is_installed("data_wizard"):
+            signals.connect_import_signals()
@@ -0,0 +1,151 @@
+# Static asset pipeline.
+#
+# collectstatic stores every file under a content-hashed name (through
+# Django's ManifestStaticFilesStorage) and writes .gz, and .br when the
+# brotli package is installed, next to each compressible file. The
+# StaticFiles WSGI wrapper in MusicDBInc/wsgi.py serves STATIC_URL
+# straight from STATIC_ROOT, so asset requests never reach Django's
+# middleware or views. It picks the smallest variant the client accepts,
+# and hashed names are cached by browsers for DOTTIFY_STATIC_MAX_AGE.
+
+import gzip
+import json
+import mimetypes
+import posixpath
+from email.utils import formatdate
+from pathlib import Path
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+from .middleware import parse_accept_encoding
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = (
+    ".css", ".js", ".json", ".map", ".svg", ".txt", ".html", ".xml",
+    ".ttf", ".eot", ".otf",
+)
+MIN_SIZE = 200
+
+
+def compressed_variants(path):
+    # Writes path.gz (and path.br) unless compression saves under 5%.
+    path = Path(path)
+    data = path.read_bytes()
+    if len(data) < MIN_SIZE:
+        return []
+    encoders = [(".gz", lambda d: gzip.compress(d, 9, mtime=0))]
+    if brotli is not None:
+        encoders.append((".br", lambda d: brotli.compress(d)))
+    written = []
+    for suffix, compress in encoders:
+        target = path.with_name(path.name + suffix)
+        if target.exists():
+            continue
+        packed = compress(data)
+        if len(packed) < len(data) * 0.95:
+            target.write_bytes(packed)
+            written.append(target)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE):
+                compressed_variants(self.path(name))
+
+    def stored_name(self, name):
+        # Before collectstatic has run (development, tests) there is no
+        # manifest and names are used as they are.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+
+class StaticFiles:
+    encodings = (("br", ".br"), ("gzip", ".gz"))
+
+    def __init__(self, application, root=None, prefix=None, max_age=None):
+        self.application = application
+        self.root = Path(root or settings.STATIC_ROOT).resolve()
+        self.prefix = "/" + (prefix or settings.STATIC_URL).strip("/") + "/"
+        self.max_age = max_age or getattr(
+            settings, "DOTTIFY_STATIC_MAX_AGE", 365 * 24 * 3600
+        )
+        self.hashed = self.load_manifest()
+
+    def load_manifest(self):
+        try:
+            manifest = json.loads(
+                (self.root / "staticfiles.json").read_text()
+            )
+        except (OSError, ValueError):
+            return set()
+        return set(manifest.get("paths", {}).values())
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if not path.startswith(self.prefix):
+            return self.application(environ, start_response)
+        if environ["REQUEST_METHOD"] not in ("GET", "HEAD"):
+            start_response("405 Method Not Allowed", [("Allow", "GET, HEAD")])
+            return [b""]
+
+        name = posixpath.normpath(unquote(path[len(self.prefix):]))
+        file = self.root / name
+        if name.startswith(("..", "/")) or not file.is_file():
+            start_response("404 Not Found", [("Content-Type", "text/plain")])
+            return [b"Not found"]
+
+        headers = []
+        content_type, _ = mimetypes.guess_type(name)
+        accepted = parse_accept_encoding(
+            environ.get("HTTP_ACCEPT_ENCODING", "")
+        )
+        for encoding, suffix in self.encodings:
+            variant = file.with_name(file.name + suffix)
+            if encoding in accepted and variant.is_file():
+                file = variant
+                headers.append(("Content-Encoding", encoding))
+                break
+        stat = file.stat()
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        if name in self.hashed:
+            cache_control = f"public, max-age={self.max_age}, immutable"
+        else:
+            cache_control = "public, max-age=60"
+        headers += [
+            ("Content-Type", content_type or "application/octet-stream"),
+            ("Cache-Control", cache_control),
+            ("Vary", "Accept-Encoding"),
+            ("ETag", etag),
+            ("Last-Modified", formatdate(stat.st_mtime, usegmt=True)),
+        ]
+        if environ.get("HTTP_IF_NONE_MATCH") == etag:
+            start_response("304 Not Modified", headers)
+            return [b""]
+        headers.append(("Content-Length", str(stat.st_size)))
+        start_response("200 OK", headers)
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return [b""]
+        f = open(file, "rb")
+        wrapper = environ.get("wsgi.file_wrapper")
+        if wrapper is not None:
+            return wrapper(f)
+        return read_chunks(f)
+
+
+def read_chunks(f, size=64 * 1024):
+    with f:
+        while chunk := f.read(size):
+            yield chunk
@@ -0,0 +1,235 @@
+# Resumable audio uploads for Song.audio.
+#
+# start_upload() creates an AudioUpload and an empty part file in
+# DOTTIFY_AUDIO_UPLOAD_DIR. The client then sends the file in any number of
+# chunks, each with the offset it starts at. write_chunk() copies the
+# request body to the part file in blocks as it arrives, so a large upload
+# never sits in a worker's memory. If a chunk is cut short, the client asks
+# for the offset and carries on from there.
+#
+# After the last chunk the upload is "complete". The process_audio command
+# hashes the file, reads its duration and compares it with Song.length,
+# then moves the part file into storage as Song.audio. media.py serves the
+# stored file with range requests.
+
+import fcntl
+import hashlib
+import os
+import re
+import wave
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AudioUpload
+
+try:
+    import mutagen
+except ImportError:
+    mutagen = None
+
+BLOCK_SIZE = 64 * 1024
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class OffsetMismatch(Exception):
+    # The chunk does not start where the upload has got to.
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class PartFile(File):
+    # Lets FileSystemStorage move the part file into place rather than
+    # copying it.
+
+    def temporary_file_path(self):
+        return self.name
+
+
+def upload_dir():
+    # Resumable uploads must survive a reboot, and a shared temp directory
+    # could be taken over by another user, so there is no default here.
+    directory = getattr(settings, "DOTTIFY_AUDIO_UPLOAD_DIR", None)
+    if directory is None:
+        raise ImproperlyConfigured(
+            "Set DOTTIFY_AUDIO_UPLOAD_DIR for audio uploads"
+        )
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def part_path(upload):
+    return upload_dir() / f"{upload.pk}.part"
+
+
+def start_upload(song, user, filename, size, sha256=""):
+    limit = getattr(settings, "DOTTIFY_AUDIO_MAX_BYTES", 200 * 1024 * 1024)
+    filename = os.path.basename(filename)
+    if not filename:
+        raise ValidationError({"filename": "A file name is required"})
+    if not 0 < size <= limit:
+        raise ValidationError(
+            {"size": f"Size must be between 1 and {limit} bytes"}
+        )
+    if sha256 and not SHA256_RE.match(sha256):
+        raise ValidationError({"sha256": "Expected a hex SHA-256 digest"})
+    upload = AudioUpload.objects.create(
+        song=song,
+        user=user,
+        filename=filename,
+        size=size,
+        sha256=sha256,
+    )
+    part_path(upload).touch()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length):
+    # Appends up to length bytes read from stream at offset and returns the
+    # new offset. Raises OffsetMismatch if another chunk got there first.
+    if upload.status != "uploading":
+        raise ValidationError("This upload is not accepting data")
+    if offset + length > upload.size:
+        raise ValidationError(
+            f"Chunk ends after the declared size of {upload.size} bytes"
+        )
+    with open(part_path(upload), "r+b") as part:
+        fcntl.flock(part, fcntl.LOCK_EX)
+        upload.refresh_from_db(fields=["received", "status"])
+        if upload.received != offset:
+            raise OffsetMismatch(upload.received)
+        part.seek(offset)
+        remaining = length
+        while remaining:
+            block = stream.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            part.write(block)
+            remaining -= len(block)
+        part.truncate()
+        part.flush()
+        os.fsync(part.fileno())
+        received = offset + length - remaining
+        status = "complete" if received == upload.size else "uploading"
+        AudioUpload.objects.filter(pk=upload.pk, received=offset).update(
+            received=received, status=status
+        )
+    upload.received, upload.status = received, status
+    return received
+
+
+def audio_duration(path):
+    # Seconds, or None if the format is not recognised. WAV is read with
+    # the standard library; other formats need mutagen.
+    if mutagen is not None:
+        try:
+            info = mutagen.File(path)
+        except mutagen.MutagenError:
+            info = None
+        if info is not None and info.info is not None:
+            return info.info.length
+    try:
+        with wave.open(os.fspath(path), "rb") as audio:
+            return audio.getnframes() / audio.getframerate()
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return None
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def reject(upload, error):
+    part_path(upload).unlink(missing_ok=True)
+    upload.status, upload.error = "rejected", error
+    upload.save(update_fields=["status", "error"])
+
+
+def process_upload(upload):
+    path = part_path(upload)
+    if not path.exists():
+        return reject(upload, "The uploaded file is missing")
+    song = upload.song
+    digest = file_sha256(path)
+    if upload.sha256 and digest != upload.sha256:
+        return reject(upload, "The file does not match its checksum")
+    duration = audio_duration(path)
+    if duration is None:
+        return reject(upload, "Unsupported audio format")
+    tolerance = getattr(settings, "DOTTIFY_AUDIO_LENGTH_TOLERANCE", 2)
+    if abs(duration - song.length) > tolerance:
+        return reject(
+            upload,
+            f"The audio is {duration:.0f}s long but the song is "
+            f"{song.length}s"
+        )
+
+    previous = song.audio.name
+    with open(path, "rb") as f:
+        song.audio.save(upload.filename, PartFile(f), save=False)
+    song.audio_sha256 = digest
+    song.audio_duration = duration
+    with transaction.atomic():
+        song.save()
+        upload.status = "ready"
+        upload.save(update_fields=["status"])
+    if previous and previous != song.audio.name:
+        song.audio.storage.delete(previous)
+
+
+def process_pending(limit=None):
+    # Returns the number of uploads checked.
+    uploads = (
+        AudioUpload.objects.filter(status="complete")
+        .select_related("song")
+        .order_by("created_at")
+    )
+    count = 0
+    for upload in uploads[:limit]:
+        process_upload(upload)
+        count += 1
+    return count
+
+
+def expire_uploads(hours=None):
+    # Deletes uploads that have not finished within the expiry time, and
+    # part files whose upload was deleted along with its song.
+    if hours is None:
+        hours = getattr(settings, "DOTTIFY_AUDIO_UPLOAD_EXPIRY_HOURS", 24)
+    cutoff = timezone.now() - timedelta(hours=hours)
+    stale = AudioUpload.objects.filter(
+        status="uploading", created_at__lt=cutoff
+    )
+    count = 0
+    for upload in stale:
+        discard(upload)
+        count += 1
+    old_parts = {
+        path.stem: path for path in upload_dir().glob("*.part")
+        if path.stat().st_mtime < cutoff.timestamp()
+    }
+    known = AudioUpload.objects.filter(pk__in=old_parts).values_list(
+        "pk", flat=True
+    )
+    for pk in known:
+        old_parts.pop(str(pk), None)
+    for path in old_parts.values():
+        path.unlink(missing_ok=True)
+    return count
+
+
+def discard(upload):
+    part_path(upload).unlink(missing_ok=True)
+    upload.delete()
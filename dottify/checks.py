@@ -0,0 +1,74 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_api_filters_are_indexed(app_configs, **kwargs):
+    # Imported here so that starting a process does not load DRF, and
+    # skipped where DRF is not installed (the worker role), since most
+    # commands run the checks.
+    if not apps.is_installed("rest_framework"):
+        return []
+    from .api_urls import router, album_router
+    from .filters import is_indexed
+
+    errors = []
+    registry = router.registry + album_router.registry
+    for prefix, viewset, basename in registry:
+        model = viewset.serializer_class.Meta.model
+        fields = list(getattr(viewset, "filter_fields", {}))
+        fields += list(getattr(viewset, "ordering_fields", None) or [])
+        for field in fields:
+            if not is_indexed(model, field):
+                errors.append(Error(
+                    f"{viewset.__name__} filters or orders on "
+                    f"{model.__name__}.{field}, which has no index.",
+                    hint="Add an index or remove the field.",
+                    obj=viewset,
+                    id="dottify.E001",
+                ))
+    return errors
+
+
+@register()
+def check_throttle_store(app_configs, **kwargs):
+    # The throttles import DRF, which the worker role does not load.
+    if not apps.is_installed("rest_framework"):
+        return []
+    from .throttling import store_kind
+
+    path = getattr(settings, "DOTTIFY_THROTTLE_SQLITE_PATH", None)
+    if store_kind() == "sqlite" and path is None:
+        return [Error(
+            "The API throttles use the SQLite store but "
+            "DOTTIFY_THROTTLE_SQLITE_PATH is not set.",
+            hint="Point it at a file in a directory only this app can "
+            "write to, or use a shared cache.",
+            id="dottify.E002",
+        )]
+    return []
+
+
+@register()
+def check_rating_log_dir(app_configs, **kwargs):
+    if getattr(settings, "DOTTIFY_RATING_LOG_DIR", None) is None:
+        return [Error(
+            "DOTTIFY_RATING_LOG_DIR is not set.",
+            hint="Point it at a directory that survives reboots and only "
+            "this app can write to.",
+            id="dottify.E003",
+        )]
+    return []
+
+
+@register()
+def check_audio_upload_dir(app_configs, **kwargs):
+    if getattr(settings, "DOTTIFY_AUDIO_UPLOAD_DIR", None) is None:
+        return [Error(
+            "DOTTIFY_AUDIO_UPLOAD_DIR is not set.",
+            hint="Point it at a directory that survives reboots and only "
+            "this app can write to.",
+            id="dottify.E004",
+        )]
+    return []
@@ -0,0 +1,34 @@
+# Keyset pagination for album comments, newest first.
+#
+# A page is the COMMENT_PAGE_SIZE comments with the highest ids below the
+# cursor (?before=<id>), read from the (album, id) index, so every page
+# costs the same however many comments the album has. album_detail inlines
+# the first page; the album_comments fragment and /api/albums/<id>/comments/
+# serve the following ones.
+
+from django.conf import settings
+
+from .models import Comment
+
+COMMENT_PAGE_SIZE = getattr(settings, "DOTTIFY_COMMENT_PAGE_SIZE", 20)
+
+
+def parse_cursor(value):
+    # Raises ValueError for anything but a positive integer.
+    if value in (None, ""):
+        return None
+    cursor = int(value)
+    if cursor < 1:
+        raise ValueError(value)
+    return cursor
+
+
+def comment_page(album_id, before=None, size=COMMENT_PAGE_SIZE):
+    # Returns the page and the cursor for the next one (None on the last).
+    comments = Comment.objects.for_album(album_id).order_by("-id")
+    if before is not None:
+        comments = comments.filter(id__lt=before)
+    page = list(comments.prefetch_related("user")[:size + 1])
+    if len(page) > size:
+        return page[:size], page[size - 1].id
+    return page, None
@@ -0,0 +1,142 @@
+# Query parameter filters for the API viewsets.
+#
+# Every field a client can filter or order by must be backed by an index;
+# checks.py verifies this for the registered viewsets at startup.
+
+import logging
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+logger = logging.getLogger(__name__)
+
+
+def requested_fields(request):
+    if request is None or request.method not in ("GET", "HEAD"):
+        return None
+    value = request.query_params.get("fields")
+    if not value:
+        return None
+    return [f.strip() for f in value.split(",") if f.strip()]
+
+
+def is_indexed(model, field_name):
+    try:
+        field = model._meta.get_field(field_name)
+    except FieldDoesNotExist:
+        return False
+    if field.primary_key or field.unique or field.db_index:
+        return True
+    for index in model._meta.indexes:
+        if index.fields and index.fields[0].lstrip("-") == field_name:
+            return True
+    for constraint in model._meta.constraints:
+        fields = getattr(constraint, "fields", None)
+        if fields and fields[0] == field_name:
+            return True
+    return False
+
+
+def prune_related(queryset, roots):
+    # Drops select_related()/prefetch_related() lookups for fields that were
+    # not requested: deferred foreign keys cannot be joined.
+    selected = queryset.query.select_related
+    if isinstance(selected, dict):
+        queryset = queryset.select_related(None)
+        keep = [name for name in selected if name in roots]
+        if keep:
+            queryset = queryset.select_related(*keep)
+    lookups = queryset._prefetch_related_lookups
+    if lookups:
+        keep = [
+            lookup for lookup in lookups
+            if getattr(lookup, "prefetch_through", lookup).split("__")[0]
+            in roots
+        ]
+        queryset = queryset.prefetch_related(None).prefetch_related(*keep)
+    return queryset
+
+
+class FieldFilter(BaseFilterBackend):
+    # The view's filter_fields maps a model field to its allowed lookups.
+    # "exact" is read from ?<field>=, anything else from ?<field>__<lookup>=.
+
+    def get_lookups(self, request, view):
+        lookups = {}
+        for field, ops in getattr(view, "filter_fields", {}).items():
+            for op in ops:
+                param = field if op == "exact" else f"{field}__{op}"
+                value = request.query_params.get(param)
+                if value not in (None, ""):
+                    lookups[param] = value
+        return lookups
+
+    def filter_queryset(self, request, queryset, view):
+        lookups = self.get_lookups(request, view)
+        if not lookups:
+            return queryset
+        for param in lookups:
+            field = param.split("__")[0]
+            if not is_indexed(queryset.model, field):
+                logger.warning(
+                    "Rejected unindexed filter %s on %s",
+                    param, queryset.model.__name__
+                )
+                raise ValidationError(f"Filtering on {param} is not allowed.")
+        try:
+            return queryset.filter(**lookups)
+        except (ValueError, DjangoValidationError):
+            raise ValidationError("Invalid filter value.")
+
+
+class IndexedOrderingFilter(OrderingFilter):
+    # Unlike OrderingFilter, unknown fields are rejected rather than
+    # silently dropped, so a typo cannot turn into an unordered full scan.
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if params:
+            fields = [p.strip() for p in params.split(",") if p.strip()]
+            valid = self.remove_invalid_fields(queryset, fields, view, request)
+            if len(valid) != len(fields):
+                raise ValidationError("Ordering on that field is not allowed.")
+            for term in valid:
+                if not is_indexed(queryset.model, term.lstrip("-")):
+                    raise ValidationError(
+                        "Ordering on that field is not allowed."
+                    )
+            return valid
+        return self.get_default_ordering(view)
+
+
+class SparseFieldsFilter(BaseFilterBackend):
+    # ?fields=a,b limits the loaded columns with .only(); the serializer
+    # drops the other fields (see SparseFieldsMixin in serializers.py).
+
+    def filter_queryset(self, request, queryset, view):
+        requested = requested_fields(request)
+        if not requested:
+            return queryset
+
+        serializer_fields = view.get_serializer_class()().fields
+        model = queryset.model
+        columns = {model._meta.pk.name}
+        roots = set()
+        for name in requested:
+            if name not in serializer_fields:
+                raise ValidationError(f"Unknown field: {name}")
+            source = serializer_fields[name].source
+            if source == "*":
+                continue
+            root = source.split(".")[0]
+            try:
+                field = model._meta.get_field(root)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                columns.add(root)
+            roots.add(root)
+        return prune_related(queryset, roots).only(*columns)
+
@@ -0,0 +1,256 @@
+# Write-behind ingestion for ratings.
+#
+# buffer_ratings() validates ratings and appends them to an on-disk log. It
+# returns once the lines are fsynced, so an accepted rating survives a crash
+# before it reaches the database, and a burst of ratings never waits on
+# SQLite's write lock. The flush_ratings command applies the log in batches
+# of up to DOTTIFY_RATING_FLUSH_ROWS ratings. Each batch is one bulk insert
+# per shard plus one summary update per album, and the checkpoint moves
+# forward in the same transaction. With a single database every rating is
+# applied exactly once. With several rating shards, a crash between shard
+# commits can apply a batch twice.
+#
+# The log is a directory of numbered segment files. Writers append to the
+# newest segment while holding an exclusive flock. Once the newest segment
+# is fully flushed and larger than DOTTIFY_RATING_LOG_SEGMENT_BYTES, the
+# flusher starts a new one, and it deletes segments behind the checkpoint.
+
+import fcntl
+import json
+import os
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .metrics import QUEUE_DEPTH
+from .models import Album, IngestCheckpoint, Rating, validate_ratings
+from .sharding import insert_rows, shard_for
+from .signals import adjust_album
+
+
+class RatingLog:
+    # name is the IngestCheckpoint row that tracks this log.
+
+    def __init__(self, directory, name="ratings"):
+        self.name = name
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = getattr(
+            settings, "DOTTIFY_RATING_LOG_SEGMENT_BYTES", 16 * 1024 * 1024
+        )
+        self.fsync = getattr(settings, "DOTTIFY_RATING_LOG_FSYNC", True)
+
+    def path(self, number):
+        return self.directory / f"{number:08d}.log"
+
+    def segments(self):
+        return sorted(int(p.stem) for p in self.directory.glob("*.log"))
+
+    @contextmanager
+    def locked(self):
+        with open(self.directory / "lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def sync_directory(self):
+        if self.fsync:
+            fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def append(self, entries):
+        data = b"".join(
+            json.dumps(entry, separators=(",", ":")).encode() + b"\n"
+            for entry in entries
+        )
+        with self.locked():
+            numbers = self.segments()
+            path = self.path(numbers[-1] if numbers else 1)
+            created = not numbers
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+                if self.fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+            if created:
+                self.sync_directory()
+
+    def read(self, segment, offset, limit):
+        # Returns up to limit entries after (segment, offset) and the
+        # position after them. A line still being written is left for later.
+        entries = []
+        while True:
+            path = self.path(segment)
+            if path.exists():
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    for line in f:
+                        if len(entries) >= limit or not line.endswith(b"\n"):
+                            return entries, segment, offset
+                        entries.append(json.loads(line))
+                        offset += len(line)
+            later = [n for n in self.segments() if n > segment]
+            if not later or len(entries) >= limit:
+                return entries, segment, offset
+            segment, offset = later[0], 0
+
+    def pending(self, segment, offset):
+        count = 0
+        for number in self.segments():
+            if number < segment:
+                continue
+            with open(self.path(number), "rb") as f:
+                if number == segment:
+                    f.seek(offset)
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    count += chunk.count(b"\n")
+        return count
+
+    def rotate(self, segment, offset):
+        # Called with the checkpoint position after a flush.
+        with self.locked():
+            numbers = self.segments()
+            if (
+                numbers
+                and numbers[-1] == segment
+                and offset >= self.segment_bytes
+                and offset == self.path(segment).stat().st_size
+            ):
+                self.path(segment + 1).touch()
+                self.sync_directory()
+        for number in numbers:
+            if number < segment:
+                self.path(number).unlink(missing_ok=True)
+
+
+def get_log():
+    # No temp directory fallback: it may be wiped at boot, losing accepted
+    # ratings, and another user could create it first (checks.py).
+    directory = getattr(settings, "DOTTIFY_RATING_LOG_DIR", None)
+    if directory is None:
+        raise ImproperlyConfigured(
+            "Set DOTTIFY_RATING_LOG_DIR for the rating log"
+        )
+    return RatingLog(directory)
+
+
+def buffer_ratings(ratings, log=None):
+    # ratings is a list of (album_id, stars). Raises ValidationError, keyed
+    # by position, for invalid stars before anything is written.
+    validate_ratings([stars for _, stars in ratings])
+    now = timezone.now().isoformat()
+    entries = [
+        {"album": album_id, "stars": f"{float(stars):.1f}", "at": now}
+        for album_id, stars in ratings
+    ]
+    (log or get_log()).append(entries)
+    return len(entries)
+
+
+def buffer_rating(album_id, stars, log=None):
+    return buffer_ratings([(album_id, stars)], log=log)
+
+
+def apply_ratings(ratings):
+    # One multi-row insert per shard and one summary update per album,
+    # instead of a save() and an UPDATE per rating.
+    by_shard = defaultdict(list)
+    deltas = defaultdict(lambda: [0, Decimal("0.0")])
+    for rating in ratings:
+        by_shard[shard_for(rating.album_id)].append(rating)
+        deltas[rating.album_id][0] += 1
+        deltas[rating.album_id][1] += rating.stars
+
+    # The inserts and the summary updates commit together: one transaction
+    # on every shard touched and on default, which holds the albums.
+    with ExitStack() as stack:
+        for alias in {"default", *by_shard}:
+            stack.enter_context(transaction.atomic(using=alias))
+        for alias, group in by_shard.items():
+            insert_rows(Rating, group, alias)
+        for album_id, (count, total) in deltas.items():
+            adjust_album(album_id, rating_count=count, rating_sum=total)
+
+
+def record_ratings(album_id, values):
+    # The synchronous path of the ratings API: validates every value, then
+    # writes them all or none of them (see apply_ratings).
+    validate_ratings(values)
+    now = timezone.now()
+    ratings = [
+        Rating(
+            album_id=album_id,
+            stars=Decimal(f"{float(stars):.1f}"),
+            created_at=now,
+        )
+        for stars in values
+    ]
+    apply_ratings(ratings)
+    return len(ratings)
+
+
+def apply_entries(entries):
+    album_ids = {entry["album"] for entry in entries}
+    existing = set(
+        Album.objects.filter(pk__in=album_ids).values_list("pk", flat=True)
+    )
+    # Ratings for albums deleted since they were accepted are dropped.
+    apply_ratings([
+        Rating(
+            album_id=entry["album"],
+            stars=Decimal(entry["stars"]),
+            created_at=parse_datetime(entry["at"]),
+        )
+        for entry in entries if entry["album"] in existing
+    ])
+
+
+def flush_batch(log=None, limit=None):
+    log = log or get_log()
+    if limit is None:
+        limit = getattr(settings, "DOTTIFY_RATING_FLUSH_ROWS", 500)
+    with transaction.atomic():
+        checkpoint, _ = (
+            IngestCheckpoint.objects.select_for_update()
+            .get_or_create(name=log.name)
+        )
+        entries, segment, offset = log.read(
+            checkpoint.segment, checkpoint.offset, limit
+        )
+        if entries:
+            apply_entries(entries)
+        if (segment, offset) != (checkpoint.segment, checkpoint.offset):
+            IngestCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                segment=segment, offset=offset, updated_at=timezone.now()
+            )
+    return len(entries), segment, offset
+
+
+def flush_pending(log=None, limit=None):
+    # Applies everything in the log, then rotates it and updates the gauge.
+    log = log or get_log()
+    total = 0
+    while True:
+        count, segment, offset = flush_batch(log, limit)
+        total += count
+        if not count:
+            break
+    log.rotate(segment, offset)
+    QUEUE_DEPTH.set(log.pending(segment, offset), queue=log.name)
+    return total
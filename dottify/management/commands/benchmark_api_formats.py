@@ -0,0 +1,72 @@
+# Compares render time and payload size of the API formats on a generated
+# album list. Nothing is written: the data is rolled back afterwards.
+import gzip
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from dottify.models import Album, Song
+from dottify.renderers import FastJSONRenderer, MessagePackRenderer
+from dottify.serializers import AlbumSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time JSON/orjson/MessagePack rendering and compressed sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--albums', type=int, default=2000)
+        parser.add_argument('--songs', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                data = self.build(options['albums'], options['songs'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        renderers = [('json', JSONRenderer()), ('orjson', FastJSONRenderer())]
+        if MessagePackRenderer.available:
+            renderers.append(('msgpack', MessagePackRenderer()))
+        else:
+            self.stdout.write('msgpack not installed, skipping')
+
+        for name, renderer in renderers:
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                body = renderer.render(data)
+            ms = (time.perf_counter() - start) * 1000 / options['repeat']
+            sizes = f'raw={len(body)} gzip={len(gzip.compress(body))}'
+            if brotli is not None:
+                sizes += f' br={len(brotli.compress(body, quality=5))}'
+            self.stdout.write(f'{name:8} {ms:8.1f} ms  {sizes}')
+
+    def build(self, album_count, song_count):
+        albums = Album.objects.bulk_create(
+            Album(
+                title=f'Benchmark {i}',
+                artist_name=f'Artist {i % 50}',
+                release_date='2025-01-01',
+                retail_price='9.99',
+            )
+            for i in range(album_count)
+        )
+        Song.objects.bulk_create(
+            Song(title=f'Track {n}', album=album, length=180, position=n)
+            for album in albums
+            for n in range(1, song_count + 1)
+        )
+        queryset = Album.objects.prefetch_related('songs')
+        return AlbumSerializer(queryset, many=True).data
@@ -0,0 +1,123 @@
+# Starts runprefork with and without warm-up and reports the time until the
+# first response, the mean and slowest latency of the following requests,
+# and the memory of each worker from /proc/<pid>/smaps_rollup (Linux only).
+# Workers are recycled every --max-requests requests, so the slowest
+# request shows what a fresh worker costs without the warm-up. Pss
+# counts shared pages divided between the processes sharing them, so it
+# drops when the workers share more of the master's memory.
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def children(pid):
+    found = []
+    for stat in Path('/proc').glob('[0-9]*/stat'):
+        try:
+            fields = stat.read_text().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            found.append(int(stat.parent.name))
+    return found
+
+
+def memory_kb(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'private': (
+            values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare time to first request and worker memory for runprefork'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--max-requests', type=int, default=50)
+        # A template page without database queries or API throttling.
+        parser.add_argument('--path', default='/accounts/login/')
+
+    def handle(self, *args, **options):
+        if not Path('/proc/self/smaps_rollup').exists():
+            raise CommandError('Needs /proc/<pid>/smaps_rollup (Linux)')
+        for mode in ('warm', 'cold'):
+            self.run(mode, options)
+
+    def run(self, mode, options):
+        port = free_port()
+        url = f'http://127.0.0.1:{port}{options["path"]}'
+        command = [
+            sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'),
+            'runprefork', '--bind', f'127.0.0.1:{port}',
+            '--workers', str(options['workers']),
+            '--max-requests', str(options['max_requests']),
+        ]
+        if mode == 'cold':
+            command.append('--no-warm')
+
+        start = time.perf_counter()
+        server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+        try:
+            while True:
+                try:
+                    sent = time.perf_counter()
+                    urlopen(url).read()
+                    break
+                except (ConnectionError, URLError):
+                    if server.poll() is not None:
+                        raise CommandError('runprefork exited')
+                    time.sleep(0.01)
+            first_s = time.perf_counter() - start
+            first_request_s = time.perf_counter() - sent
+
+            timings = []
+            for _ in range(options['requests']):
+                sent = time.perf_counter()
+                urlopen(url).read()
+                timings.append(time.perf_counter() - sent)
+            mean_ms = sum(timings) / len(timings) * 1000
+            max_ms = max(timings) * 1000
+
+            workers = [memory_kb(pid) for pid in children(server.pid)]
+            master = memory_kb(server.pid)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=10)
+
+        count = len(workers) or 1
+        self.stdout.write(
+            f'{mode:4}  first response {first_s * 1000:7.1f} ms '
+            f'(request {first_request_s * 1000:6.1f} ms)  '
+            f'mean {mean_ms:5.2f} ms  slowest {max_ms:6.1f} ms\n'
+            f'      master rss {master["rss"] / 1024:6.1f} MiB  '
+            f'per worker: rss '
+            f'{sum(w["rss"] for w in workers) / count / 1024:6.1f} MiB  '
+            f'pss {sum(w["pss"] for w in workers) / count / 1024:6.1f} MiB  '
+            f'private '
+            f'{sum(w["private"] for w in workers) / count / 1024:6.1f} MiB'
+        )
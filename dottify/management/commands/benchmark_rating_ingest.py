@@ -0,0 +1,60 @@
+# Sustained ratings per second for direct inserts and the write-behind log.
+# Uses the configured database; the albums it creates are deleted (with
+# their ratings) afterwards.
+import tempfile
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from dottify.ingest import RatingLog, buffer_rating, flush_pending
+from dottify.models import Album, IngestCheckpoint, Rating
+
+
+class Command(BaseCommand):
+    help = 'Compare direct and write-behind rating ingestion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ratings', type=int, default=2000)
+        parser.add_argument('--albums', type=int, default=20)
+
+    def handle(self, *args, **options):
+        count = options['ratings']
+        albums = Album.objects.bulk_create(
+            Album(
+                title=f'Ingest benchmark {i}',
+                artist_name='Benchmark',
+                release_date='2025-01-01',
+                retail_price='1.00',
+            )
+            for i in range(options['albums'])
+        )
+        ids = [album.pk for album in albums]
+        stars = [Decimal(n) / 2 for n in range(11)]
+        try:
+            start = time.perf_counter()
+            for n in range(count):
+                Rating.objects.create(
+                    album_id=ids[n % len(ids)], stars=stars[n % 11]
+                )
+            self.report('direct insert', count, start)
+
+            with tempfile.TemporaryDirectory() as directory:
+                log = RatingLog(directory, name='benchmark')
+                start = time.perf_counter()
+                for n in range(count):
+                    buffer_rating(ids[n % len(ids)], stars[n % 11], log=log)
+                self.report('buffered accept (fsync)', count, start)
+
+                start = time.perf_counter()
+                flush_pending(log)
+                self.report('flush', count, start)
+        finally:
+            IngestCheckpoint.objects.filter(name='benchmark').delete()
+            Album.objects.filter(pk__in=ids).delete()
+
+    def report(self, name, count, start):
+        seconds = time.perf_counter() - start
+        self.stdout.write(
+            f'{name:24} {count / seconds:10.0f} ratings/s ({seconds:.2f}s)'
+        )
@@ -0,0 +1,71 @@
+# Compares the values_list() readers with the serializers on generated
+# songs and albums. Nothing is written: the data is rolled back afterwards.
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from dottify.models import Album, Song
+from dottify.readers import AlbumReader, SongReader
+from dottify.serializers import AlbumSerializer, SongSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time the API list readers against the serializers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--songs-per-album', type=int, default=10)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.build(options['rows'], options['songs_per_album'])
+                self.compare('songs', SongSerializer, SongReader,
+                             Song.objects.all())
+                self.compare('albums', AlbumSerializer, AlbumReader,
+                             Album.objects.prefetch_related('songs'))
+                raise Rollback
+        except Rollback:
+            pass
+
+    def compare(self, name, serializer_class, reader_class, queryset):
+        start = time.perf_counter()
+        expected = serializer_class(queryset.all(), many=True).data
+        serializer_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        data = reader_class().read(queryset.all())
+        reader_s = time.perf_counter() - start
+
+        same = JSONRenderer().render(data) == JSONRenderer().render(expected)
+        self.stdout.write(
+            f'{name:6} {len(data):7} rows  serializer {serializer_s:7.2f}s  '
+            f'reader {reader_s:7.2f}s  '
+            f'x{serializer_s / reader_s:.1f}  identical={same}'
+        )
+
+    def build(self, rows, per_album):
+        albums = Album.objects.bulk_create(
+            Album(
+                title=f'Benchmark {i}',
+                artist_name=f'Artist {i % 50}',
+                release_date='2025-01-01',
+                retail_price='9.99',
+            )
+            for i in range(max(1, rows // per_album))
+        )
+        Song.objects.bulk_create(
+            (
+                Song(title=f'Track {n}', album=album, length=180,
+                     position=n)
+                for album in albums
+                for n in range(1, per_album + 1)
+            ),
+            batch_size=5000
+        )
@@ -0,0 +1,19 @@
+# Run offline (e.g. nightly) to refresh the "more like this" lists.
+from django.core.management.base import BaseCommand
+
+from dottify.recommendations import CHUNK_SIZE, TOP_K, build_similar_songs
+
+
+class Command(BaseCommand):
+    help = 'Rebuild similar songs from playlist co-occurrence'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        count = build_similar_songs(
+            k=options['top_k'],
+            chunk_size=options['chunk_size']
+        )
+        self.stdout.write(f'Stored {count} similar song entries')
@@ -0,0 +1,42 @@
+# The flusher for the write-behind rating log (dottify/ingest.py). Run a
+# single instance next to the web workers. Every --interval-ms it applies
+# whatever is buffered, in transactions of at most --batch-size ratings.
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dottify.ingest import flush_pending, get_log
+
+
+class Command(BaseCommand):
+    help = 'Apply buffered ratings to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval-ms',
+            type=int,
+            default=getattr(settings, 'DOTTIFY_RATING_FLUSH_MS', 200)
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'DOTTIFY_RATING_FLUSH_ROWS', 500)
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Apply everything that is buffered and exit'
+        )
+
+    def handle(self, *args, **options):
+        log = get_log()
+        limit = options['batch_size']
+        if options['once']:
+            count = flush_pending(log, limit)
+            self.stdout.write(f'Applied {count} ratings')
+            return
+
+        while True:
+            flush_pending(log, limit)
+            time.sleep(options['interval_ms'] / 1000)
@@ -0,0 +1,41 @@
+# Run at deploy time (runprefork does the same at boot): parses every
+# Dottify template and the templates they extend or include, and exits
+# with an error if any of them is broken.
+from django.core.management.base import BaseCommand, CommandError
+
+from dottify.templating import (
+    all_template_dirs,
+    dottify_template_dirs,
+    precompile
+)
+
+
+class Command(BaseCommand):
+    help = 'Load and check every template so errors fail the deployment'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help="Also load other apps' templates; their errors are warnings"
+        )
+
+    def handle(self, *args, **options):
+        loaded, errors = precompile(dottify_template_dirs())
+        for name, error in errors.items():
+            self.stderr.write(f'{name}: {error}')
+        if errors:
+            raise CommandError(f'{len(errors)} broken templates')
+
+        if options['all']:
+            # Some of these, like the admin's form widgets, are only ever
+            # rendered by the form renderer's engine.
+            others = [
+                directory for directory in all_template_dirs()
+                if directory not in dottify_template_dirs()
+            ]
+            more, warnings = precompile(others)
+            loaded += more
+            for name, error in warnings.items():
+                self.stderr.write(f'warning: {name}: {error}')
+        self.stdout.write(f'Compiled {len(loaded)} templates')
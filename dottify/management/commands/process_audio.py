@@ -0,0 +1,34 @@
+# Checks finished audio uploads (dottify/audio.py) and stores them as
+# Song.audio. Run a single instance next to the web workers; it also
+# deletes uploads left unfinished for DOTTIFY_AUDIO_UPLOAD_EXPIRY_HOURS.
+import time
+
+from django.core.management.base import BaseCommand
+
+from dottify.audio import expire_uploads, process_pending
+
+
+class Command(BaseCommand):
+    help = 'Check uploaded audio files and attach them to their songs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval-ms', type=int, default=1000)
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process every finished upload and exit'
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            expired = expire_uploads()
+            count = process_pending()
+            self.stdout.write(
+                f'Processed {count} uploads, expired {expired}'
+            )
+            return
+
+        while True:
+            expire_uploads()
+            process_pending(limit=10)
+            time.sleep(options['interval_ms'] / 1000)
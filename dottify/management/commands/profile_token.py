@@ -0,0 +1,17 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from dottify.profiling import make_profile_token
+
+
+class Command(BaseCommand):
+    help = 'Print a signed request profiling token for a staff user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None or not user.is_staff:
+            raise CommandError('Profiling is only available to staff users')
+        self.stdout.write(make_profile_token(user))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from dottify.models import RequestProfile
+
+
+class Command(BaseCommand):
+    help = 'Delete request profiles that have passed their expiry time'
+
+    def handle(self, *args, **options):
+        deleted, _ = RequestProfile.objects.filter(
+            expires_at__lt=timezone.now()
+        ).delete()
+        self.stdout.write(f'Deleted {deleted} expired profiles')
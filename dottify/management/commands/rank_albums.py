@@ -0,0 +1,21 @@
+# Run from cron (e.g. every few minutes) to refresh the album leaderboards.
+from django.core.management.base import BaseCommand
+
+from dottify.models import AlbumRanking
+from dottify.rankings import rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the top and trending album leaderboards'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--board',
+            action='append',
+            choices=[b for b, _ in AlbumRanking.BOARD_CHOICES],
+            help='Only rebuild this board (may be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_leaderboards(options['board'])
+        self.stdout.write(f'Stored {count} leaderboard rows')
@@ -0,0 +1,37 @@
+# Run after changing DOTTIFY_RATING_SHARDS: moves every album's ratings and
+# comments into the shard it now maps to. Use --source for a database that
+# was removed from the shard list but still holds rows.
+from django.core.management.base import BaseCommand
+
+from dottify.models import Comment, Rating
+from dottify.sharding import misplaced_albums, move_album_rows, shards
+
+
+class Command(BaseCommand):
+    help = 'Move ratings and comments to the shard of their album'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', action='append', default=[])
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        sources = dict.fromkeys(['default'] + shards() + options['source'])
+        for model in (Rating, Comment):
+            name = model._meta.verbose_name_plural
+            for source in sources:
+                albums = misplaced_albums(model, source)
+                if options['dry_run']:
+                    self.stdout.write(
+                        f'{source}: {len(albums)} albums of {name} to move'
+                    )
+                    continue
+                moved = sum(
+                    move_album_rows(
+                        model, album_id, source, options['batch_size']
+                    )
+                    for album_id in albums
+                )
+                self.stdout.write(
+                    f'{source}: moved {moved} {name} of {len(albums)} albums'
+                )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from dottify.models import Album
+from dottify.signals import rebuild_album_summary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalised song and rating summary on albums'
+
+    def add_arguments(self, parser):
+        parser.add_argument('album_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        albums = Album.objects.all()
+        if options['album_ids']:
+            albums = albums.filter(pk__in=options['album_ids'])
+        rebuild_album_summary(albums)
+        self.stdout.write(f'Rebuilt summary for {albums.count()} albums')
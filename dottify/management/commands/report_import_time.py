@@ -0,0 +1,83 @@
+# Starts a fresh interpreter per process role with "python -X importtime"
+# and reports how long django.setup() took to import everything, then the
+# same again with the system checks every management command runs before
+# handle(), with the slowest top-level imports of the latter. Run it before
+# and after adding a dependency to see what it costs every container start.
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SETUP = 'import django; django.setup()'
+COMMAND = SETUP + '; from django.core import checks; checks.run_checks()'
+
+
+def import_times(stderr):
+    # Parses importtime lines ("import time: self | cumulative | name") into
+    # (self_us, cumulative_us, depth, module) tuples.
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        module = name.lstrip()
+        depth = (len(name) - len(module) - 1) // 2
+        rows.append((int(fields[0]), int(fields[1]), depth, module))
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Report the startup import time per process role'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--role',
+            action='append',
+            choices=list(settings.ROLE_EXCLUDED_APPS),
+            help='Only report this role (may be repeated)'
+        )
+        parser.add_argument('--top', type=int, default=10)
+
+    def handle(self, *args, **options):
+        for role in options['role'] or list(settings.ROLE_EXCLUDED_APPS):
+            for label, code in [('setup', SETUP), ('command', COMMAND)]:
+                rows = self.measure(role, code)
+                total_ms = sum(row[0] for row in rows) / 1000
+                self.stdout.write(
+                    f'{role:6} {label:7} {total_ms:8.1f} ms  '
+                    f'{len(rows)} modules'
+                )
+            top = sorted(
+                (row for row in rows if row[2] == 0),
+                key=lambda row: row[1],
+                reverse=True
+            )
+            for _, cumulative, _, module in top[:options['top']]:
+                self.stdout.write(f'    {cumulative / 1000:8.1f} ms  {module}')
+
+    def measure(self, role, code=SETUP):
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=os.environ.get(
+                'DJANGO_SETTINGS_MODULE', 'MusicDBInc.settings'
+            ),
+            DOTTIFY_PROCESS_ROLE=role,
+        )
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            raise CommandError(
+                f'{code} failed for role {role}:\n{result.stderr}'
+            )
+        return import_times(result.stderr)
@@ -0,0 +1,77 @@
+# Production server: warms Django up once, then forks --workers processes
+# that serve from the same socket (see dottify/prefork.py). It is not meant
+# to face the internet: put it behind a reverse proxy that buffers slow
+# clients.
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import get_internal_wsgi_application
+
+from dottify.prefork import PreforkServer, warm
+from dottify.templating import precompile
+
+
+class Command(BaseCommand):
+    help = 'Serve the site with preforked, warmed-up worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default='127.0.0.1:8000')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'DOTTIFY_PREFORK_WORKERS', 4)
+        )
+        parser.add_argument(
+            '--max-requests',
+            type=int,
+            default=getattr(settings, 'DOTTIFY_PREFORK_MAX_REQUESTS', 1000),
+            help='Replace a worker after this many requests'
+        )
+        parser.add_argument(
+            '--no-warm',
+            action='store_true',
+            help='Fork without warming up, for comparison'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=getattr(settings, 'DOTTIFY_PREFORK_TIMEOUT', 30),
+            help='Drop connections idle for this many seconds'
+        )
+        parser.add_argument('--access-log', action='store_true')
+
+    def handle(self, *args, **options):
+        host, _, port = options['bind'].rpartition(':')
+        if not host or not port.isdigit():
+            raise CommandError('--bind must be host:port')
+        if options['workers'] < 1 or options['max_requests'] < 1:
+            raise CommandError('--workers and --max-requests must be >= 1')
+
+        # Broken templates stop the deployment rather than a request.
+        errors = precompile()[1]
+        if errors:
+            raise CommandError(
+                'Broken templates: ' + ', '.join(sorted(errors))
+            )
+
+        if options['no_warm']:
+            application = get_internal_wsgi_application()
+        else:
+            application, loaded = warm()
+            self.stdout.write(
+                f"Warmed {loaded['patterns']} URL patterns and "
+                f"{loaded['templates']} templates"
+            )
+
+        def log(message):
+            self.stdout.write(message)
+            self.stdout.flush()
+
+        PreforkServer(
+            application,
+            (host, int(port)),
+            options['workers'],
+            options['max_requests'],
+            log=log,
+            access_log=options['access_log'],
+            timeout=options['timeout'],
+        ).run()
@@ -0,0 +1,186 @@
+# Serving uploaded media (MEDIA_ROOT) in production.
+#
+# A file is only served if a model row references it and the field's check
+# allows the request (MEDIA_FIELDS). Finding the row is one indexed query
+# for its pk, without loading the model.
+# The response supports conditional requests (If-None-Match,
+# If-Modified-Since) and single byte ranges (Range, If-Range), which audio
+# players need for seeking.
+#
+# The body is a FileResponse over the open file, positioned at the start
+# of the range. Servers with a sendfile-aware wsgi.file_wrapper (gunicorn,
+# and runprefork, see prefork.py) send Content-Length bytes from there with
+# os.sendfile(), without copying the file through Python. Behind nginx or
+# Apache, DOTTIFY_MEDIA_OFFLOAD = "x-accel" or "x-sendfile" returns only
+# the headers and leaves the transfer to the proxy.
+
+import mimetypes
+import os
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+from .models import Album, Song
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def public(request, pk):
+    return True
+
+
+def signed_in(request, pk):
+    return request.user.is_authenticated
+
+
+# (model, file field, check(request, pk)) for every field holding media.
+# Files behind any check but public() are sent as private to caches.
+MEDIA_FIELDS = [
+    (Album, "cover_image", public),
+    (Song, "audio", signed_in),
+]
+
+
+def find_check(request, name):
+    # Returns the check that allowed the request, or None.
+    for model, field, check in MEDIA_FIELDS:
+        pk = (
+            model.objects.filter(**{field: name})
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if pk is not None:
+            return check if check(request, pk) else None
+    return None
+
+
+def parse_range(header, size):
+    # Returns (start, end) inclusive, None to send the whole file, or
+    # raises ValueError if the range cannot be satisfied.
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+class RangeFile:
+    # A file seeked to offset that reads at most length bytes. fileno() and
+    # the file position let a server sendfile() the range.
+
+    def __init__(self, file, offset, length):
+        self.file = file
+        self.remaining = length
+        file.seek(offset)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def etag_matches(header, etag):
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def media_response(request, name):
+    name = posixpath.normpath(name)
+    check = None
+    if not name.startswith(("..", "/")):
+        check = find_check(request, name)
+    if check is None:
+        raise Http404("No such file")
+    path = Path(settings.MEDIA_ROOT) / name
+    try:
+        stat = path.stat()
+    except OSError:
+        raise Http404("No such file")
+
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": (
+            f"{'public' if check is public else 'private'}, max-age=3600"
+        ),
+    }
+    if_none_match = request.headers.get("If-None-Match")
+    if_modified_since = parse_http_date_safe(
+        request.headers.get("If-Modified-Since", "")
+    )
+    if (
+        (if_none_match and etag_matches(if_none_match, etag))
+        or (
+            not if_none_match
+            and if_modified_since
+            and int(stat.st_mtime) <= if_modified_since
+        )
+    ):
+        return HttpResponse(status=304, headers=headers)
+
+    content_type = (
+        mimetypes.guess_type(name)[0] or "application/octet-stream"
+    )
+    offload = getattr(settings, "DOTTIFY_MEDIA_OFFLOAD", None)
+    if offload in ("x-accel", "x-sendfile"):
+        # The proxy handles Range itself.
+        if offload == "x-accel":
+            prefix = getattr(
+                settings, "DOTTIFY_MEDIA_ACCEL_PREFIX", "/protected-media/"
+            )
+            headers["X-Accel-Redirect"] = prefix + name
+        else:
+            headers["X-Sendfile"] = os.fspath(path.resolve())
+        return HttpResponse(content_type=content_type, headers=headers)
+
+    size = stat.st_size
+    status, start, end = 200, 0, size - 1
+    header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if header and (if_range is None or if_range == etag):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return HttpResponse(status=416, headers=headers)
+        if byte_range is not None:
+            status, (start, end) = 206, byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    if request.method == "HEAD":
+        response = HttpResponse(
+            status=status, content_type=content_type, headers=headers
+        )
+    else:
+        response = FileResponse(
+            RangeFile(open(path, "rb"), start, end - start + 1),
+            status=status,
+            content_type=content_type,
+            headers=headers,
+        )
+        response.block_size = 64 * 1024
+    response["Content-Length"] = str(end - start + 1)
+    return response
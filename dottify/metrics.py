@@ -0,0 +1,248 @@
+# Minimal Prometheus-style metrics, rendered in the text exposition format
+# by the /metrics view.
+#
+# Values live in memory per process. When DOTTIFY_METRICS_DIR is set, each
+# process also flushes its values to its own JSON file in that directory
+# (at most every DOTTIFY_METRICS_FLUSH_SECONDS and at exit), and the
+# /metrics view sums the files of every worker, so multi-worker gunicorn
+# deployments report totals rather than whichever worker answered. Gauges
+# are only summed across processes that are still alive. When a worker
+# has exited, collect() folds its counters and histograms into
+# archive.json and deletes its file, so recycled workers do not pile up.
+
+import atexit
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf
+)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, math.inf)
+
+REGISTRY = {}
+_values = {}
+_lock = threading.Lock()
+_started = time.time_ns()
+_last_flush = 0.0
+ARCHIVE = "archive.json"
+
+
+def _key(sample, labels):
+    return (sample, tuple(sorted(labels.items())))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        REGISTRY[name] = self
+
+    def _add(self, sample, labels, amount):
+        with _lock:
+            key = _key(sample, labels)
+            _values[key] = _values.get(key, 0) + amount
+        _maybe_flush()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        self._add(self.name, labels, amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with _lock:
+            _values[_key(self.name, labels)] = value
+        _maybe_flush()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        with _lock:
+            for bound in self.buckets:
+                if value <= bound:
+                    le = "+Inf" if bound == math.inf else repr(float(bound))
+                    key = _key(f"{self.name}_bucket", {**labels, "le": le})
+                    _values[key] = _values.get(key, 0) + 1
+            for sample, amount in (("_sum", value), ("_count", 1)):
+                key = _key(self.name + sample, labels)
+                _values[key] = _values.get(key, 0) + amount
+        _maybe_flush()
+
+
+REQUEST_LATENCY = Histogram(
+    "dottify_request_duration_seconds",
+    "Request latency by URL name."
+)
+REQUEST_QUERIES = Histogram(
+    "dottify_request_db_queries",
+    "Database queries per instrumented request by URL name.",
+    buckets=COUNT_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    "dottify_cache_requests_total",
+    "Cache lookups by cache name and result (hit or miss)."
+)
+IMPORT_ROWS = Counter(
+    "dottify_import_rows_total",
+    "Rows processed by data wizard imports by result."
+)
+QUEUE_DEPTH = Gauge(
+    "dottify_queue_depth",
+    "Items waiting in in-process queues."
+)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _metrics_dir():
+    path = getattr(settings, "DOTTIFY_METRICS_DIR", None)
+    return Path(path) if path else None
+
+
+def _own_file(directory):
+    return directory / f"{os.getpid()}-{_started}.json"
+
+
+def _serialise(values):
+    return [[sample, list(labels), value]
+            for (sample, labels), value in values.items()]
+
+
+def flush():
+    global _last_flush
+    directory = _metrics_dir()
+    if directory is None:
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    with _lock:
+        data = _serialise(_values)
+    target = _own_file(directory)
+    tmp = target.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, target)
+    _last_flush = time.monotonic()
+
+
+def _maybe_flush():
+    if _metrics_dir() is None:
+        return
+    interval = getattr(settings, "DOTTIFY_METRICS_FLUSH_SECONDS", 5)
+    if time.monotonic() - _last_flush >= interval:
+        flush()
+
+
+atexit.register(flush)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_rows(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _add_rows(merged, rows, gauges=True):
+    for sample, labels, value in rows:
+        metric = REGISTRY.get(sample)
+        if metric is not None and metric.kind == "gauge" and not gauges:
+            continue
+        key = (sample, tuple(tuple(pair) for pair in labels))
+        merged[key] = merged.get(key, 0) + value
+
+
+def _archive(directory, paths):
+    # Moves dead workers' counters and histograms into the archive file.
+    # The lock stops two scrapes from archiving the same file twice.
+    with open(directory / "archive.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = directory / ARCHIVE
+        totals = {}
+        _add_rows(totals, _read_rows(archive) or [])
+        dead = [path for path in paths if path.exists()]
+        for path in dead:
+            _add_rows(totals, _read_rows(path) or [], gauges=False)
+        tmp = archive.with_suffix(".tmp")
+        tmp.write_text(json.dumps(_serialise(totals)))
+        os.replace(tmp, archive)
+        for path in dead:
+            path.unlink(missing_ok=True)
+
+
+def collect():
+    with _lock:
+        merged = dict(_values)
+    directory = _metrics_dir()
+    if directory is None or not directory.exists():
+        return merged
+
+    own = _own_file(directory)
+    dead = []
+    for path in directory.glob("*.json"):
+        if path == own or path.name == ARCHIVE:
+            continue
+        if not _alive(int(path.stem.split("-")[0])):
+            dead.append(path)
+            continue
+        _add_rows(merged, _read_rows(path) or [])
+    if dead:
+        _archive(directory, dead)
+    _add_rows(merged, _read_rows(directory / ARCHIVE) or [])
+    return merged
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def render():
+    values = collect()
+    lines = []
+    for name, metric in REGISTRY.items():
+        lines.append(f"# HELP {name} {metric.help_text}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        samples = [
+            (sample, labels, value)
+            for (sample, labels), value in values.items()
+            if sample == name or sample.startswith(name + "_")
+        ]
+        for sample, labels, value in samples:
+            lines.append(f"{sample}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
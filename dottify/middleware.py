@@ -0,0 +1,227 @@
+import cProfile
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from .metrics import REQUEST_LATENCY, REQUEST_QUERIES
+from .profiling import store_profile, wants_profile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger("dottify.sql")
+
+
+class QueryRecorder:
+    # Execute wrapper that times every statement run during a request.
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries.append((sql, duration))
+
+    @property
+    def total_ms(self):
+        return sum(d for _, d in self.queries) * 1000
+
+    def duplicates(self):
+        # The same parametrised SQL run more than once is usually an N+1.
+        counts = Counter(sql for sql, _ in self.queries)
+        return {sql: n for sql, n in counts.items() if n > 1}
+
+    def slowest(self, n):
+        ranked = sorted(self.queries, key=lambda q: q[1], reverse=True)
+        return [(sql, round(d * 1000, 2)) for sql, d in ranked[:n]]
+
+
+class QueryInstrumentationMiddleware:
+    # Records query count, SQL time, duplicate statements and the slowest
+    # queries for a sample of requests. Logs one JSON line per sampled
+    # request to the "dottify.sql" logger; requests slower than
+    # DOTTIFY_SLOW_REQUEST_MS log every query at WARNING. The Server-Timing
+    # header gives away how much work a request caused, so only staff (or
+    # anyone when DEBUG is on) get it.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "DOTTIFY_SQL_SAMPLE_RATE", 0.01)
+        self.slow_ms = getattr(settings, "DOTTIFY_SLOW_REQUEST_MS", 500)
+        self.top_n = getattr(settings, "DOTTIFY_SQL_SLOWEST", 5)
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        request.sql_recorder = recorder
+        user = getattr(request, "user", None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            self.add_server_timing(response, recorder, total_ms)
+        self.log(request, response, recorder, total_ms)
+        return response
+
+    def add_server_timing(self, response, recorder, total_ms):
+        timing = (
+            f'db;dur={recorder.total_ms:.1f};'
+            f'desc="{len(recorder.queries)} queries", '
+            f'app;dur={total_ms:.1f}'
+        )
+        existing = response.get("Server-Timing")
+        response["Server-Timing"] = (
+            f"{existing}, {timing}" if existing else timing
+        )
+
+    def log(self, request, response, recorder, total_ms):
+        match = getattr(request, "resolver_match", None)
+        record = {
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "duration_ms": round(total_ms, 2),
+            "query_count": len(recorder.queries),
+            "sql_ms": round(recorder.total_ms, 2),
+            "duplicates": len(recorder.duplicates()),
+            "slowest": recorder.slowest(self.top_n),
+        }
+        if total_ms >= self.slow_ms:
+            record["queries"] = [
+                (sql, round(d * 1000, 2)) for sql, d in recorder.queries
+            ]
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+
+
+class MetricsMiddleware:
+    # Feeds request latency, and the query counts gathered by
+    # QueryInstrumentationMiddleware, into the /metrics histograms. It must
+    # sit above QueryInstrumentationMiddleware in MIDDLEWARE.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        url_name = match.url_name if match and match.url_name else "unmatched"
+        REQUEST_LATENCY.observe(duration, url_name=url_name)
+        recorder = getattr(request, "sql_recorder", None)
+        if recorder is not None:
+            REQUEST_QUERIES.observe(len(recorder.queries), url_name=url_name)
+        return response
+
+
+class ProfilingMiddleware:
+    # Runs requests carrying a valid staff profiling token under cProfile
+    # (see profiling.py). Must come after AuthenticationMiddleware.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not wants_profile(request):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        profile = store_profile(
+            request, response, profiler, recorder, duration
+        )
+        response["X-Dottify-Profile-Id"] = str(profile.pk)
+        return response
+
+
+def accepted_encodings(request):
+    return parse_accept_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+
+
+def parse_accept_encoding(header):
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = re.search(r"q=([0-9.]+)", params)
+        if name and not (q and float(q.group(1)) == 0):
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    # Brotli (when the brotli package is installed) or gzip for API
+    # payloads, chosen from Accept-Encoding. HTML is left alone because it
+    # carries CSRF tokens (BREACH).
+    min_length = 200
+    content_types = ("application/json", "application/msgpack")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        content_type = response.get("Content-Type", "").split(";")[0]
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or content_type not in self.content_types
+        ):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < self.min_length:
+            return response
+
+        accepted = accepted_encodings(request)
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+            compressed = brotli.compress(response.content, quality=5)
+        elif "gzip" in accepted:
+            encoding = "gzip"
+            compressed = compress_string(response.content)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
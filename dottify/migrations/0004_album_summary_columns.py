@@ -0,0 +1,91 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:02
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def summary_subquery(model, aggregate, output_field, alias):
+    return Coalesce(
+        Subquery(
+            model.objects.using(alias).filter(album=OuterRef("pk"))
+            .order_by()
+            .values("album")
+            .annotate(total=aggregate)
+            .values("total")
+        ),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def backfill_summary(apps, schema_editor):
+    # Runs only where the router allows "album" (see hints below); every
+    # query stays on that database rather than going through the router.
+    alias = schema_editor.connection.alias
+    Album = apps.get_model("dottify", "Album")
+    Song = apps.get_model("dottify", "Song")
+    Rating = apps.get_model("dottify", "Rating")
+    Album.objects.using(alias).update(
+        song_count=summary_subquery(
+            Song, Count("id"), models.PositiveIntegerField(), alias),
+        total_length=summary_subquery(
+            Song, Sum("length"), models.PositiveIntegerField(), alias),
+        rating_count=summary_subquery(
+            Rating, Count("id"), models.PositiveIntegerField(), alias),
+        rating_sum=summary_subquery(
+            Rating, Sum("stars"),
+            models.DecimalField(max_digits=12, decimal_places=1), alias),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dottify', '0003_rename_running_time_song_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=1, default=Decimal('0.0'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='song_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='total_length',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['song_count'], name='album_song_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['total_length'], name='album_total_length_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['rating_count'], name='album_rating_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['rating_sum'], name='album_rating_sum_idx'),
+        ),
+        migrations.RunPython(
+            backfill_summary,
+            migrations.RunPython.noop,
+            hints={"model_name": "album"}
+        ),
+    ]
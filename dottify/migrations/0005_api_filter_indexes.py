@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dottify', '0004_album_summary_columns'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='playlist',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['artist_name'], name='album_artist_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['format'], name='album_format_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['release_date'], name='album_release_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['retail_price'], name='album_retail_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['album', 'position'], name='song_album_position_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['length'], name='song_length_idx'),
+        ),
+    ]
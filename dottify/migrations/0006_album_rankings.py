@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dottify', '0005_api_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlbumRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('top', 'Top rated'), ('trending_7', 'Trending (7 days)'), ('trending_30', 'Trending (30 days)')], max_length=16)),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('rating_count', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['board', 'rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['created_at'], name='rating_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['album', 'created_at'], name='rating_album_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='albumranking',
+            name='album',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='dottify.album'),
+        ),
+        migrations.AddConstraint(
+            model_name='albumranking',
+            constraint=models.UniqueConstraint(fields=('board', 'rank'), name='unique_board_rank'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dottify', '0006_album_rankings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarSong',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dottify.song')),
+                ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_entries', to='dottify.song')),
+            ],
+            options={
+                'ordering': ['song', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('song', 'rank'), name='unique_song_similar_rank')],
+            },
+        ),
+    ]
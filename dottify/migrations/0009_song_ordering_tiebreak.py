@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dottify', '0008_request_profiles'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='song',
+            options={'ordering': ['position', 'id']},
+        ),
+    ]
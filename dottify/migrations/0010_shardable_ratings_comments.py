@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dottify', '0009_song_ordering_tiebreak'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='album',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='dottify.album'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='dottify.dottifyuser'),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='album',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ratings', to='dottify.album'),
+        ),
+    ]
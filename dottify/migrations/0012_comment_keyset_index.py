@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dottify', '0011_ingest_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='album',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='dottify.album'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['album', 'id'], name='comment_album_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dottify', '0012_comment_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['cover_image'], name='album_cover_image_idx'),
+        ),
+    ]
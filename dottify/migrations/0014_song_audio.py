@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:17
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dottify', '0013_album_cover_image_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('received', models.PositiveBigIntegerField(default=0)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('complete', 'Complete'), ('ready', 'Ready'), ('rejected', 'Rejected')], default='uploading', max_length=10)),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='audio',
+            field=models.FileField(blank=True, editable=False, upload_to='audio/'),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='audio_duration',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='audio_sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['audio'], name='song_audio_idx'),
+        ),
+        migrations.AddField(
+            model_name='audioupload',
+            name='song',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audio_uploads', to='dottify.song'),
+        ),
+        migrations.AddField(
+            model_name='audioupload',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='audioupload',
+            index=models.Index(fields=['status', 'created_at'], name='audio_upload_status_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:27
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def backfill_slugs(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    DottifyUser = apps.get_model("dottify", "DottifyUser")
+    profiles = list(
+        DottifyUser.objects.using(alias).only("id", "display_name")
+    )
+    for profile in profiles:
+        profile.display_slug = slugify(profile.display_name or "")
+    DottifyUser.objects.using(alias).bulk_update(
+        profiles, ["display_slug"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dottify', '0014_song_audio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dottifyuser',
+            name='display_slug',
+            field=models.SlugField(default='', editable=False, max_length=800),
+        ),
+        migrations.AddField(
+            model_name='dottifyuser',
+            name='playlists_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(
+            backfill_slugs,
+            migrations.RunPython.noop,
+            hints={"model_name": "dottifyuser"}
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 
 # Create your models here.
 
@@ -9,6 +11,8 @@ from django.utils import timezone
 from django.core.validators import MaxValueValidator, MinValueValidator
 from decimal import Decimal
 from django.contrib.auth.models import User
+from django.db.models.fields.files import FieldFile
+from .sharding import ShardedManager
 
 
 def validate_release_date(value):
@@ -19,15 +23,130 @@ def validate_release_date(value):
         )
 
 
+# Every valid rating is a multiple of 0.5, which floats represent exactly,
+# so a batch is checked with one float() and one set lookup per value.
+VALID_STARS = frozenset(n / 2 for n in range(11))
+
+
+def rating_error(value):
+    try:
+        stars = float(value)
+    except (TypeError, ValueError):
+        return "Stars must be a number"
+    if stars in VALID_STARS:
+        return None
+    if not 0 <= stars <= 5:
+        return "Stars must be between 0 and 5"
+    return "Stars must be in increments of 0.5"
+
+
+def validate_ratings(values):
+    # Raises one ValidationError keyed by the index of each invalid value.
+    try:
+        stars = list(map(float, values))
+    except (TypeError, ValueError):
+        bad = [i for i, v in enumerate(values) if rating_error(v)]
+    else:
+        bad = [i for i, v in enumerate(stars) if v not in VALID_STARS]
+    if bad:
+        raise ValidationError({str(i): rating_error(values[i]) for i in bad})
+
+
 def validate_rating(value):
-    v = Decimal(str(value))
-    if (v < Decimal("0.0") or v > Decimal("5.0")):
-        raise ValidationError("Stars must be between 0 and 5")
-    if (v * 2) % 1 != 0:
-        raise ValidationError("Stars must be in increments of 0.5")
+    try:
+        validate_ratings([value])
+    except ValidationError as exc:
+        raise ValidationError(exc.message_dict["0"])
+
+
+class TrackedModel(models.Model):
+    # Remembers the column values an instance was loaded or last saved
+    # with. An update through save() only writes the columns that changed,
+    # and a save with no changes runs no query and sends no signals.
+    untracked_fields = ()
+    _loaded = None
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self.remember_loaded(fields)
+
+    def remember_loaded(self, names=None, saved=False):
+        # Values that were just saved may be strings from a form or a
+        # test, so they are converted the way the column would read back.
+        if self._loaded is None:
+            self._loaded = {}
+        for field in self._meta.concrete_fields:
+            if field.attname not in self.__dict__:
+                continue
+            if names is None or field.name in names or field.attname in names:
+                value = self.__dict__[field.attname]
+                if isinstance(value, FieldFile):
+                    value = value.name
+                elif saved:
+                    try:
+                        value = field.to_python(value)
+                    except ValidationError:
+                        pass
+                self._loaded[field.attname] = value
 
+    def loaded_values(self, *attnames):
+        # The loaded values of attnames, or None if any was not loaded.
+        loaded = self._loaded or {}
+        if not all(name in loaded for name in attnames):
+            return None
+        return tuple(loaded[name] for name in attnames)
 
-class Album(models.Model):
+    def has_changed(self, field):
+        loaded = self._loaded or {}
+        if field.attname not in loaded:
+            return True
+        old, new = loaded[field.attname], self.__dict__[field.attname]
+        if old == new:
+            return False
+        # "5.00" and Decimal("5.00") are the same column value.
+        try:
+            return field.to_python(old) != field.to_python(new)
+        except ValidationError:
+            return True
+
+    def changed_fields(self):
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.name not in self.untracked_fields
+            and field.attname in self.__dict__
+            and self.has_changed(field)
+        ]
+
+    def inserting(self, kwargs):
+        # A loaded instance with no pk is a copy (obj.pk = None) or was
+        # deleted; either way save() inserts it.
+        return (
+            self._state.adding
+            or self.pk is None
+            or kwargs.get("force_insert")
+        )
+
+    def save(self, *args, **kwargs):
+        if (
+            not self.inserting(kwargs)
+            and kwargs.get("update_fields") is None
+        ):
+            kwargs["update_fields"] = self.changed_fields()
+        super().save(*args, **kwargs)
+        self.remember_loaded(kwargs.get("update_fields"), saved=True)
+
+
+class Album(TrackedModel):
     FORMAT_CHOICES = [
         ('SNGL', 'Single'),
         ('RMST', 'Remaster'),
@@ -77,8 +196,42 @@ class Album(models.Model):
         editable=False
     )
 
+    # Summary columns maintained by the handlers in signals.py
+    song_count = models.PositiveIntegerField(default=0, editable=False)
+    total_length = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.DecimalField(
+        max_digits=12,
+        decimal_places=1,
+        default=Decimal("0.0"),
+        editable=False
+    )
+
+    SUMMARY_FIELDS = (
+        "song_count", "total_length", "rating_count", "rating_sum"
+    )
+
+    # The summary columns are only ever written with F() updates, so a
+    # stale in-memory copy must not overwrite them on a normal save.
+    untracked_fields = SUMMARY_FIELDS
+
     def save(self, *args, **kwargs):
-        self.slug = slugify(self.title or "")
+        if self.inserting(kwargs):
+            if not self._state.adding:
+                # A copy starts with no songs or ratings of its own.
+                for name in self.SUMMARY_FIELDS:
+                    setattr(
+                        self, name, self._meta.get_field(name).get_default()
+                    )
+            self.slug = slugify(self.title or "")
+            return super().save(*args, **kwargs)
+        fields = kwargs.get("update_fields")
+        if fields is None:
+            fields = self.changed_fields()
+        if "title" in fields:
+            self.slug = slugify(self.title or "")
+            fields = [*fields, "slug"]
+        kwargs["update_fields"] = fields
         return super().save(*args, **kwargs)
 
     class Meta:
@@ -86,9 +239,36 @@ class Album(models.Model):
             models.UniqueConstraint(
                 fields=['title', 'artist_name', 'format'],
                 name='unique_title_artist_format')]
+        indexes = [
+            models.Index(fields=["song_count"], name="album_song_count_idx"),
+            models.Index(
+                fields=["total_length"],
+                name="album_total_length_idx"
+            ),
+            models.Index(
+                fields=["rating_count"],
+                name="album_rating_count_idx"
+            ),
+            models.Index(fields=["rating_sum"], name="album_rating_sum_idx"),
+            models.Index(fields=["artist_name"], name="album_artist_name_idx"),
+            models.Index(fields=["format"], name="album_format_idx"),
+            models.Index(
+                fields=["release_date"],
+                name="album_release_date_idx"
+            ),
+            models.Index(
+                fields=["retail_price"],
+                name="album_retail_price_idx"
+            ),
+            # Media access checks (media.py) look albums up by cover.
+            models.Index(
+                fields=["cover_image"],
+                name="album_cover_image_idx"
+            ),
+        ]
 
 
-class Song(models.Model):
+class Song(TrackedModel):
     title = models.CharField(max_length=800, null=False, blank=False)
     length = models.PositiveIntegerField(
         validators=[MinValueValidator(10)]
@@ -103,6 +283,18 @@ class Song(models.Model):
         on_delete=models.CASCADE,
         related_name="songs"
     )
+    # Set by process_audio once an AudioUpload has been checked (audio.py).
+    audio = models.FileField(upload_to="audio/", blank=True, editable=False)
+    audio_sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False
+    )
+    audio_duration = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False
+    )
 
     class Meta:
         constraints = [
@@ -110,7 +302,15 @@ class Song(models.Model):
                 fields=["album", "title"],
                 name="unique_album_title")
             ]
-        ordering = ["position"]
+        indexes = [
+            models.Index(
+                fields=["album", "position"],
+                name="song_album_position_idx"
+            ),
+            models.Index(fields=["length"], name="song_length_idx"),
+            models.Index(fields=["audio"], name="song_audio_idx"),
+        ]
+        ordering = ["position", "id"]
 
     def save(self, *args, **kwargs):
         if self.pk is None and self.position is None:
@@ -124,7 +324,47 @@ class Song(models.Model):
                 self.position = last.position + 1
             else:
                 self.position = 1
-        return super().save(*args, **kwargs)
+        with transaction.atomic():
+            return super().save(*args, **kwargs)
+
+
+class AudioUpload(models.Model):
+    # A resumable upload of Song.audio. Chunks are appended to a part file
+    # until received == size; process_audio then checks the file and moves
+    # it into storage.
+    STATUS_CHOICES = [
+        ("uploading", "Uploading"),
+        ("complete", "Complete"),
+        ("ready", "Ready"),
+        ("rejected", "Rejected"),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    song = models.ForeignKey(
+        "Song",
+        on_delete=models.CASCADE,
+        related_name="audio_uploads"
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    # Optional checksum sent by the client, verified after the last chunk
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default="uploading"
+    )
+    error = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "created_at"],
+                name="audio_upload_status_idx"
+            ),
+        ]
 
 
 class Playlist(models.Model):
@@ -134,7 +374,7 @@ class Playlist(models.Model):
         (2, "Public"),
     ]
     name = models.CharField(max_length=800)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     songs = models.ManyToManyField(
         'Song',
         blank=True,
@@ -153,6 +393,25 @@ class Playlist(models.Model):
 class DottifyUser(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     display_name = models.CharField(max_length=800)
+    display_slug = models.SlugField(
+        max_length=800,
+        default="",
+        editable=False
+    )
+    # Set whenever one of the user's playlists changes; the cached profile
+    # page is keyed on it (see views.profile_playlists).
+    playlists_changed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False
+    )
+
+    def save(self, *args, **kwargs):
+        self.display_slug = slugify(self.display_name or "")
+        fields = kwargs.get("update_fields")
+        if fields is not None and "display_name" in fields:
+            kwargs["update_fields"] = [*fields, "display_slug"]
+        return super().save(*args, **kwargs)
 
 
 class Rating(models.Model):
@@ -164,18 +423,36 @@ class Rating(models.Model):
             MaxValueValidator(Decimal("5.0")),
             validate_rating
         ])
+    # Ratings and comments may live in another database than their album
+    # (see sharding.py), so their foreign keys have no DB constraint.
     album = models.ForeignKey(
         "Album",
         on_delete=models.CASCADE,
         related_name="ratings",
         null=True,
-        blank=True
+        blank=True,
+        db_constraint=False
     )
     created_at = models.DateTimeField(
         auto_now_add=True,
         null=True,
         blank=True)
 
+    objects = ShardedManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="rating_created_at_idx"),
+            models.Index(
+                fields=["album", "created_at"],
+                name="rating_album_created_idx"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     comment_text = models.CharField(max_length=800)
@@ -184,11 +461,106 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         related_name="comments",
         null=True,
-        blank=True
+        blank=True,
+        db_constraint=False,
+        db_index=False
     )
     user = models.ForeignKey(
         "DottifyUser",
         on_delete=models.CASCADE,
         related_name="comments",
         null=True,
-        blank=True)
+        blank=True,
+        db_constraint=False)
+
+    objects = ShardedManager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination in comments.py; also serves album lookups.
+            models.Index(fields=["album", "id"], name="comment_album_id_idx"),
+        ]
+
+
+class AlbumRanking(models.Model):
+    # Materialised leaderboards, rebuilt by the rank_albums command.
+    BOARD_CHOICES = [
+        ("top", "Top rated"),
+        ("trending_7", "Trending (7 days)"),
+        ("trending_30", "Trending (30 days)"),
+    ]
+    board = models.CharField(max_length=16, choices=BOARD_CHOICES)
+    rank = models.PositiveIntegerField()
+    album = models.ForeignKey(
+        "Album",
+        on_delete=models.CASCADE,
+        related_name="rankings"
+    )
+    score = models.FloatField()
+    rating_count = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["board", "rank"],
+                name="unique_board_rank")
+            ]
+        ordering = ["board", "rank"]
+
+
+class SimilarSong(models.Model):
+    # Top-K playlist co-occurrence neighbours per song, rebuilt offline by
+    # the build_song_neighbours command.
+    song = models.ForeignKey(
+        "Song",
+        on_delete=models.CASCADE,
+        related_name="similar_entries"
+    )
+    similar = models.ForeignKey(
+        "Song",
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    rank = models.PositiveIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["song", "rank"],
+                name="unique_song_similar_rank")
+            ]
+        ordering = ["song", "rank"]
+
+
+class RequestProfile(models.Model):
+    # cProfile output for one request, captured by ProfilingMiddleware.
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=800)
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    sql = models.JSONField(default=list)
+    stats = models.BinaryField()
+
+    class Meta:
+        ordering = ["-created_at"]
+
+
+class IngestCheckpoint(models.Model):
+    # How far flush_ratings has applied the write-behind log (ingest.py).
+    # Updated in the same transaction as the rows it covers.
+    name = models.CharField(max_length=50, unique=True)
+    segment = models.PositiveIntegerField(default=1)
+    offset = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,56 @@
+# Ownership rules shared by the HTML views and the API.
+#
+# DottifyAdmin members may edit everything and artists may edit their own
+# albums and the songs on them. editable_albums()/editable_songs() express
+# that as a queryset filter, so a whole list is checked in one query; the
+# per-object helpers compare ids that are already loaded. Role membership
+# comes from the per-request cache in roles.py.
+
+from django.db.models import Q
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+
+from .models import Album, Song
+from .roles import is_admin, is_artist, owns_album, user_profile
+
+
+def album_filter(user, prefix=""):
+    # None means the user may edit nothing.
+    if is_admin(user):
+        return Q()
+    profile = user_profile(user)
+    if is_artist(user) and profile is not None:
+        return Q(**{f"{prefix}artist_account_id": profile.id})
+    return None
+
+
+def editable_albums(user, queryset=None):
+    if queryset is None:
+        queryset = Album.objects.all()
+    q = album_filter(user)
+    return queryset.none() if q is None else queryset.filter(q)
+
+
+def editable_songs(user, queryset=None):
+    if queryset is None:
+        queryset = Song.objects.all()
+    q = album_filter(user, prefix="album__")
+    return queryset.none() if q is None else queryset.filter(q)
+
+
+def can_manage_music(user):
+    return is_artist(user) or is_admin(user)
+
+
+def can_edit_album(user, album):
+    return is_admin(user) or (is_artist(user) and owns_album(user, album))
+
+
+class MusicOwnerPermission(BasePermission):
+    # Anyone may read; writes need the Artist or DottifyAdmin role. Which
+    # objects can be written is enforced by the view's queryset.
+    message = "You must be an artist or DottifyAdmin"
+
+    def has_permission(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        return can_manage_music(request.user)
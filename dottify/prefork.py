@@ -0,0 +1,236 @@
+# A preforking WSGI server for the runprefork command.
+#
+# The master imports Django and warms it up before forking: it builds the
+# WSGI handler and its middleware, compiles every URL pattern, populates
+# the reverse lookup tables and loads the templates into the cached loader
+# (templating.py). gc.freeze() then moves all of that into the permanent
+# generation, so the garbage collector never touches those objects in a
+# worker and the pages stay shared copy-on-write. Each worker serves up to
+# max_requests requests (plus up to 10% jitter, so workers are not all
+# replaced at once) and exits, and the master forks a fresh one in its
+# place.
+#
+# Workers accept from the socket the master opened. Set DOTTIFY_METRICS_DIR
+# so that /metrics adds up every worker; a worker flushes its metrics when
+# it is recycled or stopped with SIGTERM.
+#
+# Each worker handles one connection at a time on Django's wsgiref server.
+# A connection that sends or reads nothing for DOTTIFY_PREFORK_TIMEOUT
+# seconds is dropped, but a slow client still ties up a worker until then.
+# Do not expose runprefork to the internet directly: put it behind a
+# reverse proxy (nginx) that buffers requests and responses.
+
+import gc
+import io
+import os
+import random
+import signal
+import sys
+import time
+import traceback
+
+from django.core.servers.basehttp import (
+    ServerHandler,
+    WSGIRequestHandler,
+    WSGIServer,
+    get_internal_wsgi_application
+)
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+
+from . import metrics
+from .templating import all_template_dirs, precompile
+
+
+def compile_patterns(resolver):
+    count = 0
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        count += 1
+        if isinstance(pattern, URLResolver):
+            count += compile_patterns(pattern)
+    return count
+
+
+def warm():
+    # Returns settings.WSGI_APPLICATION and what was loaded.
+    application = get_internal_wsgi_application()
+    resolver = get_resolver()
+    loaded = {
+        "patterns": compile_patterns(resolver),
+        "templates": len(precompile(all_template_dirs())[0]),
+    }
+    resolver.reverse_dict
+    # Workers must open their own database connections.
+    connections.close_all()
+    return application, loaded
+
+
+class SendfileServerHandler(ServerHandler):
+    # Sends a wsgi.file_wrapper response with os.sendfile(): Content-Length
+    # bytes from the file's current position, like gunicorn.
+
+    def sendfile(self):
+        length = self.headers.get("Content-Length")
+        try:
+            fd = self.result.filelike.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return False
+        if length is None:
+            return False
+        offset = os.lseek(fd, 0, os.SEEK_CUR)
+        remaining = int(length)
+        if not self.headers_sent:
+            self.send_headers()
+        self._flush()
+        out = self.request_handler.connection.fileno()
+        while remaining:
+            sent = os.sendfile(out, fd, offset, remaining)
+            if not sent:
+                break
+            offset += sent
+            remaining -= sent
+            self.bytes_sent += sent
+        return True
+
+
+class SendfileRequestHandler(WSGIRequestHandler):
+
+    def handle_one_request(self):
+        # Django's version, with SendfileServerHandler.
+        self.raw_requestline = self.rfile.readline(65537)
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ""
+            self.request_version = ""
+            self.command = ""
+            self.send_error(414)
+            return
+        if not self.parse_request():
+            return
+        handler = SendfileServerHandler(
+            self.rfile, self.wfile, self.get_stderr(), self.get_environ()
+        )
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+
+class QuietRequestHandler(SendfileRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class PreforkWSGIServer(WSGIServer):
+    # Counts the requests a worker has served, and puts a timeout on every
+    # accepted connection so a stalled client cannot hold a worker forever.
+    connection_timeout = 30
+    served = 0
+
+    def get_request(self):
+        connection, address = super().get_request()
+        connection.settimeout(self.connection_timeout)
+        return connection, address
+
+    def process_request(self, request, client_address):
+        self.served += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], TimeoutError):
+            return
+        super().handle_error(request, client_address)
+
+
+class PreforkServer:
+
+    def __init__(self, application, address, workers, max_requests,
+                 log=print, access_log=False, timeout=30):
+        self.application = application
+        self.address = address
+        self.worker_count = workers
+        self.max_requests = max_requests
+        self.log = log
+        self.handler = SendfileRequestHandler if access_log else (
+            QuietRequestHandler
+        )
+        self.timeout = timeout
+        self.workers = set()
+        self.stopping = False
+
+    def run(self):
+        self.server = PreforkWSGIServer(
+            self.address, self.handler, allow_reuse_address=True
+        )
+        self.server.connection_timeout = self.timeout
+        self.server.set_app(self.application)
+        host, port = self.server.server_address[:2]
+        self.log(f"Listening on http://{host}:{port}/ (master {os.getpid()})")
+        gc.collect()
+        gc.freeze()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.worker_count):
+            self.spawn()
+        while True:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            self.workers.discard(pid)
+            if self.stopping:
+                continue
+            if os.waitstatus_to_exitcode(status):
+                # Do not fork in a tight loop if workers keep crashing.
+                self.log(f"Worker {pid} failed")
+                time.sleep(1)
+            self.spawn()
+        self.server.server_close()
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def spawn(self):
+        # A SIGTERM that arrives mid-fork waits until the master has recorded
+        # the worker and the worker has its own handler, or it is lost.
+        stop_signals = {signal.SIGTERM, signal.SIGINT}
+        signal.pthread_sigmask(signal.SIG_BLOCK, stop_signals)
+        pid = os.fork()
+        if pid:
+            self.workers.add(pid)
+            self.log(f"Worker {pid} started")
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, stop_signals)
+            return
+        # The master stops the workers; ^C is for the master alone. SIGTERM
+        # lets the current request finish, and the wait for the next one
+        # wakes up every second to notice it.
+        self.exiting = False
+        signal.signal(signal.SIGTERM, self.exit_worker)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, stop_signals)
+        self.server.timeout = 1
+        random.seed()
+        code = 0
+        try:
+            limit = self.max_requests + random.randint(
+                0, self.max_requests // 10
+            )
+            while self.server.served < limit and not self.exiting:
+                self.server.handle_request()
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            # os._exit() skips atexit, which would flush the metrics.
+            try:
+                metrics.flush()
+            except Exception:
+                traceback.print_exc()
+            sys.stdout.flush()
+            os._exit(code)
+
+    def exit_worker(self, signum, frame):
+        self.exiting = True
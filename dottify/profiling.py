@@ -0,0 +1,141 @@
+# Opt-in request profiling for staff users.
+#
+# A staff user gets a signed token from make_profile_token() (or the
+# profile_token command) and sends it as ?_profile=<token> or in the
+# X-Dottify-Profile header. ProfilingMiddleware then runs that request
+# under cProfile and stores the stats and SQL trace as a RequestProfile,
+# which the admin lists and offers as pstats or speedscope downloads.
+
+import json
+import marshal
+import pstats
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from .models import RequestProfile
+
+SALT = "dottify.profile"
+QUERY_PARAM = "_profile"
+HEADER = "HTTP_X_DOTTIFY_PROFILE"
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def make_profile_token(user):
+    return signing.TimestampSigner(salt=SALT).sign(str(user.pk))
+
+
+def wants_profile(request):
+    token = request.GET.get(QUERY_PARAM) or request.META.get(HEADER)
+    if not token or not request.user.is_staff:
+        return False
+    max_age = setting("DOTTIFY_PROFILE_TOKEN_MAX_AGE", 60 * 60)
+    try:
+        value = signing.TimestampSigner(salt=SALT).unsign(
+            token, max_age=max_age
+        )
+    except signing.BadSignature:
+        return False
+    return value == str(request.user.pk)
+
+
+def capped_stats(profiler, max_bytes):
+    # Keeps the most expensive functions until the marshalled stats fit.
+    stats = pstats.Stats(profiler).stats
+    data = marshal.dumps(stats)
+    if len(data) <= max_bytes:
+        return data
+    ranked = sorted(stats, key=lambda f: stats[f][3], reverse=True)
+    keep = len(ranked)
+    while keep > 1 and len(data) > max_bytes:
+        keep //= 2
+        kept = set(ranked[:keep])
+        data = marshal.dumps({
+            func: (cc, nc, tt, ct, {
+                caller: v for caller, v in callers.items()
+                if caller in kept
+            })
+            for func, (cc, nc, tt, ct, callers) in stats.items()
+            if func in kept
+        })
+    return data
+
+
+def capped_sql(queries, max_bytes):
+    # Keeps queries in the order they ran until the JSON would pass
+    # max_bytes, then ends with one entry for the ones left out (64 bytes
+    # are kept back for it).
+    kept = []
+    size = 2 + 64
+    for index, (sql, duration) in enumerate(queries):
+        entry = [sql, round(duration * 1000, 3)]
+        size += len(json.dumps(entry)) + 2
+        if size > max_bytes:
+            rest = queries[index:]
+            kept.append([
+                f"-- {len(rest)} more queries not stored",
+                round(sum(d for _, d in rest) * 1000, 3),
+            ])
+            break
+        kept.append(entry)
+    return kept
+
+
+def store_profile(request, response, profiler, recorder, duration):
+    now = timezone.now()
+    RequestProfile.objects.filter(expires_at__lt=now).delete()
+
+    match = getattr(request, "resolver_match", None)
+    ttl = setting("DOTTIFY_PROFILE_TTL_HOURS", 24)
+    max_bytes = setting("DOTTIFY_PROFILE_MAX_BYTES", 512 * 1024)
+    # The SQL trace may use up to half of the budget, the stats the rest.
+    sql = capped_sql(recorder.queries, max_bytes // 2)
+    return RequestProfile.objects.create(
+        expires_at=now + timedelta(hours=ttl),
+        user=request.user,
+        method=request.method,
+        path=request.get_full_path()[:800],
+        view_name=match.view_name if match else "",
+        status_code=response.status_code,
+        duration_ms=duration * 1000,
+        query_count=len(recorder.queries),
+        sql=sql,
+        stats=capped_stats(profiler, max_bytes - len(json.dumps(sql))),
+    )
+
+
+def load_stats(profile):
+    return marshal.loads(bytes(profile.stats))
+
+
+def to_speedscope(profile):
+    # pstats keeps per-function totals rather than stacks, so each function
+    # becomes one sample weighted by its own time.
+    stats = load_stats(profile)
+    frames = []
+    samples = []
+    weights = []
+    for (filename, line, name), (cc, nc, tt, ct, callers) in stats.items():
+        frames.append({"name": name, "file": filename, "line": line})
+        samples.append([len(frames) - 1])
+        weights.append(tt)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": f"{profile.method} {profile.path}",
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+        "name": f"{profile.method} {profile.path}",
+        "exporter": "dottify",
+    }
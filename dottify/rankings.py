@@ -0,0 +1,101 @@
+# Leaderboard job behind /api/albums/top/ and /api/albums/trending/.
+#
+# The top board uses a Bayesian average over the album summary columns:
+#   score = (C * m + rating_sum) / (C + rating_count)
+# where m is the mean rating across all albums and C is the prior weight,
+# so an album with two 5-star ratings does not outrank one with hundreds.
+# The trending boards rank by ratings per day inside the window.
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import Album, AlbumRanking, Rating
+
+LEADERBOARD_SIZE = getattr(settings, "DOTTIFY_LEADERBOARD_SIZE", 100)
+PRIOR_WEIGHT = getattr(settings, "DOTTIFY_RANKING_PRIOR_WEIGHT", 10)
+TRENDING_WINDOWS = {"trending_7": 7, "trending_30": 30}
+
+
+def top_rows(now, size=LEADERBOARD_SIZE, prior_weight=PRIOR_WEIGHT):
+    totals = Album.objects.aggregate(
+        stars=Sum("rating_sum"), count=Sum("rating_count")
+    )
+    if not totals["count"]:
+        return []
+    mean = float(totals["stars"]) / totals["count"]
+
+    score = ExpressionWrapper(
+        (prior_weight * mean + Cast("rating_sum", FloatField()))
+        / (prior_weight + F("rating_count")),
+        output_field=FloatField()
+    )
+    albums = (
+        Album.objects.filter(rating_count__gt=0)
+        .annotate(score=score)
+        .order_by("-score", "-rating_count", "id")
+        .values_list("id", "score", "rating_count")[:size]
+    )
+    return [
+        AlbumRanking(
+            board="top", rank=rank, album_id=album_id, score=value,
+            rating_count=count, computed_at=now
+        )
+        for rank, (album_id, value, count) in enumerate(albums, start=1)
+    ]
+
+
+def trending_rows(board, days, now, size=LEADERBOARD_SIZE):
+    # An album's ratings are all in one shard, so each shard's top rows
+    # can be merged directly.
+    recent = []
+    for ratings in Rating.objects.each_shard():
+        recent += (
+            ratings.filter(
+                created_at__gte=now - timedelta(days=days),
+                album__isnull=False
+            )
+            .values("album")
+            .annotate(count=Count("id"), stars=Sum("stars"))
+            .order_by("-count", "-stars", "album")[:size]
+        )
+    recent.sort(key=lambda row: (-row["count"], -row["stars"], row["album"]))
+    return [
+        AlbumRanking(
+            board=board, rank=rank, album_id=row["album"],
+            score=row["count"] / days, rating_count=row["count"],
+            computed_at=now
+        )
+        for rank, row in enumerate(recent[:size], start=1)
+    ]
+
+
+def rebuild_leaderboards(boards=None, now=None):
+    now = now or timezone.now()
+    if boards is None:
+        boards = ["top"] + list(TRENDING_WINDOWS)
+
+    rows = []
+    for board in boards:
+        if board == "top":
+            rows += top_rows(now)
+        else:
+            rows += trending_rows(board, TRENDING_WINDOWS[board], now)
+
+    # Readers see either the old boards or the new ones, never a mix.
+    with transaction.atomic():
+        AlbumRanking.objects.filter(board__in=boards).delete()
+        AlbumRanking.objects.bulk_create(rows)
+    return len(rows)
+
+
+def leaderboard(board, limit=LEADERBOARD_SIZE):
+    return (
+        AlbumRanking.objects.filter(board=board, rank__lte=limit)
+        .select_related("album")
+        .order_by("rank")
+    )
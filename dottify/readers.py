@@ -0,0 +1,142 @@
+# Read path for the API list endpoints.
+#
+# A ValuesReader turns a queryset into the same list of dicts as its
+# ModelSerializer without creating a model instance or serializer per row.
+# Rows come from .values_list(). Each value is converted by the serializer's
+# own field object, which is built once per request. A to-many field is
+# loaded by the reader's get_<field>(ids) method, with one query per
+# BATCH_SIZE rows. test_readers.py compares the JSON byte for byte with the
+# serializers.
+
+from collections import defaultdict
+
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject, RelatedField
+from rest_framework.response import Response
+
+from .models import Playlist, Song
+from .serializers import AlbumSerializer, PlaylistSerializer, SongSerializer
+
+BATCH_SIZE = 900
+
+# Fields whose to_representation() returns database values unchanged.
+PLAIN_FIELDS = (
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+)
+
+
+def batches(ids):
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+class ValuesReader:
+    serializer_class = None
+
+    def __init__(self, context=None):
+        serializer = self.serializer_class(context=context or {})
+        self.fields = serializer.fields
+
+    def converter(self, field):
+        if isinstance(field, PLAIN_FIELDS):
+            return None
+        if isinstance(field, RelatedField):
+            return lambda pk: field.to_representation(PKOnlyObject(pk))
+        if isinstance(field, serializers.FileField):
+            model_field = self.serializer_class.Meta.model._meta.get_field(
+                field.source
+            )
+            return lambda name: field.to_representation(
+                model_field.attr_class(None, model_field, name)
+            )
+        return field.to_representation
+
+    def read(self, queryset):
+        plan = []
+        columns = ["pk"]
+        for name, field in self.fields.items():
+            method = getattr(self, f"get_{name}", None)
+            if method is not None:
+                plan.append((name, None, method))
+            else:
+                plan.append((name, len(columns), self.converter(field)))
+                columns.append(field.source.replace(".", "__"))
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        rows = list(queryset.values_list(*columns))
+        ids = [row[0] for row in rows]
+        loaded = {
+            name: method(ids)
+            for name, index, method in plan if index is None
+        }
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, index, convert in plan:
+                if index is None:
+                    item[name] = loaded[name].get(row[0], [])
+                    continue
+                value = row[index]
+                if value is not None and convert is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
+        return data
+
+
+class AlbumReader(ValuesReader):
+    serializer_class = AlbumSerializer
+
+    def get_song_set(self, ids):
+        titles = defaultdict(list)
+        for chunk in batches(ids):
+            rows = Song.objects.filter(album_id__in=chunk).values_list(
+                "album_id", "title"
+            )
+            for album_id, title in rows:
+                titles[album_id].append(title)
+        return titles
+
+
+class SongReader(ValuesReader):
+    serializer_class = SongSerializer
+
+
+class PlaylistReader(ValuesReader):
+    serializer_class = PlaylistSerializer
+
+    def get_songs(self, ids):
+        song_ids = defaultdict(list)
+        for chunk in batches(ids):
+            rows = (
+                Playlist.songs.through.objects
+                .filter(playlist_id__in=chunk)
+                .order_by("song__position", "song_id")
+                .values_list("playlist_id", "song_id")
+            )
+            for playlist_id, song_id in rows:
+                song_ids[playlist_id].append(song_id)
+        field = self.fields["songs"]
+        return {pk: field.links(songs) for pk, songs in song_ids.items()}
+
+
+class ValuesListMixin:
+    # list() returns reader_class's output instead of serializing model
+    # instances. Paginated views and DOTTIFY_VALUES_READS=False use the
+    # serializer.
+    reader_class = None
+
+    def list(self, request, *args, **kwargs):
+        if (
+            self.reader_class is None
+            or self.paginator is not None
+            or not getattr(settings, "DOTTIFY_VALUES_READS", True)
+        ):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        reader = self.reader_class(context=self.get_serializer_context())
+        return Response(reader.read(queryset))
@@ -0,0 +1,112 @@
+# Offline "more like this" job built on playlist co-occurrence.
+#
+# Two songs co-occur once for every playlist containing both. Counts are
+# normalised with cosine similarity, count / sqrt(freq(a) * freq(b)), so
+# songs that appear in every playlist do not dominate every list. Only
+# public playlists count, so the lists never reveal what is in a private
+# or unlisted one.
+#
+# The song x song matrix is never held in full: source songs are processed
+# in chunks, and only the sparse rows for the current chunk live in memory
+# before being cut down to the top K and written to SimilarSong.
+
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Playlist, SimilarSong, Song
+
+TOP_K = getattr(settings, "DOTTIFY_SIMILAR_SONGS", 10)
+CHUNK_SIZE = 500
+
+PlaylistSong = Playlist.songs.through
+
+
+def public_memberships():
+    return PlaylistSong.objects.filter(playlist__visibility=2)
+
+
+def playlist_frequencies():
+    rows = (
+        public_memberships().values("song_id")
+        .annotate(n=Count("playlist_id", distinct=True))
+        .values_list("song_id", "n")
+    )
+    return dict(rows)
+
+
+def cooccurrence_chunk(source_ids):
+    sources = set(source_ids)
+    owners = defaultdict(list)
+    memberships = public_memberships().filter(song_id__in=source_ids)
+    for playlist_id, song_id in memberships.values_list(
+        "playlist_id", "song_id"
+    ).iterator():
+        owners[playlist_id].append(song_id)
+
+    rows = {song_id: Counter() for song_id in sources}
+    neighbours = public_memberships().filter(
+        playlist_id__in=memberships.values("playlist_id")
+    )
+    for playlist_id, song_id in neighbours.values_list(
+        "playlist_id", "song_id"
+    ).iterator():
+        for source in owners[playlist_id]:
+            if source != song_id:
+                rows[source][song_id] += 1
+    return rows
+
+
+def top_neighbours(song_id, row, freq, k):
+    scored = (
+        (count / math.sqrt(freq[song_id] * freq[other]), other)
+        for other, count in row.items()
+    )
+    return heapq.nlargest(k, scored)
+
+
+def build_similar_songs(k=TOP_K, chunk_size=CHUNK_SIZE):
+    freq = playlist_frequencies()
+    song_ids = sorted(freq)
+    written = 0
+    for start in range(0, len(song_ids), chunk_size):
+        chunk = song_ids[start:start + chunk_size]
+        entries = []
+        for song_id, row in cooccurrence_chunk(chunk).items():
+            best = top_neighbours(song_id, row, freq, k)
+            for rank, (score, other) in enumerate(best, start=1):
+                entries.append(SimilarSong(
+                    song_id=song_id, similar_id=other,
+                    rank=rank, score=score
+                ))
+        with transaction.atomic():
+            SimilarSong.objects.filter(song_id__in=chunk).delete()
+            SimilarSong.objects.bulk_create(entries)
+        written += len(entries)
+
+    # Songs that have dropped out of every public playlist keep no
+    # neighbours.
+    SimilarSong.objects.exclude(
+        song_id__in=public_memberships().values("song_id")
+    ).delete()
+    return written
+
+
+def similar_songs(song_id, limit=TOP_K):
+    ids = list(
+        SimilarSong.objects.filter(song_id=song_id, rank__lte=limit)
+        .order_by("rank")
+        .values_list("similar_id", "score")
+    )
+    songs = Song.objects.in_bulk([similar_id for similar_id, _ in ids])
+    result = []
+    for similar_id, score in ids:
+        if similar_id in songs:
+            song = songs[similar_id]
+            song.similarity = score
+            result.append(song)
+    return result
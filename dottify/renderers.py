@@ -0,0 +1,81 @@
+# Extra API formats. orjson and msgpack are optional: without them the
+# fast JSON renderer falls back to DRF's encoder and the MessagePack
+# renderer/parser are left out of content negotiation.
+
+from django.conf import settings
+from rest_framework.utils import encoders
+from rest_framework.exceptions import ParseError
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_encoder = encoders.JSONEncoder()
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Same output as JSONRenderer, but rendered with orjson when it is
+    # installed and DOTTIFY_FAST_JSON is on. Indented output still goes
+    # through the standard renderer.
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        use_orjson = orjson is not None and getattr(
+            settings, "DOTTIFY_FAST_JSON", True
+        )
+        if not use_orjson or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like json.dumps(), non-str keys (e.g. a list serializer's error
+        # indexes) are converted rather than rejected.
+        return orjson.dumps(
+            data,
+            default=_encoder.default,
+            option=orjson.OPT_NON_STR_KEYS
+        )
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+    available = msgpack is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_encoder.default)
+
+
+class MessagePackParser(BaseParser):
+    media_type = "application/msgpack"
+    available = msgpack is not None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except Exception as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
+
+
+class AvailableContentNegotiation(DefaultContentNegotiation):
+    # Skips renderers and parsers whose optional library is missing.
+
+    def select_parser(self, request, parsers):
+        parsers = [p for p in parsers if getattr(p, "available", True)]
+        return super().select_parser(request, parsers)
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderers = [r for r in renderers if getattr(r, "available", True)]
+        return super().select_renderer(request, renderers, format_suffix)
@@ -0,0 +1,56 @@
+# Role and profile lookups for the logged in user.
+#
+# The first role or profile check on a user fetches the group names and
+# the DottifyUser row and caches them on the user object, so they are
+# fetched at most once per request and never for requests that do not ask.
+
+from .models import DottifyUser
+
+ADMIN_ROLE = "DottifyAdmin"
+ARTIST_ROLE = "Artist"
+
+
+def load_roles(user):
+    if user.is_authenticated:
+        user.dottify_roles = frozenset(
+            user.groups.values_list("name", flat=True)
+        )
+        profile = DottifyUser.objects.filter(user_id=user.pk).first()
+        if profile is not None:
+            # Reuse the already loaded user rather than joining it again.
+            profile.user = user
+        user.dottify_profile = profile
+    return user
+
+
+def user_roles(user):
+    if not user.is_authenticated:
+        return frozenset()
+    if not hasattr(user, "dottify_roles"):
+        load_roles(user)
+    return user.dottify_roles
+
+
+def user_profile(user):
+    if not user.is_authenticated:
+        return None
+    if not hasattr(user, "dottify_profile"):
+        load_roles(user)
+    return user.dottify_profile
+
+
+def is_admin(user):
+    return ADMIN_ROLE in user_roles(user)
+
+
+def is_artist(user):
+    return ARTIST_ROLE in user_roles(user)
+
+
+def owns_album(user, album):
+    profile = user_profile(user)
+    return (
+        album is not None
+        and profile is not None
+        and album.artist_account_id == profile.id
+    )
@@ -1,10 +1,25 @@
 # Write your API serialisers here.
 
 from rest_framework import serializers
-from .models import Album, Song, Playlist
+from rest_framework.reverse import reverse
+from .filters import requested_fields
+from .models import (
+    Album, AlbumRanking, AudioUpload, Comment, Rating, Song, Playlist
+)
 
 
-class AlbumSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    # Drops every field not named in the request's ?fields= parameter.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = requested_fields(self.context.get("request"))
+        if wanted:
+            for name in set(self.fields) - set(wanted):
+                self.fields.pop(name)
+
+
+class AlbumSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     song_set = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -13,8 +28,11 @@ class AlbumSerializer(serializers.ModelSerializer):
             "id", "title", "artist_name", "retail_price",
             "format", "release_date", "slug",
             "cover_image", "song_set",
+            "song_count", "total_length", "rating_count", "rating_sum",
+        ]
+        read_only_fields = [
+            "slug", "song_count", "total_length", "rating_count", "rating_sum"
         ]
-        read_only_fields = ["slug"]
 
     def get_song_set(self, obj):
         titles = []
@@ -23,7 +41,7 @@ class AlbumSerializer(serializers.ModelSerializer):
         return titles
 
 
-class SongSerializer(serializers.ModelSerializer):
+class SongSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Song
         fields = [
@@ -31,13 +49,48 @@ class SongSerializer(serializers.ModelSerializer):
         ]
 
 
-class PlaylistSerializer(serializers.ModelSerializer):
+class SongLinksField(serializers.Field):
+    # Song detail URLs, or plain ids with ?song_ids=true. The URL is
+    # reversed once with a placeholder and each id is put in its place, so
+    # a long playlist costs one reverse() rather than one per song.
+    placeholder = "__pk__"
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def use_ids(self):
+        request = self.context.get("request")
+        return (
+            request is not None
+            and request.query_params.get("song_ids") == "true"
+        )
+
+    def url_parts(self):
+        if not hasattr(self, "_url_parts"):
+            url = reverse(
+                "song-detail",
+                kwargs={"pk": self.placeholder},
+                request=self.context.get("request"),
+                format=self.context.get("format"),
+            )
+            prefix, _, suffix = url.partition(self.placeholder)
+            self._url_parts = prefix, suffix
+        return self._url_parts
+
+    def links(self, ids):
+        if self.use_ids():
+            return list(ids)
+        prefix, suffix = self.url_parts()
+        return [f"{prefix}{pk}{suffix}" for pk in ids]
+
+    def to_representation(self, songs):
+        return self.links(song.pk for song in songs.all())
+
+
+class PlaylistSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     owner = serializers.CharField(source="owner.display_name", read_only=True)
-    songs = serializers.HyperlinkedRelatedField(
-        many=True,
-        read_only=True,
-        view_name="song-detail"
-    )
+    songs = SongLinksField()
 
     class Meta:
         model = Playlist
@@ -45,3 +98,58 @@ class PlaylistSerializer(serializers.ModelSerializer):
             "id", "name", "created_at", "visibility", "owner", "songs"
             ]
         read_only_fields = ["created_at", "visibility", "owner", "songs"]
+
+
+class AlbumRankingSerializer(serializers.ModelSerializer):
+    album = serializers.IntegerField(source="album_id", read_only=True)
+    title = serializers.CharField(source="album.title", read_only=True)
+    artist_name = serializers.CharField(
+        source="album.artist_name",
+        read_only=True
+    )
+    slug = serializers.CharField(source="album.slug", read_only=True)
+
+    class Meta:
+        model = AlbumRanking
+        fields = [
+            "rank", "score", "rating_count", "computed_at",
+            "album", "title", "artist_name", "slug",
+        ]
+
+
+class SimilarSongSerializer(serializers.ModelSerializer):
+    score = serializers.FloatField(source="similarity", read_only=True)
+
+    class Meta:
+        model = Song
+        fields = [
+            "id", "title", "length", "album", "score",
+        ]
+
+
+class CommentSerializer(serializers.ModelSerializer):
+    user = serializers.CharField(
+        source="user.display_name",
+        read_only=True,
+        allow_null=True
+    )
+
+    class Meta:
+        model = Comment
+        fields = ["id", "user", "comment_text"]
+
+
+class RatingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Rating
+        fields = ["stars"]
+
+
+class AudioUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AudioUpload
+        fields = [
+            "id", "song", "filename", "size", "sha256", "received",
+            "status", "error",
+        ]
+        read_only_fields = ["id", "song", "received", "status", "error"]
@@ -0,0 +1,138 @@
+# Ratings and comments are the append-heavy tables, so they can be spread
+# over several databases by album. Every rating and comment of an album
+# lives in DOTTIFY_RATING_SHARDS[album_id % len(shards)], and with SQLite
+# each shard is a separate file with its own write lock and its own, smaller
+# indexes. The default ["default"] keeps everything in the main database.
+#
+# Inserts through save(), create() and bulk_create() go to the album's
+# shard. Queries for one album use Rating.objects.for_album(album_id) or the
+# album's related managers (album.ratings), which ShardRouter sends to that
+# album's shard. Queries across albums loop over Rating.objects.each_shard().
+# After the shard list changes, the rebalance_shards command moves existing
+# rows to their new shard.
+
+from django.conf import settings
+from django.db import models, transaction
+
+SHARDED_MODELS = {("dottify", "rating"), ("dottify", "comment")}
+
+
+def shards():
+    return list(getattr(settings, "DOTTIFY_RATING_SHARDS", ["default"]))
+
+
+def shard_for(album_id):
+    aliases = shards()
+    return aliases[(album_id or 0) % len(aliases)]
+
+
+def is_sharded(model):
+    return (model._meta.app_label, model._meta.model_name) in SHARDED_MODELS
+
+
+class ShardedQuerySet(models.QuerySet):
+    # Saving an instance is routed by ShardRouter, but QuerySet.create()
+    # and bulk_create() write to self.db, which has no instance to go by.
+
+    def for_album(self, album_id):
+        return self.using(shard_for(album_id)).filter(album_id=album_id)
+
+    def each_shard(self):
+        for alias in shards():
+            yield self.using(alias)
+
+    def create(self, **kwargs):
+        if self._db is not None:
+            return super().create(**kwargs)
+        album = kwargs.get("album")
+        album_id = album.pk if album is not None else kwargs.get("album_id")
+        return self.using(shard_for(album_id)).create(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if self._db is not None:
+            return super().bulk_create(objs, *args, **kwargs)
+        by_shard = {}
+        for obj in objs:
+            by_shard.setdefault(shard_for(obj.album_id), []).append(obj)
+        created = []
+        for alias, group in by_shard.items():
+            created += self.using(alias).bulk_create(group, *args, **kwargs)
+        return created
+
+
+ShardedManager = models.Manager.from_queryset(ShardedQuerySet)
+
+
+class ShardRouter:
+    # Everything that is not sharded stays in "default".
+
+    def db_for(self, model, hints):
+        if not is_sharded(model):
+            return "default"
+        instance = hints.get("instance")
+        if instance is None:
+            return None
+        if is_sharded(type(instance)):
+            return shard_for(instance.album_id)
+        if instance._meta.model_name == "album":
+            return shard_for(instance.pk)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self.db_for(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self.db_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if (app_label, model_name) in SHARDED_MODELS:
+            return True
+        if db == "default":
+            return None
+        # Other databases only hold the sharded tables.
+        if app_label == "dottify" and model_name is None:
+            return None
+        return False
+
+
+def misplaced_albums(model, alias):
+    album_ids = (
+        model._base_manager.using(alias)
+        .values_list("album_id", flat=True)
+        .distinct()
+    )
+    return [pk for pk in album_ids if shard_for(pk) != alias]
+
+
+def insert_rows(model, objs, using):
+    # A plain multi-row INSERT: no signals, and auto_now_add values that are
+    # already set are kept rather than replaced with the current time.
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    model._base_manager._insert(objs, fields=fields, using=using, raw=True)
+
+
+def move_album_rows(model, album_id, source, batch_size=1000):
+    # Copies one album's rows to its shard and deletes them from source,
+    # without signals since the album summary does not change.
+    target = shard_for(album_id)
+    attnames = [
+        f.attname for f in model._meta.concrete_fields if not f.primary_key
+    ]
+    rows = model._base_manager.using(source).filter(album_id=album_id)
+    moved = 0
+    with transaction.atomic(using=target), transaction.atomic(using=source):
+        batch = []
+        for values in rows.values(*attnames).iterator(chunk_size=batch_size):
+            batch.append(model(**values))
+            if len(batch) >= batch_size:
+                insert_rows(model, batch, target)
+                moved += len(batch)
+                batch = []
+        if batch:
+            insert_rows(model, batch, target)
+            moved += len(batch)
+        rows._raw_delete(source)
+    return moved
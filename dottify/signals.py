@@ -0,0 +1,214 @@
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import (
+    m2m_changed,
+    pre_delete,
+    pre_save,
+    post_save,
+    post_delete
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .metrics import IMPORT_ROWS
+from .models import Album, Comment, DottifyUser, Playlist, Song, Rating
+from .sharding import shard_for
+
+
+def adjust_album(album_id, **deltas):
+    if album_id is None:
+        return
+    changes = {}
+    for field, delta in deltas.items():
+        if delta:
+            changes[field] = F(field) + delta
+    if changes:
+        Album.objects.filter(pk=album_id).update(**changes)
+
+
+@receiver(pre_save, sender=Song)
+def remember_song(sender, instance, **kwargs):
+    instance._summary_old = None
+    if instance.pk is not None and not instance._state.adding:
+        # Loaded instances know their old values; others are looked up.
+        instance._summary_old = instance.loaded_values("album_id", "length")
+        if instance._summary_old is None:
+            instance._summary_old = (
+                Song.objects.filter(pk=instance.pk)
+                .values_list("album_id", "length")
+                .first()
+            )
+
+
+@receiver(post_save, sender=Song)
+def song_saved(sender, instance, created, **kwargs):
+    old = getattr(instance, "_summary_old", None)
+    if created or old is None:
+        adjust_album(
+            instance.album_id,
+            song_count=1,
+            total_length=instance.length
+        )
+        return
+
+    old_album_id, old_length = old
+    if old_album_id != instance.album_id:
+        adjust_album(old_album_id, song_count=-1, total_length=-old_length)
+        adjust_album(
+            instance.album_id,
+            song_count=1,
+            total_length=instance.length
+        )
+    else:
+        adjust_album(
+            instance.album_id,
+            total_length=instance.length - old_length
+        )
+
+
+@receiver(post_delete, sender=Song)
+def song_deleted(sender, instance, **kwargs):
+    adjust_album(
+        instance.album_id,
+        song_count=-1,
+        total_length=-instance.length
+    )
+
+
+@receiver(pre_save, sender=Rating)
+def remember_rating(sender, instance, **kwargs):
+    instance._summary_old = None
+    if instance.pk is not None and not instance._state.adding:
+        db = instance._state.db or shard_for(instance.album_id)
+        instance._summary_old = (
+            Rating.objects.using(db).filter(pk=instance.pk)
+            .values_list("album_id", "stars")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance, created, **kwargs):
+    stars = Decimal(str(instance.stars))
+    old = getattr(instance, "_summary_old", None)
+    if created or old is None:
+        adjust_album(instance.album_id, rating_count=1, rating_sum=stars)
+        return
+
+    old_album_id, old_stars = old
+    if old_album_id != instance.album_id:
+        adjust_album(old_album_id, rating_count=-1, rating_sum=-old_stars)
+        adjust_album(instance.album_id, rating_count=1, rating_sum=stars)
+    else:
+        adjust_album(instance.album_id, rating_sum=stars - old_stars)
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance, **kwargs):
+    adjust_album(
+        instance.album_id,
+        rating_count=-1,
+        rating_sum=-Decimal(str(instance.stars))
+    )
+
+
+@receiver(post_delete, sender=Album)
+def delete_album_shard_rows(sender, instance, **kwargs):
+    # The deletion cascade only reaches rows in the album's own database.
+    if shard_for(instance.pk) != instance._state.db:
+        Rating.objects.for_album(instance.pk).delete()
+        Comment.objects.for_album(instance.pk).delete()
+
+
+@receiver(post_delete, sender=DottifyUser)
+def delete_user_shard_comments(sender, instance, **kwargs):
+    for comments in Comment.objects.each_shard():
+        if comments.db != instance._state.db:
+            comments.filter(user_id=instance.pk).delete()
+
+
+def touch_playlist_owners(owner_ids):
+    # Invalidates the owners' cached profile pages (views.py).
+    DottifyUser.objects.filter(pk__in=owner_ids).update(
+        playlists_changed_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=Playlist)
+@receiver(post_delete, sender=Playlist)
+def playlist_changed(sender, instance, **kwargs):
+    touch_playlist_owners([instance.owner_id])
+
+
+@receiver(m2m_changed, sender=Playlist.songs.through)
+def playlist_songs_changed(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not reverse:
+        if action.startswith("post_"):
+            touch_playlist_owners([instance.owner_id])
+        return
+    # song.playlists changed: find the playlists' owners. clear() gives no
+    # pk_set, so they are looked up before the rows go.
+    if action == "pre_clear":
+        instance._playlist_owners = list(
+            Playlist.objects.filter(songs=instance)
+            .values_list("owner_id", flat=True)
+        )
+    elif action == "post_clear":
+        touch_playlist_owners(instance.__dict__.pop("_playlist_owners", []))
+    elif action in ("post_add", "post_remove"):
+        touch_playlist_owners(
+            Playlist.objects.filter(pk__in=pk_set)
+            .values_list("owner_id", flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Song)
+def song_deleting(sender, instance, **kwargs):
+    # The song's playlist rows go with it, without m2m_changed. This also
+    # runs for each song in an album's deletion cascade.
+    touch_playlist_owners(
+        Playlist.objects.filter(songs=instance).values_list(
+            "owner_id", flat=True
+        )
+    )
+
+
+def count_imported_rows(sender, run, status, **kwargs):
+    skipped = len(status.get("skipped", []))
+    IMPORT_ROWS.inc(status["current"] - skipped, result="imported")
+    IMPORT_ROWS.inc(skipped, result="skipped")
+
+
+def connect_import_signals():
+    # Only called when data_wizard is installed, so processes without it
+    # never import it.
+    from data_wizard.signals import import_complete
+
+    import_complete.connect(
+        count_imported_rows,
+        dispatch_uid="dottify_count_imported_rows"
+    )
+
+
+def rebuild_album_summary(albums=None):
+    # Recomputes the summary columns from scratch, for repairing rows after
+    # bulk writes that bypass the signal handlers above.
+    if albums is None:
+        albums = Album.objects.all()
+    for album in albums.annotate(
+        live_song_count=Count("songs", distinct=True),
+        live_total_length=Coalesce(Sum("songs__length"), 0),
+    ):
+        ratings = Rating.objects.for_album(album.pk).aggregate(
+            count=Count("id"),
+            total=Coalesce(Sum("stars"), Decimal("0.0")),
+        )
+        Album.objects.filter(pk=album.pk).update(
+            song_count=album.live_song_count,
+            total_length=album.live_total_length,
+            rating_count=ratings["count"],
+            rating_sum=ratings["total"],
+        )
@@ -0,0 +1,13 @@
+// "Load more" swaps itself for the next page of comments.
+document.addEventListener("DOMContentLoaded", () => {
+  const comments = document.getElementById("comments");
+  if (!comments) return;
+  comments.addEventListener("click", (e) => {
+    const link = e.target.closest("[data-load-more] a");
+    if (!link) return;
+    e.preventDefault();
+    fetch(link.href).then((r) => r.text()).then((html) => {
+      link.closest("li").outerHTML = html;
+    });
+  });
+});
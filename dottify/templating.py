@@ -0,0 +1,76 @@
+# Loads templates ahead of the first request. With the cached loader each
+# template is read and parsed once per process, so loading them at boot
+# means no request pays for parsing, and a broken template is reported
+# when the process starts rather than when a page is rendered.
+
+from pathlib import Path
+
+from django.apps import apps
+from django.template import (
+    TemplateDoesNotExist,
+    TemplateSyntaxError,
+    engines
+)
+from django.template.loader_tags import ExtendsNode, IncludeNode
+
+
+def default_engine():
+    return engines["django"].engine
+
+
+def dottify_template_dirs():
+    return [Path(apps.get_app_config("dottify").path) / "templates"]
+
+
+def all_template_dirs():
+    # Every directory the Django engine loads from, including other apps'.
+    directories = []
+    for loader in default_engine().template_loaders:
+        for inner in getattr(loader, "loaders", [loader]):
+            for directory in inner.get_dirs():
+                if directory not in directories:
+                    directories.append(directory)
+    return directories
+
+
+def template_names(directory):
+    directory = Path(directory)
+    return sorted(
+        path.relative_to(directory).as_posix()
+        for path in directory.rglob("*")
+        if path.suffix in (".html", ".txt") and path.is_file()
+    )
+
+
+def referenced_templates(template):
+    # Names in {% extends "..." %} and {% include "..." %}. Django resolves
+    # them when rendering, so they are checked separately.
+    names = []
+    nodes = template.nodelist.get_nodes_by_type((ExtendsNode, IncludeNode))
+    for node in nodes:
+        expression = (
+            node.parent_name if isinstance(node, ExtendsNode)
+            else node.template
+        )
+        if isinstance(expression.var, str) and not expression.filters:
+            names.append(expression.var)
+    return names
+
+
+def precompile(directories=None, engine=None):
+    # Returns the loaded template names and a {name: error} dict.
+    engine = engine or default_engine()
+    if directories is None:
+        directories = dottify_template_dirs()
+    loaded, errors = [], {}
+    for directory in directories:
+        for name in template_names(directory):
+            try:
+                template = engine.get_template(name)
+                for other in referenced_templates(template):
+                    engine.get_template(other)
+            except (TemplateDoesNotExist, TemplateSyntaxError) as exc:
+                errors[name] = f"{type(exc).__name__}: {exc}"
+                continue
+            loaded.append(name)
+    return loaded, errors
@@ -1,8 +1,29 @@
+import gzip
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework import status
 
-from django.contrib.auth.models import User
-from .models import Album, Song, Playlist, DottifyUser
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .api_urls import album_router, router
+from .api_views import StatisticsAPIView
+from .models import Album, Song, Playlist, DottifyUser, Rating, Comment
+from .ingest import flush_pending
+from .rankings import rebuild_leaderboards
+from .renderers import FastJSONRenderer, MessagePackRenderer
+from .recommendations import build_similar_songs
+from .checks import check_throttle_store
+from .throttling import get_store, take_token
 
 
 class APITests(APITestCase):
@@ -102,6 +123,38 @@ class APITests(APITestCase):
             self.assertIsInstance(s, str)
             self.assertTrue(s.startswith("http"))
 
+    def test_playlist_song_links_match_reverse_or_are_plain_ids(self):
+        url = f"/api/playlists/{self.public_playlist.id}/"
+        data = self.client.get(url).json()
+        self.assertEqual(data["songs"], [
+            f"http://testserver/api/songs/{song.id}/"
+            for song in (self.song1, self.song2)
+        ])
+
+        data = self.client.get(url, {"song_ids": "true"}).json()
+        self.assertEqual(data["songs"], [self.song1.id, self.song2.id])
+
+        data = self.client.get("/api/playlists/", {"song_ids": "true"}).json()
+        self.assertEqual(data[0]["songs"], [self.song1.id, self.song2.id])
+
+    def test_playlist_queries_do_not_grow_with_songs(self):
+        songs = Song.objects.bulk_create(
+            Song(title=f"Bulk {n}", album=self.album, length=100, position=n)
+            for n in range(3, 503)
+        )
+        self.public_playlist.songs.add(*songs)
+        url = f"/api/playlists/{self.public_playlist.id}/"
+        with self.assertNumQueries(2):
+            data = self.client.get(url).json()
+        self.assertEqual(len(data["songs"]), 502)
+        with override_settings(DOTTIFY_VALUES_READS=False):
+            with self.assertNumQueries(2):
+                self.client.get("/api/playlists/")
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"fields": "name"})
+        self.assertEqual(response.json(), {"name": "Public"})
+
     def test_album_nested_song_list_is_scoped_to_album(self):
         url = f"/api/albums/{self.album.id}/songs/"
         response = self.client.get(url)
@@ -147,3 +200,560 @@ class APITests(APITestCase):
         self.assertEqual(data["album_count"], Album.objects.count())
 
         self.assertTrue(data["song_length_average"] > 0)
+
+    def test_album_api_exposes_summary_and_sorts_by_it(self):
+        Album.objects.create(
+            title="Empty Album",
+            artist_name="Artist",
+            release_date="2025-01-01",
+            retail_price="5.00",
+        )
+        response = self.client.get("/api/albums/?ordering=-song_count")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+
+        self.assertEqual(data[0]["title"], "Album")
+        self.assertEqual(data[0]["song_count"], 2)
+        self.assertEqual(data[0]["total_length"], 360)
+        self.assertEqual(data[-1]["song_count"], 0)
+
+        response = self.client.get("/api/albums/?song_count__gte=1")
+        titles = [a["title"] for a in response.json()]
+        self.assertEqual(titles, ["Album"])
+
+    def test_album_filters_by_artist_format_and_ranges(self):
+        Album.objects.create(
+            title="Cheap Live",
+            format="LIVE",
+            artist_name="Someone Else",
+            release_date="2024-06-01",
+            retail_price="1.00",
+        )
+        response = self.client.get("/api/albums/?artist_name=Artist")
+        titles = [a["title"] for a in response.json()]
+        self.assertEqual(titles, ["Album"])
+
+        response = self.client.get("/api/albums/?format=LIVE")
+        titles = [a["title"] for a in response.json()]
+        self.assertEqual(titles, ["Cheap Live"])
+
+        response = self.client.get(
+            "/api/albums/?release_date__gte=2024-12-01"
+            "&retail_price__lte=5.00"
+        )
+        titles = [a["title"] for a in response.json()]
+        self.assertEqual(titles, ["Album"])
+
+        response = self.client.get("/api/albums/?release_date__gte=nope")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_song_filter_by_album_and_ordering(self):
+        other_album = Album.objects.create(
+            title="Other Album",
+            artist_name="Other Artist",
+            release_date="2025-02-01",
+            retail_price="5.00",
+        )
+        Song.objects.create(title="Elsewhere", album=other_album, length=90)
+
+        response = self.client.get(
+            f"/api/songs/?album={self.album.id}&ordering=-length"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        titles = [s["title"] for s in response.json()]
+        self.assertEqual(titles, ["Second Track", "First Track"])
+
+    def test_ordering_on_unindexed_field_is_rejected(self):
+        response = self.client.get("/api/songs/?ordering=title")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sparse_fieldsets_limit_output_and_columns(self):
+        response = self.client.get("/api/albums/?fields=id,title")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json(), [{"id": self.album.id, "title": "Album"}]
+        )
+
+        response = self.client.get("/api/songs/?fields=title,nope")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LeaderboardAPITests(APITestCase):
+
+    def setUp(self):
+        self.popular = Album.objects.create(
+            title="Popular",
+            artist_name="Artist",
+            release_date="2025-01-01",
+            retail_price="5.00",
+        )
+        self.lucky = Album.objects.create(
+            title="Lucky",
+            artist_name="Artist",
+            release_date="2025-01-01",
+            retail_price="5.00",
+        )
+        self.flop = Album.objects.create(
+            title="Flop",
+            artist_name="Artist",
+            release_date="2025-01-01",
+            retail_price="5.00",
+        )
+        for _ in range(20):
+            Rating.objects.create(album=self.popular, stars="4.5")
+            Rating.objects.create(album=self.flop, stars="1.0")
+        Rating.objects.create(album=self.lucky, stars="5.0")
+        old = Rating.objects.create(album=self.lucky, stars="5.0")
+        Rating.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+        rebuild_leaderboards()
+
+    def test_top_uses_bayesian_prior(self):
+        response = self.client.get("/api/albums/top/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+
+        self.assertEqual(
+            [r["title"] for r in data], ["Popular", "Lucky", "Flop"]
+        )
+        self.assertEqual(data[0]["rank"], 1)
+        self.assertEqual(data[0]["rating_count"], 20)
+
+        response = self.client.get("/api/albums/top/?limit=1")
+        self.assertEqual(len(response.json()), 1)
+
+    def test_trending_windows(self):
+        response = self.client.get("/api/albums/trending/?window=7")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        counts = {r["title"]: r["rating_count"] for r in response.json()}
+        self.assertEqual(counts["Popular"], 20)
+        self.assertEqual(counts["Lucky"], 1)
+
+        response = self.client.get("/api/albums/trending/?window=30")
+        counts = {r["title"]: r["rating_count"] for r in response.json()}
+        self.assertEqual(counts["Lucky"], 2)
+
+        response = self.client.get("/api/albums/trending/?window=3")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SimilarSongAPITests(APITestCase):
+
+    def setUp(self):
+        album = Album.objects.create(
+            title="Album",
+            artist_name="Artist",
+            release_date="2025-01-01",
+            retail_price="5.00",
+        )
+        self.a = Song.objects.create(title="A", album=album, length=100)
+        self.b = Song.objects.create(title="B", album=album, length=100)
+        self.c = Song.objects.create(title="C", album=album, length=100)
+        self.d = Song.objects.create(title="D", album=album, length=100)
+
+        u = User.objects.create_user("owner", "o@example.com", "password")
+        owner = DottifyUser.objects.create(user=u, display_name="Owner")
+        for songs in [(self.a, self.b), (self.a, self.b, self.c),
+                      (self.a, self.c), (self.a, self.b)]:
+            p = Playlist.objects.create(name="P", owner=owner, visibility=2)
+            p.songs.add(*songs)
+        # Private and unlisted playlists are left out.
+        for visibility in (0, 1):
+            p = Playlist.objects.create(
+                name="Hidden", owner=owner, visibility=visibility
+            )
+            p.songs.add(self.c, self.d)
+
+    def test_similar_songs_ranked_by_cooccurrence(self):
+        build_similar_songs(k=5, chunk_size=2)
+
+        response = self.client.get(f"/api/songs/{self.a.id}/similar/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([s["title"] for s in data], ["B", "C"])
+        self.assertGreater(data[0]["score"], data[1]["score"])
+
+        response = self.client.get(f"/api/songs/{self.d.id}/similar/")
+        self.assertEqual(response.json(), [])
+
+    def test_song_detail_page_lists_similar_songs(self):
+        build_similar_songs()
+        response = self.client.get(f"/songs/{self.c.id}/")
+        titles = [s.title for s in response.context["similar_songs"]]
+        self.assertEqual(titles, ["A", "B"])
+
+
+class APIPermissionTests(APITestCase):
+
+    def setUp(self):
+        artist_group = Group.objects.create(name="Artist")
+        self.artist = User.objects.create_user(
+            "artist", "a@example.com", "password"
+        )
+        self.artist.groups.add(artist_group)
+        self.profile = DottifyUser.objects.create(
+            user=self.artist, display_name="Artist"
+        )
+        other = User.objects.create_user("other", "o@example.com", "password")
+        other.groups.add(artist_group)
+        other_profile = DottifyUser.objects.create(
+            user=other, display_name="Other"
+        )
+        self.listener = User.objects.create_user(
+            "listener", "l@example.com", "password"
+        )
+
+        self.own_album = Album.objects.create(
+            title="Mine",
+            artist_name="Artist",
+            artist_account=self.profile,
+            release_date="2025-01-01",
+            retail_price="5.00",
+        )
+        self.other_album = Album.objects.create(
+            title="Theirs",
+            artist_name="Other",
+            artist_account=other_profile,
+            release_date="2025-01-01",
+            retail_price="5.00",
+        )
+        self.other_song = Song.objects.create(
+            title="Theirs", album=self.other_album, length=100
+        )
+
+    def test_reads_stay_public_and_writes_need_a_role(self):
+        response = self.client.get("/api/albums/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.patch(
+            f"/api/albums/{self.own_album.id}/", {"retail_price": "1.00"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.listener)
+        response = self.client.delete(f"/api/songs/{self.other_song.id}/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_artist_can_only_write_own_albums_and_songs(self):
+        self.client.force_authenticate(self.artist)
+        response = self.client.patch(
+            f"/api/albums/{self.own_album.id}/", {"retail_price": "1.00"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.patch(
+            f"/api/albums/{self.other_album.id}/", {"retail_price": "1.00"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.post("/api/songs/", {
+            "title": "Sneaky", "length": 100, "album": self.other_album.id
+        })
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = self.client.post("/api/albums/", {
+            "title": "New", "artist_name": "Artist",
+            "retail_price": "2.00", "release_date": "2025-01-01"
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        created = Album.objects.get(title="New")
+        self.assertEqual(created.artist_account, self.profile)
+
+    def test_editable_list_is_filtered_in_one_query(self):
+        self.client.force_authenticate(self.artist)
+        # Role names, profile and the album list itself.
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                "/api/albums/?editable=true&fields=id,title"
+            )
+        titles = [a["title"] for a in response.json()]
+        self.assertEqual(titles, ["Mine"])
+
+
+class CommentAPITests(APITestCase):
+
+    def setUp(self):
+        self.album = Album.objects.create(
+            title="Album",
+            artist_name="Artist",
+            release_date="2025-01-01",
+            retail_price="5.00",
+        )
+        self.user = DottifyUser.objects.create(
+            user=User.objects.create_user("fan", "f@example.com", "pw"),
+            display_name="Fan",
+        )
+        Comment.objects.bulk_create(
+            Comment(album=self.album, user=self.user, comment_text=f"C{n}")
+            for n in range(25)
+        )
+
+    def test_comments_are_keyset_paginated_newest_first(self):
+        url = f"/api/albums/{self.album.id}/comments/"
+        data = self.client.get(url).json()
+        self.assertEqual(len(data["results"]), 20)
+        self.assertEqual(data["results"][0]["comment_text"], "C24")
+        self.assertEqual(data["results"][0]["user"], "Fan")
+
+        data = self.client.get(data["next"]).json()
+        self.assertEqual(
+            [c["comment_text"] for c in data["results"]],
+            ["C4", "C3", "C2", "C1", "C0"]
+        )
+        self.assertIsNone(data["next"])
+
+    def test_bad_album_or_cursor(self):
+        response = self.client.get("/api/albums/999/comments/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(
+            f"/api/albums/{self.album.id}/comments/?before=-1"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_single_and_batch(self):
+        url = f"/api/albums/{self.album.id}/comments/"
+        response = self.client.post(url, {"comment_text": "Hi"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.user.user)
+        response = self.client.post(url, {"comment_text": "One"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["user"], "Fan")
+
+        response = self.client.post(
+            url,
+            [{"comment_text": "Two"}, {"comment_text": "Three"}],
+            format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.json()), 2)
+        self.assertEqual(
+            self.client.get(url).json()["results"][0]["comment_text"],
+            "Three"
+        )
+
+        response = self.client.post(
+            url, [{"comment_text": ""}, {"comment_text": "ok"}], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("0", response.json())
+        self.assertEqual(Comment.objects.count(), 28)
+
+
+class RatingAPITests(APITestCase):
+
+    def setUp(self):
+        self.album = Album.objects.create(
+            title="Album",
+            artist_name="Artist",
+            release_date="2025-01-01",
+            retail_price="5.00",
+        )
+        self.user = User.objects.create_user("fan", "f@example.com", "pw")
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/albums/{self.album.id}/ratings/"
+
+    def test_single_and_batch_update_summary(self):
+        response = self.client.post(self.url, {"stars": "4.5"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.url,
+                [{"stars": 3}, {"stars": "2.5"}, {"stars": 5}],
+                format="json"
+            )
+        self.assertEqual(response.json(), {"accepted": 3})
+        # One multi-row insert and one summary update, no rescan.
+        writes = [
+            q["sql"].split(" ")[0] for q in queries
+            if q["sql"].startswith(("INSERT", "UPDATE"))
+        ]
+        self.assertEqual(writes, ["INSERT", "UPDATE"])
+
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.rating_count, 4)
+        self.assertEqual(self.album.rating_sum, Decimal("15.0"))
+        self.assertEqual(Rating.objects.count(), 4)
+
+    def test_invalid_values_are_reported_by_index(self):
+        response = self.client.post(
+            self.url,
+            [{"stars": 3}, {"stars": "4.2"}, {"stars": "x"}, {}],
+            format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.json(),
+            {
+                "1": ["Stars must be in increments of 0.5"],
+                "2": ["Stars must be a number"],
+                "3": ["Stars must be a number"],
+            }
+        )
+        response = self.client.post(self.url, {"stars": 6})
+        self.assertEqual(
+            response.json(), {"stars": ["Stars must be between 0 and 5"]}
+        )
+        self.assertFalse(Rating.objects.exists())
+
+    def test_anonymous_and_unknown_album(self):
+        response = self.client.post("/api/albums/999/ratings/", {"stars": 1})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.client.force_authenticate(None)
+        response = self.client.post(self.url, {"stars": 1})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_write_behind_accepts_then_flushes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with override_settings(
+            DOTTIFY_RATING_WRITE_BEHIND=True,
+            DOTTIFY_RATING_LOG_DIR=directory.name
+        ):
+            response = self.client.post(
+                self.url, [{"stars": 1}, {"stars": 2}], format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertFalse(Rating.objects.exists())
+            self.assertEqual(flush_pending(), 2)
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.rating_sum, Decimal("3.0"))
+
+
+THROTTLED_API = {
+    **settings.REST_FRAMEWORK,
+    "DEFAULT_THROTTLE_RATES": {"ip": "100/min", "statistics": "2/min"},
+}
+
+
+class ThrottleScopeTests(SimpleTestCase):
+
+    def test_every_throttle_scope_has_a_rate(self):
+        views = [v for _, v, _ in router.registry + album_router.registry]
+        rates = settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]
+        for view in [*views, StatisticsAPIView]:
+            scope = getattr(view, "throttle_scope", None)
+            if scope is not None:
+                self.assertIn(scope, rates, view.__name__)
+
+
+@override_settings(REST_FRAMEWORK=THROTTLED_API)
+class ThrottleTests(APITestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(
+            DOTTIFY_THROTTLE_SQLITE_PATH=f"{directory.name}/throttle.db"
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_empty_bucket_returns_429_without_db_work(self):
+        for _ in range(2):
+            response = self.client.get("/api/statistics/")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/statistics/")
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertGreater(int(response["Retry-After"]), 0)
+
+        # Other endpoints have their own scope.
+        response = self.client.get("/api/albums/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_forwarded_for_does_not_pick_the_ip_bucket(self):
+        rates = {"ip": "2/min"}
+        with override_settings(REST_FRAMEWORK={
+            **THROTTLED_API, "DEFAULT_THROTTLE_RATES": rates
+        }):
+            codes = [
+                self.client.get(
+                    "/api/albums/", HTTP_X_FORWARDED_FOR=f"10.0.0.{n}"
+                ).status_code
+                for n in range(3)
+            ]
+        self.assertEqual(codes, [200, 200, 429])
+
+    def test_cache_store_uses_same_bucket_rules(self):
+        with override_settings(DOTTIFY_THROTTLE_STORE="cache"):
+            cache.clear()
+            codes = [
+                self.client.get("/api/statistics/").status_code
+                for _ in range(3)
+            ]
+        self.assertEqual(codes, [200, 200, 429])
+
+    @override_settings(DOTTIFY_THROTTLE_SQLITE_PATH=None)
+    def test_sqlite_store_needs_an_explicit_path(self):
+        errors = check_throttle_store(None)
+        self.assertEqual([e.id for e in errors], ["dottify.E002"])
+        with self.assertRaises(ImproperlyConfigured):
+            get_store()
+        with override_settings(DOTTIFY_THROTTLE_STORE="cache"):
+            self.assertEqual(check_throttle_store(None), [])
+
+    def test_token_bucket_refills_over_time(self):
+        allowed, wait, state = take_token(None, 2, 1.0, now=100.0)
+        allowed, wait, state = take_token(state, 2, 1.0, now=100.0)
+        allowed, wait, state = take_token(state, 2, 1.0, now=100.0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 1.0)
+        allowed, wait, state = take_token(state, 2, 1.0, now=101.5)
+        self.assertTrue(allowed)
+
+
+class APIFormatTests(APITestCase):
+
+    def setUp(self):
+        for i in range(20):
+            Album.objects.create(
+                title=f"Album {i} \u00e9",
+                artist_name="Artist",
+                release_date="2025-01-01",
+                retail_price="5.00",
+            )
+
+    def test_fast_json_matches_standard_renderer(self):
+        response = self.client.get("/api/albums/")
+        data = response.data
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+        self.assertEqual(response.content, JSONRenderer().render(data))
+
+    def test_json_is_gzipped_when_accepted(self):
+        response = self.client.get(
+            "/api/albums/", HTTP_ACCEPT_ENCODING="gzip, deflate"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(
+            gzip.decompress(response.content),
+            JSONRenderer().render(response.data)
+        )
+
+        response = self.client.get(
+            "/api/albums/", HTTP_ACCEPT_ENCODING="gzip;q=0"
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_html_is_not_compressed(self):
+        response = self.client.get("/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_msgpack_only_offered_when_installed(self):
+        response = self.client.get(
+            "/api/albums/", HTTP_ACCEPT="application/msgpack"
+        )
+        if MessagePackRenderer.available:
+            self.assertEqual(response["Content-Type"], "application/msgpack")
+        else:
+            self.assertEqual(
+                response.status_code, status.HTTP_406_NOT_ACCEPTABLE
+            )
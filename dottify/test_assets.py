@@ -0,0 +1,72 @@
+import gzip
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.test import SimpleTestCase, override_settings
+
+from .assets import StaticFiles
+
+SOURCE = Path(settings.BASE_DIR) / "dottify" / "static" / "dottify"
+
+
+class StaticPipelineTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(STATIC_ROOT=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+        self.django_calls = []
+        self.app = StaticFiles(self.django)
+
+    def django(self, environ, start_response):
+        self.django_calls.append(environ["PATH_INFO"])
+        start_response("200 OK", [])
+        return [b"django"]
+
+    def get(self, path, **headers):
+        environ = {"PATH_INFO": path, "REQUEST_METHOD": "GET", **headers}
+        response = {}
+
+        def start_response(status, response_headers):
+            response["status"] = status
+            response["headers"] = dict(response_headers)
+
+        body = b"".join(self.app(environ, start_response))
+        return response["status"], response["headers"], body
+
+    def test_hashed_files_are_served_compressed_and_cached(self):
+        url = static("dottify/comments.js")
+        self.assertRegex(url, r"^/static/dottify/comments\.[0-9a-f]{12}\.js$")
+        original = (SOURCE / "comments.js").read_bytes()
+
+        status, headers, body = self.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertIn("immutable", headers["Cache-Control"])
+        self.assertEqual(gzip.decompress(body), original)
+
+        status, headers, body = self.get(url)
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(body, original)
+
+        status, headers, body = self.get(
+            url, HTTP_IF_NONE_MATCH=headers["ETag"]
+        )
+        self.assertEqual(status, "304 Not Modified")
+
+    def test_unhashed_missing_and_other_paths(self):
+        status, headers, _ = self.get("/static/dottify/comments.js")
+        self.assertEqual(headers["Cache-Control"], "public, max-age=60")
+        status, _, _ = self.get("/static/../manage.py")
+        self.assertEqual(status, "404 Not Found")
+        status, _, _ = self.get("/static/missing.js")
+        self.assertEqual(status, "404 Not Found")
+        self.assertEqual(self.django_calls, [])
+
+        self.assertEqual(self.get("/albums/1/")[2], b"django")
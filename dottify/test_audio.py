@@ -0,0 +1,179 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+import uuid
+import wave
+from datetime import timedelta
+from pathlib import Path
+
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .audio import expire_uploads, part_path, process_pending
+from .checks import check_audio_upload_dir
+from .models import Album, AudioUpload, DottifyUser, Song
+
+
+def wav_bytes(seconds, rate=8000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(1)
+        audio.setframerate(rate)
+        audio.writeframes(b"\x80" * (seconds * rate))
+    return buffer.getvalue()
+
+
+class AudioUploadTests(APITestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        uploads = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.addCleanup(uploads.cleanup)
+        override = override_settings(
+            MEDIA_ROOT=media.name, DOTTIFY_AUDIO_UPLOAD_DIR=uploads.name
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.media = Path(media.name)
+
+        self.artist = User.objects.create_user(
+            "artist", "a@example.com", "password"
+        )
+        self.artist.groups.add(Group.objects.create(name="Artist"))
+        profile = DottifyUser.objects.create(
+            user=self.artist, display_name="Artist"
+        )
+        album = Album.objects.create(
+            title="Mine",
+            artist_name="Artist",
+            artist_account=profile,
+            release_date="2025-01-01",
+            retail_price="5.00",
+        )
+        self.song = Song.objects.create(title="Song", album=album, length=12)
+        self.client.force_authenticate(self.artist)
+
+    def start(self, data, **extra):
+        response = self.client.post(
+            f"/api/songs/{self.song.id}/audio/",
+            {"filename": "song.wav", "size": len(data), **extra},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response["Location"]
+
+    def send(self, url, offset, chunk):
+        return self.client.patch(
+            url,
+            chunk,
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_chunked_upload_is_checked_and_streamed(self):
+        data = wav_bytes(12)
+        url = self.start(data, sha256=hashlib.sha256(data).hexdigest())
+
+        response = self.send(url, 0, data[:5000])
+        self.assertEqual(response.data["received"], 5000)
+        self.assertEqual(response.data["status"], "uploading")
+        # A repeated chunk is refused with the offset to resume from.
+        response = self.send(url, 0, data[:5000])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["received"], 5000)
+        self.assertEqual(self.client.get(url).data["received"], 5000)
+
+        response = self.send(url, 5000, data[5000:])
+        self.assertEqual(response.data["status"], "complete")
+        self.assertEqual(process_pending(), 1)
+
+        self.song.refresh_from_db()
+        upload = AudioUpload.objects.get()
+        self.assertEqual(upload.status, "ready")
+        self.assertFalse(part_path(upload).exists())
+        self.assertEqual(self.song.audio.name, "audio/song.wav")
+        self.assertAlmostEqual(self.song.audio_duration, 12)
+        self.assertEqual(
+            (self.media / "audio" / "song.wav").read_bytes(), data
+        )
+
+        self.client.force_login(self.artist)
+        response = self.client.get(
+            "/media/audio/song.wav", HTTP_RANGE="bytes=0-3"
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response["Cache-Control"].startswith("private"))
+        self.assertEqual(b"".join(response.streaming_content), b"RIFF")
+        self.client.logout()
+        response = self.client.get("/media/audio/song.wav")
+        self.assertEqual(response.status_code, 404)
+
+    def test_wrong_length_and_format_are_rejected(self):
+        for data in [wav_bytes(30), b"not audio" * 100]:
+            url = self.start(data)
+            self.send(url, 0, data)
+        process_pending()
+        self.assertEqual(
+            sorted(AudioUpload.objects.values_list("status", "error")),
+            [
+                ("rejected", "The audio is 30s long but the song is 12s"),
+                ("rejected", "Unsupported audio format"),
+            ],
+        )
+        self.song.refresh_from_db()
+        self.assertEqual(self.song.audio.name, "")
+
+    def test_chunks_must_fit_and_uploads_belong_to_their_user(self):
+        url = self.start(b"x" * 10)
+        response = self.send(url, 0, b"x" * 11)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        other = User.objects.create_user("other", "o@example.com", "pw")
+        self.client.force_authenticate(other)
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_404_NOT_FOUND
+        )
+        response = self.client.post(
+            f"/api/songs/{self.song.id}/audio/",
+            {"filename": "song.wav", "size": 10},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.artist)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(AudioUpload.objects.exists())
+
+    def test_expire_removes_stale_uploads_and_orphaned_parts(self):
+        url = self.start(b"x" * 10)
+        orphan = part_path(AudioUpload(pk=uuid.uuid4()))
+        orphan.touch()
+        self.assertEqual(expire_uploads(hours=1), 0)
+        self.assertTrue(orphan.exists())
+
+        past = time.time() - 7200
+        os.utime(orphan, (past, past))
+        AudioUpload.objects.update(
+            created_at=timezone.now() - timedelta(hours=2)
+        )
+        self.assertEqual(expire_uploads(hours=1), 1)
+        self.assertFalse(orphan.exists())
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_404_NOT_FOUND
+        )
+
+    def test_upload_directory_must_be_set(self):
+        with override_settings(DOTTIFY_AUDIO_UPLOAD_DIR=None):
+            errors = check_audio_upload_dir(None)
+            self.assertEqual([e.id for e in errors], ["dottify.E004"])
+            with self.assertRaises(ImproperlyConfigured):
+                self.start(b"x" * 10)
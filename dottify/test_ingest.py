@@ -0,0 +1,145 @@
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import metrics
+from .checks import check_rating_log_dir
+from .ingest import (
+    buffer_rating,
+    buffer_ratings,
+    flush_pending,
+    get_log,
+    record_ratings
+)
+from .models import Album, Rating
+
+
+class WriteBehindRatingTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(DOTTIFY_RATING_LOG_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.log = get_log()
+        self.album = Album.objects.create(
+            title="Buffered",
+            artist_name="Artist",
+            release_date="2025-01-01",
+            retail_price="5.00",
+        )
+
+    @override_settings(DOTTIFY_RATING_LOG_DIR=None)
+    def test_log_directory_must_be_set(self):
+        errors = check_rating_log_dir(None)
+        self.assertEqual([e.id for e in errors], ["dottify.E003"])
+        with self.assertRaises(ImproperlyConfigured):
+            buffer_rating(self.album.pk, 4)
+
+    def test_ratings_are_applied_in_one_batch(self):
+        buffer_ratings([(self.album.pk, "4.5"), (self.album.pk, 3)])
+        self.assertFalse(Rating.objects.exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(flush_pending(), 2)
+        statements = [q["sql"].split(" (")[0] for q in queries]
+        self.assertEqual(
+            statements.count('INSERT INTO "dottify_rating"'), 1
+        )
+        self.assertEqual(
+            len([s for s in statements if s.startswith(
+                'UPDATE "dottify_album"'
+            )]),
+            1
+        )
+
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.rating_count, 2)
+        self.assertEqual(self.album.rating_sum, Decimal("7.5"))
+        self.assertEqual(
+            sorted(Rating.objects.values_list("stars", flat=True)),
+            [Decimal("3.0"), Decimal("4.5")]
+        )
+        self.assertEqual(flush_pending(), 0)
+        self.assertEqual(Rating.objects.count(), 2)
+
+    def test_invalid_rating_is_rejected_before_logging(self):
+        with self.assertRaises(ValidationError):
+            buffer_ratings([(self.album.pk, "4.0"), (self.album.pk, "4.2")])
+        self.assertEqual(flush_pending(), 0)
+
+    def test_partial_line_waits_for_the_writer(self):
+        buffer_rating(self.album.pk, "2.0")
+        with open(self.log.path(1), "ab") as f:
+            f.write(b'{"album":')
+        self.assertEqual(flush_pending(), 1)
+        with open(self.log.path(1), "ab") as f:
+            f.write(f'{self.album.pk},"stars":"1.0","at":"2025-01-01T00:00'
+                    f':00+00:00"}}\n'.encode())
+        self.assertEqual(flush_pending(), 1)
+        self.assertEqual(
+            str(Rating.objects.get(stars="1.0").created_at.date()),
+            "2025-01-01"
+        )
+
+    @override_settings(DOTTIFY_RATING_LOG_SEGMENT_BYTES=10)
+    def test_flushed_segments_are_rotated_and_removed(self):
+        log = get_log()
+        buffer_rating(self.album.pk, "1.0", log=log)
+        flush_pending(log)
+        self.assertEqual(log.segments(), [1, 2])
+
+        buffer_rating(self.album.pk, "2.0", log=log)
+        self.assertEqual(flush_pending(log), 1)
+        self.assertEqual(log.segments(), [2, 3])
+        self.assertEqual(Rating.objects.count(), 2)
+
+    def test_ratings_for_deleted_albums_are_dropped(self):
+        buffer_rating(self.album.pk, "5.0")
+        buffer_rating(self.album.pk + 1000, "5.0")
+        self.assertEqual(self.log.pending(1, 0), 2)
+        flush_pending()
+        self.assertEqual(Rating.objects.count(), 1)
+        key = ("dottify_queue_depth", (("queue", "ratings"),))
+        self.assertEqual(metrics._values[key], 0)
+
+
+@override_settings(DOTTIFY_RATING_SHARDS=["default", "ratings_1"])
+class ShardedRatingWriteTests(TestCase):
+    databases = {"default", "ratings_1"}
+
+    def setUp(self):
+        self.albums = [
+            Album.objects.create(
+                title=f"Sharded {i}",
+                artist_name="Artist",
+                release_date="2025-01-01",
+                retail_price="5.00",
+            )
+            for i in range(2)
+        ]
+
+    def rating_count(self):
+        return sum(q.count() for q in Rating.objects.each_shard())
+
+    def test_ratings_and_summary_commit_together(self):
+        for album in self.albums:
+            with mock.patch(
+                "dottify.ingest.adjust_album",
+                side_effect=DatabaseError("summary failed"),
+            ):
+                with self.assertRaises(DatabaseError):
+                    record_ratings(album.pk, ["4.0", "3.0"])
+        self.assertEqual(self.rating_count(), 0)
+
+        for album in self.albums:
+            record_ratings(album.pk, ["4.0", "3.0"])
+            album.refresh_from_db()
+            self.assertEqual(album.rating_count, 2)
+        self.assertEqual(self.rating_count(), 4)
@@ -0,0 +1,146 @@
+import http.client
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+from django.core.servers.basehttp import WSGIServer
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.http import http_date
+
+from . import prefork
+from .media import RangeFile, parse_range
+from .models import Album
+
+DATA = bytes(range(256)) * 8
+
+
+class MediaServingTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(MEDIA_ROOT=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.root = Path(directory.name)
+        (self.root / "covers").mkdir()
+        (self.root / "covers" / "a.jpg").write_bytes(DATA)
+        (self.root / "secret.txt").write_bytes(b"secret")
+        Album.objects.create(
+            title="Album",
+            format="SNGL",
+            artist_name="Artist",
+            release_date="2025-01-01",
+            retail_price="5.00",
+            cover_image="covers/a.jpg",
+        )
+        self.url = "/media/covers/a.jpg"
+
+    def test_whole_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Content-Length"], str(len(DATA)))
+        self.assertEqual(b"".join(response.streaming_content), DATA)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(
+            response["Content-Range"], f"bytes 2-5/{len(DATA)}"
+        )
+        self.assertEqual(response["Content-Length"], "4")
+        self.assertEqual(b"".join(response.streaming_content), DATA[2:6])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-10")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), DATA[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=5000-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(DATA)}")
+
+    def test_if_range_with_stale_etag_sends_whole_file(self):
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), DATA)
+
+    def test_conditional_requests(self):
+        etag = self.client.head(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=http_date()
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_only_referenced_files_are_served(self):
+        self.assertEqual(self.client.get("/media/secret.txt").status_code, 404)
+        self.assertEqual(
+            self.client.get("/media/covers/../secret.txt").status_code, 404
+        )
+        self.assertEqual(self.client.get("/media/nope.jpg").status_code, 404)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    @override_settings(
+        DOTTIFY_MEDIA_OFFLOAD="x-accel",
+        DOTTIFY_MEDIA_ACCEL_PREFIX="/internal/",
+    )
+    def test_proxy_offload(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/internal/covers/a.jpg"
+        )
+        self.assertEqual(response.content, b"")
+
+
+class SendfileTests(SimpleTestCase):
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=0-", 10), (0, 9))
+        self.assertEqual(parse_range("bytes=3-100", 10), (3, 9))
+        self.assertEqual(parse_range("bytes=-4", 10), (6, 9))
+        self.assertIsNone(parse_range("bytes=0-1,4-5", 10))
+        self.assertIsNone(parse_range("items=0-1", 10))
+        with self.assertRaises(ValueError):
+            parse_range("bytes=10-", 10)
+        with self.assertRaises(ValueError):
+            parse_range("bytes=5-2", 10)
+
+    def test_server_sends_ranges_with_sendfile(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(DATA)
+            f.flush()
+
+            def app(environ, start_response):
+                start_response("206 Partial Content", [
+                    ("Content-Length", "100"),
+                ])
+                return environ["wsgi.file_wrapper"](
+                    RangeFile(open(f.name, "rb"), 300, 100)
+                )
+
+            server = WSGIServer(
+                ("127.0.0.1", 0), prefork.QuietRequestHandler
+            )
+            server.set_app(app)
+            self.addCleanup(server.server_close)
+            thread = threading.Thread(target=server.handle_request)
+            with mock.patch.object(
+                prefork.os, "sendfile", wraps=prefork.os.sendfile
+            ) as sendfile:
+                thread.start()
+                connection = http.client.HTTPConnection(
+                    *server.server_address, timeout=10
+                )
+                connection.request("GET", "/")
+                body = connection.getresponse().read()
+                connection.close()
+                thread.join(10)
+        self.assertEqual(body, DATA[300:400])
+        self.assertTrue(sendfile.called)
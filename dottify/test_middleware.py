@@ -0,0 +1,207 @@
+import cProfile
+import json
+import os
+import pstats
+import subprocess
+import sys
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import metrics
+from .models import Album, Song, RequestProfile
+from .profiling import capped_sql, capped_stats, make_profile_token
+
+
+@override_settings(DOTTIFY_SQL_SAMPLE_RATE=1.0)
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        for i in range(3):
+            album = Album.objects.create(
+                title=f"Album {i}",
+                artist_name="Artist",
+                release_date="2025-01-01",
+                retail_price="5.00",
+            )
+            Song.objects.create(title="Song", album=album, length=100)
+
+    def test_server_timing_header_is_for_staff(self):
+        response = self.client.get(reverse("home"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+        self.client.force_login(User.objects.create_user(
+            "staff", "staff@example.com", "password", is_staff=True
+        ))
+        response = self.client.get(reverse("home"))
+        timing = response["Server-Timing"]
+        self.assertIn("db;dur=", timing)
+        self.assertIn("queries", timing)
+        self.assertIn("app;dur=", timing)
+
+    @override_settings(DOTTIFY_SQL_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_recorded(self):
+        with self.assertNoLogs("dottify.sql"):
+            self.client.get("/api/albums/")
+
+    @override_settings(DOTTIFY_VALUES_READS=False)
+    def test_duplicate_queries_are_logged(self):
+        with self.assertLogs("dottify.sql", level="INFO") as logs:
+            self.client.get("/api/albums/")
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record["view"], "album-list")
+        # The serializer's song_set query per album is an N+1 signature.
+        self.assertGreaterEqual(record["duplicates"], 1)
+        self.assertNotIn("queries", record)
+
+    @override_settings(DOTTIFY_SLOW_REQUEST_MS=0)
+    def test_slow_request_dumps_every_query(self):
+        with self.assertLogs("dottify.sql", level="WARNING") as logs:
+            self.client.get("/api/albums/")
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(len(record["queries"]), record["query_count"])
+
+
+@override_settings(
+    DOTTIFY_METRICS_TOKEN="scrape-token", DOTTIFY_SQL_SAMPLE_RATE=1.0
+)
+class MetricsTests(TestCase):
+    def test_metrics_endpoint_reports_request_latency(self):
+        self.client.get(reverse("home"))
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-token"
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+
+        self.assertIn(
+            "# TYPE dottify_request_duration_seconds histogram", body
+        )
+        self.assertIn(
+            'dottify_request_duration_seconds_count{url_name="home"}', body
+        )
+        self.assertIn('dottify_request_db_queries_bucket{le="+Inf",'
+                      'url_name="home"}', body)
+
+    def test_metrics_endpoint_is_internal_only(self):
+        # A local peer address is not enough: behind a proxy every request
+        # comes from 127.0.0.1.
+        response = self.client.get(
+            reverse("metrics"), REMOTE_ADDR="127.0.0.1"
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong"
+        )
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(User.objects.create_superuser(
+            "staff", "staff@example.com", "password"
+        ))
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+    def test_dead_worker_files_are_archived(self):
+        exited = subprocess.Popen([sys.executable, "-c", ""])
+        exited.wait()
+        rows = [
+            ["dottify_import_rows_total", [["result", "imported"]], 4],
+            ["dottify_queue_depth", [["queue", "ratings"]], 9],
+        ]
+        key = ("dottify_import_rows_total", (("result", "imported"),))
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(DOTTIFY_METRICS_DIR=directory):
+                for n in range(2):
+                    with open(f"{directory}/{exited.pid}-{n}.json", "w") as f:
+                        json.dump(rows, f)
+                first = metrics.collect()
+                self.assertEqual(
+                    sorted(os.listdir(directory)),
+                    ["archive.json", "archive.lock"],
+                )
+                second = metrics.collect()
+        own = metrics._values.get(key, 0)
+        self.assertEqual(first[key], own + 8)
+        self.assertEqual(second[key], own + 8)
+        gauge = ("dottify_queue_depth", (("queue", "ratings"),))
+        self.assertEqual(second.get(gauge, 0), metrics._values.get(gauge, 0))
+
+    def test_metrics_are_summed_across_worker_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(DOTTIFY_METRICS_DIR=directory):
+                metrics.IMPORT_ROWS.inc(3, result="imported")
+                metrics.flush()
+                # Another worker's flushed values.
+                other = [["dottify_import_rows_total",
+                          [["result", "imported"]], 4]]
+                with open(f"{directory}/1-0.json", "w") as f:
+                    json.dump(other, f)
+
+                values = metrics.collect()
+        key = ("dottify_import_rows_total", (("result", "imported"),))
+        own = metrics._values[key]
+        self.assertEqual(values[key], own + 4)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_superuser(
+            "staff", "staff@example.com", "password"
+        )
+        self.normal = User.objects.create_user(
+            "normal", "normal@example.com", "password"
+        )
+
+    def test_staff_request_with_token_is_profiled(self):
+        self.client.force_login(self.staff)
+        token = make_profile_token(self.staff)
+        response = self.client.get(reverse("home"), {"_profile": token})
+
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response["X-Dottify-Profile-Id"], str(profile.pk))
+        self.assertEqual(profile.view_name, "home")
+        self.assertEqual(profile.query_count, len(profile.sql))
+        self.assertGreater(profile.expires_at, profile.created_at)
+
+        stats = pstats.Stats(self.write_stats(profile))
+        self.assertGreater(stats.total_calls, 0)
+
+        response = self.client.get(reverse(
+            "admin:dottify_requestprofile_speedscope", args=[profile.pk]
+        ))
+        data = json.loads(response.content)
+        self.assertEqual(data["profiles"][0]["type"], "sampled")
+
+    def test_token_is_ignored_for_other_users(self):
+        token = make_profile_token(self.staff)
+        self.client.force_login(self.normal)
+        self.client.get(reverse("home"), HTTP_X_DOTTIFY_PROFILE=token)
+        self.client.force_login(self.staff)
+        self.client.get(reverse("home"), {"_profile": token + "x"})
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_stored_stats_are_size_capped(self):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        reverse("home")
+        profiler.disable()
+        self.assertLessEqual(len(capped_stats(profiler, 2000)), 2000)
+
+    def test_stored_sql_is_size_capped(self):
+        queries = [(f"SELECT {n}", 0.001) for n in range(1000)]
+        sql = capped_sql(queries, 2000)
+        self.assertLessEqual(len(json.dumps(sql)), 2000)
+        self.assertEqual(sql[0], ["SELECT 0", 1.0])
+        omitted = 1000 - (len(sql) - 1)
+        self.assertEqual(sql[-1][0], f"-- {omitted} more queries not stored")
+        self.assertEqual(capped_sql(queries[:3], 2000), [
+            ["SELECT 0", 1.0], ["SELECT 1", 1.0], ["SELECT 2", 1.0]
+        ])
+
+    def write_stats(self, profile):
+        f = tempfile.NamedTemporaryFile(suffix=".pstats", delete=False)
+        f.write(bytes(profile.stats))
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        return f.name
@@ -1,11 +1,15 @@
 from datetime import date, timedelta
 from django.utils import timezone
 from decimal import Decimal
+from io import StringIO
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import IntegrityError, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
 from .models import Album, Song, Playlist, Comment, Rating, DottifyUser
 
@@ -214,3 +218,258 @@ class CommentModelTests(TestCase):
         assert c.album == self.album
         assert c.user == self.profile
         assert c.comment_text == "Test"
+
+
+class AlbumSummaryTests(TestCase):
+    def setUp(self):
+        self.album = Album.objects.create(
+            title="Album",
+            artist_name="Artist",
+            release_date=timezone.now().date(),
+            retail_price="5.00",
+        )
+        self.other_album = Album.objects.create(
+            title="Other Album",
+            artist_name="Artist",
+            release_date=timezone.now().date(),
+            retail_price="5.00",
+        )
+
+    def test_song_writes_update_count_and_length(self):
+        s1 = Song.objects.create(title="Track 1", album=self.album, length=20)
+        Song.objects.create(title="Track 2", album=self.album, length=30)
+        self.album.refresh_from_db()
+        assert self.album.song_count == 2
+        assert self.album.total_length == 50
+
+        s1.length = 60
+        s1.save()
+        self.album.refresh_from_db()
+        assert self.album.total_length == 90
+
+        s1.delete()
+        self.album.refresh_from_db()
+        assert self.album.song_count == 1
+        assert self.album.total_length == 30
+
+    def test_moving_song_between_albums_updates_both(self):
+        s = Song.objects.create(title="Track", album=self.album, length=40)
+        s.album = self.other_album
+        s.save()
+
+        self.album.refresh_from_db()
+        self.other_album.refresh_from_db()
+        assert self.album.song_count == 0
+        assert self.album.total_length == 0
+        assert self.other_album.song_count == 1
+        assert self.other_album.total_length == 40
+
+    def test_rating_writes_update_count_and_sum(self):
+        r = Rating.objects.create(album=self.album, stars=Decimal("4.0"))
+        Rating.objects.create(album=self.album, stars=Decimal("2.5"))
+        self.album.refresh_from_db()
+        assert self.album.rating_count == 2
+        assert self.album.rating_sum == Decimal("6.5")
+
+        r.delete()
+        self.album.refresh_from_db()
+        assert self.album.rating_count == 1
+        assert self.album.rating_sum == Decimal("2.5")
+
+    def test_saving_stale_album_keeps_summary(self):
+        Song.objects.create(title="Track", album=self.album, length=40)
+        self.album.retail_price = "6.00"
+        self.album.save()
+        self.album.refresh_from_db()
+        assert self.album.song_count == 1
+
+
+class DirtyFieldTests(TestCase):
+    def setUp(self):
+        Album.objects.create(
+            title="Old Title",
+            artist_name="Artist",
+            release_date=timezone.now().date(),
+            retail_price="5.00",
+        )
+        self.album = Album.objects.get()
+
+    def test_update_writes_only_changed_columns(self):
+        self.album.retail_price = Decimal("6.00")
+        with CaptureQueriesContext(connections["default"]) as queries:
+            self.album.save()
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]["sql"]
+        self.assertIn('"retail_price"', sql)
+        self.assertNotIn('"title"', sql)
+        self.assertNotIn('"slug"', sql)
+
+    def test_unchanged_save_is_a_no_op(self):
+        self.album.retail_price = "5.00"
+        with self.assertNumQueries(0):
+            self.album.save()
+
+        song = Song.objects.create(
+            title="Track", album=self.album, length=40
+        )
+        song = Song.objects.get(pk=song.pk)
+        with self.assertNumQueries(2):
+            # Savepoint and release only: no UPDATE and no summary work.
+            song.save()
+
+    def test_slug_follows_title_changes(self):
+        self.album.title = "New Title"
+        self.album.save()
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.slug, "new-title")
+
+        self.album.retail_price = "7.00"
+        self.album.save(update_fields=["retail_price"])
+        self.assertEqual(self.album.slug, "new-title")
+
+    def test_song_update_uses_loaded_values(self):
+        song = Song.objects.create(
+            title="Track", album=self.album, length=40
+        )
+        song = Song.objects.get(pk=song.pk)
+        song.length = 50
+        with CaptureQueriesContext(connections["default"]) as queries:
+            song.save()
+        self.assertFalse(
+            [q for q in queries if q["sql"].startswith("SELECT")]
+        )
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.total_length, 50)
+
+    def test_copy_with_no_pk_is_inserted(self):
+        Song.objects.create(title="Track", album=self.album, length=40)
+        album = Album.objects.get()
+        album.pk = None
+        album.title = "Copy"
+        album.save()
+        self.assertEqual(Album.objects.count(), 2)
+        album.refresh_from_db()
+        self.assertEqual(album.slug, "copy")
+        self.assertEqual(album.song_count, 0)
+
+    def test_deleted_song_saved_again_is_inserted(self):
+        song = Song.objects.create(
+            title="Track", album=self.album, length=40
+        )
+        song = Song.objects.get(pk=song.pk)
+        song.delete()
+        song.save()
+        self.assertIsNotNone(song.pk)
+        self.assertTrue(Song.objects.filter(pk=song.pk).exists())
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.song_count, 1)
+
+    def test_deferred_field_loaded_later_is_not_dirty(self):
+        album = Album.objects.only("id").get()
+        self.assertEqual(album.title, "Old Title")
+        self.assertEqual(album.changed_fields(), [])
+
+
+class IndexedFieldTests(TestCase):
+    def test_is_indexed_follows_indexes_and_constraints(self):
+        from .filters import is_indexed
+        assert is_indexed(Album, "release_date")
+        assert is_indexed(Album, "title")
+        assert is_indexed(Song, "album")
+        assert not is_indexed(Song, "title")
+
+
+@override_settings(DOTTIFY_RATING_SHARDS=["default", "ratings_1"])
+class RatingShardTests(TestCase):
+    databases = {"default", "ratings_1"}
+
+    def setUp(self):
+        self.even, self.odd = [
+            Album.objects.create(
+                title=f"Sharded {i}",
+                artist_name="Artist",
+                release_date="2025-01-01",
+                retail_price="5.00",
+            )
+            for i in range(2)
+        ]
+        if self.even.pk % 2:
+            self.even, self.odd = self.odd, self.even
+        self.user = DottifyUser.objects.create(
+            user=User.objects.create_user("shard", "s@example.com", "pw"),
+            display_name="Shard",
+        )
+
+    def test_rows_are_stored_in_their_albums_shard(self):
+        Rating.objects.create(album=self.odd, stars=Decimal("4.0"))
+        Comment.objects.create(
+            album=self.odd, user=self.user, comment_text="Nice"
+        )
+        Rating.objects.create(album=self.even, stars=Decimal("2.0"))
+
+        self.assertEqual(Rating.objects.using("ratings_1").count(), 1)
+        self.assertEqual(Rating.objects.using("default").count(), 1)
+        self.assertEqual(self.odd.ratings.get().stars, Decimal("4.0"))
+        self.assertEqual(self.odd.comments.get().user, self.user)
+
+        self.odd.refresh_from_db()
+        self.assertEqual(self.odd.rating_count, 1)
+
+    def test_album_detail_reads_one_shard(self):
+        Rating.objects.create(album=self.odd, stars=Decimal("4.0"))
+        Comment.objects.create(
+            album=self.odd, user=self.user, comment_text="Nice"
+        )
+        with CaptureQueriesContext(connections["ratings_1"]) as shard, \
+                CaptureQueriesContext(connections["default"]) as default:
+            response = self.client.get(
+                reverse("album_detail", kwargs={"pk": self.odd.pk})
+            )
+        self.assertContains(response, "Nice")
+        self.assertContains(response, "4.0")
+        self.assertEqual(len(shard), 2)
+        for query in default:
+            self.assertNotIn("dottify_rating", query["sql"])
+            self.assertNotIn("dottify_comment", query["sql"])
+
+    def test_album_detail_averages(self):
+        Rating.objects.create(album=self.odd, stars=Decimal("1.0"))
+        Rating.objects.for_album(self.odd.pk).update(
+            created_at=timezone.now() - timedelta(days=40)
+        )
+        Rating.objects.create(album=self.odd, stars=Decimal("4.0"))
+        response = self.client.get(
+            reverse("album_detail", kwargs={"pk": self.odd.pk})
+        )
+        self.assertEqual(response.context["average_alltime_str"], "2.5")
+        self.assertEqual(response.context["average_recent_str"], "4.0")
+
+    def test_deleting_album_or_user_clears_shard_rows(self):
+        Comment.objects.create(
+            album=self.odd, user=self.user, comment_text="Nice"
+        )
+        Rating.objects.create(album=self.odd, stars=Decimal("4.0"))
+        self.user.delete()
+        self.assertFalse(Comment.objects.using("ratings_1").exists())
+        self.odd.delete()
+        self.assertFalse(Rating.objects.using("ratings_1").exists())
+
+    def test_rebalance_moves_rows_and_keeps_timestamps(self):
+        with override_settings(DOTTIFY_RATING_SHARDS=["default"]):
+            rating = Rating.objects.create(
+                album=self.odd, stars=Decimal("3.5")
+            )
+            Rating.objects.create(album=self.even, stars=Decimal("1.0"))
+        self.assertEqual(Rating.objects.using("default").count(), 2)
+
+        call_command("rebalance_shards", stdout=StringIO())
+
+        moved = Rating.objects.using("ratings_1").get()
+        self.assertEqual(moved.created_at, rating.created_at)
+        self.assertEqual(moved.stars, Decimal("3.5"))
+        self.assertEqual(
+            list(Rating.objects.using("default").values_list(
+                "album_id", flat=True
+            )),
+            [self.even.pk]
+        )
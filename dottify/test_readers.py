@@ -0,0 +1,75 @@
+from rest_framework.test import APITestCase
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from .models import Album, Song, Playlist, DottifyUser
+
+
+class ReaderParityTests(APITestCase):
+    # The values_list() readers must render exactly what the serializers
+    # render, for every list endpoint and parameter combination.
+
+    def setUp(self):
+        owner = DottifyUser.objects.create(
+            user=User.objects.create_user("owner", "o@example.com", "pw"),
+            display_name="Owner é",
+        )
+        albums = [
+            Album.objects.create(
+                title=f"Album {i}",
+                artist_name="Artist",
+                format=["SNGL", "LIVE", None][i % 3],
+                release_date=f"2024-0{i + 1}-15",
+                retail_price=f"{i}.5",
+                cover_image="covers/a.jpg" if i % 2 else "",
+            )
+            for i in range(4)
+        ]
+        songs = []
+        for album in albums[:3]:
+            for n in range(3):
+                songs.append(Song.objects.create(
+                    title=f"{album.title} track {n}",
+                    album=album,
+                    length=100 + n * 30,
+                ))
+        public = Playlist.objects.create(
+            name="Mix", owner=owner, visibility=2
+        )
+        # Songs from different albums share positions.
+        public.songs.add(*songs)
+        Playlist.objects.create(name="Empty", owner=owner, visibility=2)
+        Playlist.objects.create(name="Hidden", owner=owner, visibility=0)
+        self.album = albums[0]
+
+    def assertSameOutput(self, url):
+        fast = self.client.get(url)
+        with override_settings(DOTTIFY_VALUES_READS=False):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, slow.status_code)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_album_list(self):
+        response = self.assertSameOutput("/api/albums/")
+        self.assertEqual(len(response.json()), 4)
+        self.assertSameOutput("/api/albums/?ordering=-retail_price")
+        self.assertSameOutput("/api/albums/?fields=id,song_set,cover_image")
+        self.assertSameOutput("/api/albums/?format=LIVE")
+        self.assertSameOutput("/api/albums.json")
+
+    def test_song_lists(self):
+        self.assertSameOutput("/api/songs/")
+        self.assertSameOutput("/api/songs/?length__gte=130&ordering=-id")
+        self.assertSameOutput("/api/songs/?fields=title,album")
+        self.assertSameOutput(f"/api/albums/{self.album.id}/songs/")
+
+    def test_playlist_list(self):
+        response = self.assertSameOutput("/api/playlists/")
+        self.assertEqual(len(response.json()[0]["songs"]), 9)
+        self.assertSameOutput("/api/playlists/?fields=songs,owner")
+        self.assertSameOutput("/api/playlists.json")
+
+    def test_album_list_queries_do_not_grow_with_rows(self):
+        with self.assertNumQueries(2):
+            self.client.get("/api/albums/")
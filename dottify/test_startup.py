@@ -0,0 +1,146 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.template import Engine
+from django.test import SimpleTestCase, override_settings
+
+from .management.commands.benchmark_prefork import free_port
+from .management.commands.report_import_time import (
+    COMMAND,
+    Command,
+    import_times
+)
+from .prefork import PreforkServer, PreforkWSGIServer, QuietRequestHandler
+from .templating import default_engine, precompile
+
+WEB_ONLY = ("data_wizard", "crispy_forms", "django.contrib.admin")
+
+
+class ProcessRoleTests(SimpleTestCase):
+
+    def test_import_times_are_parsed(self):
+        rows = import_times(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   django.utils\n"
+            "import time:       300 |        420 | django\n"
+        )
+        self.assertEqual(
+            rows, [(120, 120, 1, "django.utils"), (300, 420, 0, "django")]
+        )
+
+    def test_wsgi_module_imports_in_a_fresh_interpreter(self):
+        # What gunicorn or uwsgi does with MusicDBInc.wsgi:application.
+        env = {**os.environ, "PYTHONPATH": str(settings.BASE_DIR)}
+        env.pop("DJANGO_SETTINGS_MODULE", None)
+        result = subprocess.run(
+            [sys.executable, "-c", "import MusicDBInc.wsgi"],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_api_role_skips_web_only_apps(self):
+        web = {row[3] for row in Command().measure("web")}
+        api = {row[3] for row in Command().measure("api")}
+        self.assertTrue(any(m.startswith(WEB_ONLY) for m in web))
+        self.assertFalse(any(m.startswith(WEB_ONLY) for m in api))
+        self.assertNotIn("rest_framework", api)
+
+    def test_worker_commands_do_not_load_drf(self):
+        worker = {row[3] for row in Command().measure("worker", COMMAND)}
+        self.assertFalse(any(m.startswith("rest_framework") for m in worker))
+
+
+class PreforkTests(SimpleTestCase):
+
+    def test_workers_serve_and_are_recycled(self):
+        port = free_port()
+        server = subprocess.Popen(
+            [
+                sys.executable, str(settings.BASE_DIR / "manage.py"),
+                "runprefork", "--bind", f"127.0.0.1:{port}",
+                "--workers", "1", "--max-requests", "1",
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        url = f"http://127.0.0.1:{port}/accounts/login/"
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    self.assertEqual(urlopen(url).status, 200)
+                    break
+                except URLError:
+                    self.assertLess(time.monotonic(), deadline)
+                    time.sleep(0.05)
+            self.assertEqual(urlopen(url).status, 200)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            output = server.communicate(timeout=10)[0]
+        self.assertIn("Warmed", output)
+        self.assertGreaterEqual(output.count("started"), 2)
+
+    def test_stalled_connections_are_dropped(self):
+        server = PreforkWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+        self.addCleanup(server.server_close)
+        server.connection_timeout = 0.2
+        server.set_app(lambda environ, start_response: [])
+        client = socket.create_connection(server.server_address)
+        self.addCleanup(client.close)
+        started = time.monotonic()
+        server.handle_request()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(server.served, 1)
+
+    def test_stopped_worker_flushes_metrics(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        prefork = PreforkServer(
+            None, ("127.0.0.1", 0), 1, 1000, log=lambda message: None
+        )
+        prefork.server = PreforkWSGIServer(
+            ("127.0.0.1", 0), QuietRequestHandler
+        )
+        self.addCleanup(prefork.server.server_close)
+        with override_settings(DOTTIFY_METRICS_DIR=directory.name):
+            prefork.spawn()
+            (pid,) = prefork.workers
+            time.sleep(0.2)
+            os.kill(pid, signal.SIGTERM)
+            _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertTrue(list(Path(directory.name).glob(f"{pid}-*.json")))
+
+
+class PrecompileTemplateTests(SimpleTestCase):
+
+    def test_dottify_templates_are_cached(self):
+        loaded, errors = precompile()
+        self.assertEqual(errors, {})
+        self.assertIn("album_detail.html", loaded)
+        cached = default_engine().template_loaders[0]
+        self.assertIn("album_detail.html", cached.get_template_cache)
+
+    def test_broken_templates_are_reported(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name)
+        (path / "base.html").write_text("{% block body %}{% endblock %}")
+        (path / "ok.html").write_text('{% extends "base.html" %}')
+        (path / "orphan.html").write_text('{% extends "missing.html" %}')
+        (path / "typo.html").write_text("{% iff x %}{% endif %}")
+
+        loaded, errors = precompile([path], Engine(dirs=[path]))
+        self.assertEqual(loaded, ["base.html", "ok.html"])
+        self.assertEqual(sorted(errors), ["orphan.html", "typo.html"])
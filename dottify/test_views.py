@@ -2,8 +2,10 @@ from datetime import date
 
 from django.test import TestCase
 from django.contrib.auth.models import User, Group
+from django.core.cache import cache
 from django.urls import reverse
 
+from . import metrics
 from .models import Album, Song, Playlist, DottifyUser, Rating, Comment
 
 
@@ -440,3 +442,235 @@ class ViewAndAuthTests(TestCase):
 
         self.assertIsNotNone(public)
         self.assertGreater(public.songs.count(), 0)
+
+
+class CrudQueryCountTests(TestCase):
+    # Session, user, role names and DottifyUser are loaded once per
+    # request; ownership checks compare ids without further queries.
+
+    def setUp(self):
+        artist_group = Group.objects.create(name="Artist")
+        self.artist_user = User.objects.create_user(
+            username="artist",
+            email="artist@user.com",
+            password="password",
+        )
+        self.artist_user.groups.add(artist_group)
+        self.artist_profile = DottifyUser.objects.create(
+            user=self.artist_user,
+            display_name="ArtistUser",
+        )
+        self.album = Album.objects.create(
+            title="Album",
+            artist_name="Artist",
+            artist_account=self.artist_profile,
+            release_date=date.today(),
+            retail_price="5.00",
+        )
+        self.song = Song.objects.create(
+            title="Song",
+            album=self.album,
+            length=120,
+        )
+        self.client.force_login(self.artist_user)
+
+    def album_data(self, title):
+        return {
+            "title": title,
+            "artist_name": "Artist",
+            "retail_price": "5.00",
+            "release_date": "2025-01-01",
+        }
+
+    def test_pages_without_role_checks_skip_role_queries(self):
+        # Session and user only, then the page's own queries.
+        with self.assertNumQueries(3):
+            self.client.get("/api/songs/")
+        with self.assertNumQueries(6):
+            self.client.get(
+                reverse("album_detail", kwargs={"pk": self.album.pk})
+            )
+
+    def test_album_view_query_counts(self):
+        with self.assertNumQueries(4):
+            self.client.get(reverse("album_create"))
+        with self.assertNumQueries(5):
+            self.client.post(reverse("album_create"), self.album_data("New"))
+
+        edit = reverse("album_edit", kwargs={"pk": self.album.pk})
+        with self.assertNumQueries(5):
+            self.client.get(edit)
+        with self.assertNumQueries(6):
+            self.client.post(edit, self.album_data("Edited"))
+
+        with self.assertNumQueries(5):
+            self.client.get(
+                reverse("album_delete", kwargs={"pk": self.album.pk})
+            )
+
+    def test_song_view_query_counts(self):
+        with self.assertNumQueries(5):
+            self.client.get(reverse("song_create"))
+        with self.assertNumQueries(12):
+            self.client.post(reverse("song_create"), {
+                "title": "New", "length": 100, "album": self.album.pk
+            })
+
+        edit = reverse("song_edit", kwargs={"pk": self.song.pk})
+        with self.assertNumQueries(6):
+            self.client.get(edit)
+        # No pre-save lookup: the old album and length were loaded.
+        with self.assertNumQueries(12):
+            self.client.post(edit, {
+                "title": "Edited", "length": 150, "album": self.album.pk
+            })
+
+        delete = reverse("song_delete", kwargs={"pk": self.song.pk})
+        with self.assertNumQueries(5):
+            self.client.get(delete)
+        # Includes the cascade to the song's audio uploads and touching the
+        # owners of playlists that held it.
+        with self.assertNumQueries(11):
+            self.client.post(delete)
+
+
+class CommentPaginationTests(TestCase):
+    def setUp(self):
+        self.album = Album.objects.create(
+            title="Talked About",
+            artist_name="Artist",
+            release_date="2025-01-01",
+            retail_price="5.00",
+        )
+        user = DottifyUser.objects.create(
+            user=User.objects.create_user("fan", "f@example.com", "pw"),
+            display_name="Fan",
+        )
+        Comment.objects.bulk_create(
+            Comment(album=self.album, user=user, comment_text=f"Comment {n}")
+            for n in range(45)
+        )
+
+    def test_album_page_inlines_newest_comments_only(self):
+        response = self.client.get(
+            reverse("album_detail", kwargs={"pk": self.album.pk})
+        )
+        texts = [c.comment_text for c in response.context["comments"]]
+        self.assertEqual(texts, [f"Comment {n}" for n in range(44, 24, -1)])
+        self.assertContains(response, "Load more comments")
+
+    def test_fragment_pages_through_all_comments(self):
+        url = reverse("album_comments", kwargs={"pk": self.album.pk})
+        seen = []
+        before = ""
+        while True:
+            with self.assertNumQueries(3):
+                response = self.client.get(url, {"before": before})
+            seen += [c.comment_text for c in response.context["comments"]]
+            before = response.context["next_cursor"]
+            if before is None:
+                break
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(seen[-1], "Comment 0")
+        self.assertNotContains(response, "Load more comments")
+
+    def test_fragment_rejects_bad_cursor(self):
+        url = reverse("album_comments", kwargs={"pk": self.album.pk})
+        response = self.client.get(url, {"before": "x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class UserPageTests(TestCase):
+    # A profile page costs the profile row on a cache hit and two more
+    # queries (playlists, then songs joined to albums) on a miss.
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        user = User.objects.create_user("fan", "fan@user.com", "password")
+        self.profile = DottifyUser.objects.create(
+            user=user, display_name="Big Fan"
+        )
+        albums = [
+            Album.objects.create(
+                title=f"Album {n}",
+                artist_name="Artist",
+                release_date=date(2024, 1, 1),
+                retail_price="5.00",
+            )
+            for n in range(3)
+        ]
+        self.songs = [
+            Song.objects.create(title=f"Song {n}", album=album, length=100)
+            for n, album in enumerate(albums * 2)
+        ]
+        for n in range(4):
+            playlist = Playlist.objects.create(
+                name=f"Playlist {n}", owner=self.profile
+            )
+            playlist.songs.set(self.songs[n:n + 2])
+        self.url = reverse(
+            "user_detail",
+            kwargs={"pk": self.profile.pk, "display_slug": "big-fan"},
+        )
+
+    def test_query_budget(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertContains(response, "Song 4")
+        self.assertContains(response, "Album 2")
+        with self.assertNumQueries(1):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.content, response.content)
+
+    def test_cache_lookups_are_counted(self):
+        def count(result):
+            key = (
+                "dottify_cache_requests_total",
+                (("cache", "user-page"), ("result", result)),
+            )
+            return metrics._values.get(key, 0)
+
+        hits, misses = count("hit"), count("miss")
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(count("miss") - misses, 1)
+        self.assertEqual(count("hit") - hits, 1)
+
+    def test_playlist_changes_invalidate_the_page(self):
+        self.client.get(self.url)
+        extra = Song.objects.create(
+            title="Encore", album=self.songs[0].album, length=100
+        )
+        Playlist.objects.get(name="Playlist 0").songs.add(extra)
+        self.assertContains(self.client.get(self.url), "Encore")
+
+        extra.playlists.clear()
+        self.assertNotContains(self.client.get(self.url), "Encore")
+
+        Playlist.objects.filter(name="Playlist 3").delete()
+        self.assertNotContains(self.client.get(self.url), "Playlist 3")
+
+    def test_deleting_songs_invalidates_the_page(self):
+        self.assertContains(self.client.get(self.url), "Song 0")
+        self.songs[0].delete()
+        self.assertNotContains(self.client.get(self.url), "Song 0")
+
+        self.assertContains(self.client.get(self.url), "Album 1")
+        self.songs[1].album.delete()
+        self.assertNotContains(self.client.get(self.url), "Album 1")
+
+    def test_slug_is_stored_and_follows_renames(self):
+        self.assertEqual(self.profile.display_slug, "big-fan")
+        self.profile.display_name = "Bigger Fan"
+        self.profile.save(update_fields=["display_name"])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.display_slug, "bigger-fan")
+        self.assertRedirects(
+            self.client.get(self.url),
+            f"/users/{self.profile.pk}/bigger-fan/",
+        )
+        self.assertRedirects(
+            self.client.get(f"/users/{self.profile.pk}/"),
+            f"/users/{self.profile.pk}/bigger-fan/",
+        )
@@ -0,0 +1,24 @@
+# The test runner (settings.TEST_RUNNER). Files the app keeps under
+# BASE_DIR, such as the throttle buckets, go to a temporary directory
+# instead, so one test run cannot leave state behind for the next.
+
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class DottifyTestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.state_dir = tempfile.TemporaryDirectory()
+        state = Path(self.state_dir.name)
+        settings.DOTTIFY_THROTTLE_SQLITE_PATH = state / "throttle.sqlite3"
+        settings.DOTTIFY_RATING_LOG_DIR = state / "rating_log"
+        settings.DOTTIFY_AUDIO_UPLOAD_DIR = state / "audio_uploads"
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        self.state_dir.cleanup()
@@ -0,0 +1,210 @@
+# Token bucket throttles for the API.
+#
+# Rates use DRF's "<count>/<period>" syntax in REST_FRAMEWORK's
+# DEFAULT_THROTTLE_RATES: a bucket holds <count> tokens and refills at
+# <count> per <period>, so clients can burst up to the full count.
+#
+#   ip      every request, keyed by client address (needs no DB access;
+#           X-Forwarded-For only counts behind NUM_PROXIES proxies)
+#   user    authenticated requests, keyed by user id
+#   <scope> the view's throttle_scope, keyed by user id or address
+#
+# Buckets must be shared by every worker process. DOTTIFY_THROTTLE_STORE
+# picks where they live: "cache" uses the default Django cache, "sqlite"
+# a small SQLite file at DOTTIFY_THROTTLE_SQLITE_PATH, and "auto" (the
+# default) uses the cache unless it is process-local (locmem/dummy). The
+# SQLite path must be set explicitly (checks.py): a file in a shared
+# directory such as /tmp could be created or replaced by another user.
+
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    count, period = rate.split("/")
+    return int(count), PERIODS[period[0]]
+
+
+def take_token(state, capacity, refill, now):
+    # Returns (allowed, wait, new_state) for a (tokens, updated) state.
+    tokens, updated = state if state else (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * refill)
+    if tokens >= 1:
+        return True, 0, (tokens - 1, now)
+    return False, (1 - tokens) / refill, (tokens, now)
+
+
+class CacheBucketStore:
+    # Read-modify-write on the Django cache. Concurrent requests for the
+    # same key can both take the last token, which is fine for throttling.
+
+    def consume(self, key, capacity, refill):
+        now = time.time()
+        allowed, wait, state = take_token(
+            cache.get(key), capacity, refill, now
+        )
+        cache.set(key, state, timeout=int(capacity / refill) + 1)
+        return allowed, wait
+
+
+class SQLiteBucketStore:
+    # One row per bucket, updated under BEGIN IMMEDIATE so that workers
+    # sharing the file serialise on it.
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+            )
+            self.local.conn = conn
+        return conn
+
+    def consume(self, key, capacity, refill):
+        now = time.time()
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+            ).fetchone()
+            allowed, wait, state = take_token(state, capacity, refill, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)",
+                (key, *state)
+            )
+            if random.random() < 0.001:
+                conn.execute(
+                    "DELETE FROM buckets WHERE updated < ?", (now - 86400,)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, wait
+
+
+_stores = {}
+
+
+def store_kind():
+    kind = getattr(settings, "DOTTIFY_THROTTLE_STORE", "auto")
+    if kind == "auto":
+        backend = settings.CACHES["default"]["BACKEND"]
+        kind = "sqlite" if backend in LOCAL_CACHES else "cache"
+    return kind
+
+
+def get_store():
+    if store_kind() == "cache":
+        return CacheBucketStore()
+    path = getattr(settings, "DOTTIFY_THROTTLE_SQLITE_PATH", None)
+    if path is None:
+        raise ImproperlyConfigured(
+            "Set DOTTIFY_THROTTLE_SQLITE_PATH for the SQLite throttle store"
+        )
+    if path not in _stores:
+        _stores[path] = SQLiteBucketStore(path)
+    return _stores[path]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+
+    def get_scope(self, view):
+        return self.scope
+
+    def get_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        scope = self.get_scope(view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if scope is None or rate is None:
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+
+        capacity, period = parse_rate(rate)
+        try:
+            allowed, self.wait_time = get_store().consume(
+                f"throttle:{scope}:{key}", capacity, capacity / period
+            )
+        except sqlite3.Error:
+            logger.warning("Throttle store unavailable", exc_info=True)
+            return True
+        return allowed
+
+    def wait(self):
+        return self.wait_time
+
+
+class IPBucketThrottle(TokenBucketThrottle):
+    scope = "ip"
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class UserBucketThrottle(TokenBucketThrottle):
+    scope = "user"
+
+    def get_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class ScopedBucketThrottle(TokenBucketThrottle):
+
+    def get_scope(self, view):
+        return getattr(view, "throttle_scope", None)
+
+    def get_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+
+class ThrottleFirstMixin:
+    # Throttles run before authentication and permission checks, and stop
+    # at the first bucket that is empty, so a rejected request costs no
+    # DB queries as long as the IP bucket is the one that rejects it.
+
+    def initial(self, request, *args, **kwargs):
+        self.check_throttles(request)
+        self.throttles_checked = True
+        super().initial(request, *args, **kwargs)
+
+    def check_throttles(self, request):
+        if getattr(self, "throttles_checked", False):
+            return
+        for throttle in self.get_throttles():
+            if not throttle.allow_request(request, self):
+                self.throttled(request, throttle.wait())
@@ -1,20 +1,15 @@
 # Write your URL patterns here.
 
-from django.urls import path, include
-from rest_framework_nested import routers
+from django.conf import settings
+from django.urls import path
 
 # Write your URL patterns here.
 
-from .api_views import (
-    AlbumViewSet,
-    SongViewSet,
-    PlaylistViewSet,
-    NestedSongViewSet,
-    StatisticsAPIView
-)
+from . import api_urls
 from .views import (
     home,
     album_search,
+    album_comments,
     album_detail,
     AlbumCreateView,
     AlbumUpdateView,
@@ -24,17 +19,10 @@ from .views import (
     SongUpdateView,
     SongDeleteView,
     UserRedirectView,
-    UserDetailView
+    UserDetailView,
+    media_file
 )
 
-router = routers.DefaultRouter()
-router.register(r'albums', AlbumViewSet, basename="album")
-router.register(r'songs', SongViewSet, basename="song")
-router.register(r'playlists', PlaylistViewSet, basename="playlist")
-
-album_router = routers.NestedSimpleRouter(router, r'albums', lookup='album')
-album_router.register(r'songs', NestedSongViewSet, basename='album_songs')
-
 urlpatterns = [
     path("", home, name="home"),
 
@@ -53,6 +41,11 @@ urlpatterns = [
     ),
 
     path("albums/<int:pk>/", album_detail, name="album_detail"),
+    path(
+        "albums/<int:pk>/comments/",
+        album_comments,
+        name="album_comments"
+    ),
     path(
         "albums/<int:pk>/<slug:slug>/",
         album_detail,
@@ -92,10 +85,10 @@ urlpatterns = [
         ),
 
     path(
-        "api/statistics/",
-        StatisticsAPIView.as_view(),
-        name="api-statistics"
+        settings.MEDIA_URL.lstrip("/") + "<path:name>",
+        media_file,
+        name="media_file"
         ),
-    path("api/", include(router.urls)),
-    path("api/", include(album_router.urls)),
+
+    *api_urls.urlpatterns,
 ]
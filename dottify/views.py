@@ -1,32 +1,43 @@
+import hmac
 from datetime import timedelta
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import CreateView, UpdateView, DeleteView, DetailView
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden
+)
 from django.urls import reverse, reverse_lazy
-from django.utils.text import slugify
 from django.utils import timezone
 from django.contrib import messages
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Prefetch
 from django.utils.translation import gettext_lazy as _
+from django.views.decorators.http import require_safe
 
+from . import metrics
+
+from .comments import comment_page, parse_cursor
+from .media import media_response
 from .forms import AlbumForm, SongForm
-from .models import Album, Song, Playlist, DottifyUser, Rating, Comment
+from .models import Album, Song, Playlist, DottifyUser, Rating
+from .recommendations import similar_songs
+from .permissions import can_edit_album, can_manage_music, editable_albums
+from .roles import is_admin, is_artist, owns_album, user_profile
 
 # Create your views here.
 
 
-def is_admin(user):
-    return (
-        user.is_authenticated
-        and user.groups.filter(name="DottifyAdmin").exists()
-    )
-
+class CachedObjectMixin:
+    # dispatch() loads the object for the ownership check; reuse it in
+    # get()/post() instead of fetching it a second time.
 
-def is_artist(user):
-    return (
-        user.is_authenticated
-        and user.groups.filter(name="Artist").exists()
-    )
+    def get_object(self, queryset=None):
+        if queryset is None and getattr(self, "object", None) is not None:
+            return self.object
+        return super().get_object(queryset)
 
 
 def home(request):
@@ -53,7 +64,7 @@ def home(request):
         )
 
     if is_artist(user) and not is_admin(user):
-        albums = Album.objects.filter(artist_account__user=user)
+        albums = editable_albums(user)
         return render(
             request,
             "home.html",
@@ -101,7 +112,7 @@ class AlbumCreateView(LoginRequiredMixin, CreateView):
 
     def dispatch(self, request, *args, **kwargs):
         user = self.request.user
-        if not (is_artist(user) or is_admin(user)):
+        if not can_manage_music(user):
             return HttpResponseForbidden(
                 "You must be an artist or DottifyAdmin"
             )
@@ -110,7 +121,7 @@ class AlbumCreateView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         user = self.request.user
         if is_artist(user):
-            profile = DottifyUser.objects.filter(user=user).first()
+            profile = user_profile(user)
             if not profile:
                 return HttpResponseForbidden("Artist profile missing.")
             form.instance.artist_account = profile
@@ -129,33 +140,19 @@ class AlbumCreateView(LoginRequiredMixin, CreateView):
 def album_detail(request, pk, slug=None):
     album = get_object_or_404(Album, pk=pk)
     songs = album.songs.all()
-    comments = Comment.objects.filter(album=album).select_related("user")
-    ratings = Rating.objects.filter(album=album)
-
-    total_alltime = 0
-    count_alltime = 0
-    for r in ratings:
-        total_alltime += float(r.stars)
-        count_alltime += 1
-
-    if count_alltime > 0:
-        average_alltime = total_alltime / count_alltime
+    comments, next_cursor = comment_page(album.pk)
+    # The all-time average comes from the album's summary columns; only the
+    # last 30 days need the shard.
+    if album.rating_count:
+        average_alltime = album.rating_sum / album.rating_count
     else:
         average_alltime = 0
     average_alltime_str = f"{average_alltime:.1f}"
 
     cutoff = timezone.now() - timedelta(days=30)
-    total_recent = 0
-    count_recent = 0
-    for r in ratings:
-        if r.created_at >= cutoff:
-            total_recent += float(r.stars)
-            count_recent += 1
-
-    if count_recent > 0:
-        average_recent = total_recent / count_recent
-    else:
-        average_recent = 0.0
+    average_recent = Rating.objects.for_album(album.pk).filter(
+        created_at__gte=cutoff
+    ).aggregate(average=Avg("stars"))["average"] or 0.0
     average_recent_str = f"{average_recent:.1f}"
 
     return render(
@@ -163,30 +160,45 @@ def album_detail(request, pk, slug=None):
         "album_detail.html",
         {
             "album": album, "songs": songs, "comments": comments,
+            "next_cursor": next_cursor,
             "average_alltime_str": average_alltime_str,
             "average_recent_str": average_recent_str
         },
     )
 
 
-class AlbumUpdateView(LoginRequiredMixin, UpdateView):
+def album_comments(request, pk):
+    # The next page of comments as <li> items, for "load more".
+    try:
+        before = parse_cursor(request.GET.get("before"))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor")
+    get_object_or_404(Album.objects.only("id"), pk=pk)
+    comments, next_cursor = comment_page(pk, before)
+    return render(
+        request,
+        "comment_items.html",
+        {
+            "comments": comments, "next_cursor": next_cursor,
+            "album_id": pk, "before": before
+        },
+    )
+
+
+class AlbumUpdateView(LoginRequiredMixin, CachedObjectMixin, UpdateView):
     model = Album
     form_class = AlbumForm
     template_name = "album_form.html"
 
     def dispatch(self, request, *args, **kwargs):
         user = self.request.user
-        if not (is_artist(user) or is_admin(user)):
+        if not can_manage_music(user):
             return HttpResponseForbidden(
                 "You must be an artist or DottifyAdmin"
             )
         self.object = self.get_object()
-        if is_artist(user) and not is_admin(user):
-            if (
-                not self.object.artist_account
-                or self.object.artist_account.user_id != user.id
-            ):
-                return HttpResponseForbidden("You dont own the album")
+        if not can_edit_album(user, self.object):
+            return HttpResponseForbidden("You dont own the album")
         return super().dispatch(request, *args, **kwargs)
 
     def form_valid(self, form):
@@ -201,7 +213,7 @@ class AlbumUpdateView(LoginRequiredMixin, UpdateView):
         return reverse("album_detail", args=[self.object.pk])
 
 
-class AlbumDeleteView(LoginRequiredMixin, DeleteView):
+class AlbumDeleteView(LoginRequiredMixin, CachedObjectMixin, DeleteView):
     model = Album
     template_name = "album_delete.html"
     success_url = reverse_lazy("home")
@@ -209,14 +221,8 @@ class AlbumDeleteView(LoginRequiredMixin, DeleteView):
     def dispatch(self, request, *args, **kwargs):
         self.object = self.get_object()
         user = self.request.user
-        if is_admin(user):
+        if can_edit_album(user, self.object):
             return super().dispatch(request, *args, **kwargs)
-        if is_artist(user):
-            if (
-                self.object.artist_account
-                and self.object.artist_account.user_id == user.id
-            ):
-                return super().dispatch(request, *args, **kwargs)
         return HttpResponseForbidden("You cant delete this album")
 
     def delete(self, request, *args, **kwargs):
@@ -231,7 +237,7 @@ class SongCreateView(LoginRequiredMixin, CreateView):
 
     def dispatch(self, request, *args, **kwargs):
         user = self.request.user
-        if not (is_artist(user) or is_admin(user)):
+        if not can_manage_music(user):
             return HttpResponseForbidden(
                 "You must be an artist or DottifyAdmin"
             )
@@ -240,12 +246,10 @@ class SongCreateView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         user = self.request.user
         if is_artist(user):
-            profile = DottifyUser.objects.filter(user=user).first()
-            if not profile:
+            if not user_profile(user):
                 return HttpResponseForbidden("Artist profile missing.")
 
-            album = form.instance.album
-            if not album or album.artist_account_id != profile.id:
+            if not owns_album(user, form.instance.album):
                 return HttpResponseForbidden(
                     "You can only add songs to your own album"
                 )
@@ -264,43 +268,36 @@ class SongDetailView(DetailView):
     model = Song
     template_name = "song_detail.html"
 
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["similar_songs"] = similar_songs(self.object.pk)
+        return ctx
+
 
-class SongUpdateView(LoginRequiredMixin, UpdateView):
-    model = Song
+class SongUpdateView(LoginRequiredMixin, CachedObjectMixin, UpdateView):
+    queryset = Song.objects.select_related("album")
     form_class = SongForm
     template_name = "song_form.html"
 
     def dispatch(self, request, *args, **kwargs):
         user = self.request.user
-        if not (is_artist(user) or is_admin(user)):
+        if not can_manage_music(user):
             return HttpResponseForbidden(
                 "You must be an artist or DottifyAdmin"
             )
         self.object = self.get_object()
-        if is_artist(user) and not is_admin(user):
-            album = self.object.album
-            if (
-                not album
-                or not album.artist_account
-                or album.artist_account.user_id != user.id
-            ):
-                return HttpResponseForbidden(
-                    "You are not allowed to edit this song"
-                )
+        if not can_edit_album(user, self.object.album):
+            return HttpResponseForbidden(
+                "You are not allowed to edit this song"
+            )
         return super().dispatch(request, *args, **kwargs)
 
     def form_valid(self, form):
         user = self.request.user
-        if is_artist(user) and not is_admin(user):
-            album = form.instance.album
-            if (
-                not album
-                or not album.artist_account
-                or album.artist_account.user_id != user.id
-            ):
-                return HttpResponseForbidden(
-                    "You can only move songs within your own albums."
-                )
+        if not can_edit_album(user, form.instance.album):
+            return HttpResponseForbidden(
+                "You can only move songs within your own albums."
+            )
         messages.success(self.request, _("Song updated successfully."))
         return super().form_valid(form)
 
@@ -312,32 +309,23 @@ class SongUpdateView(LoginRequiredMixin, UpdateView):
         return reverse("song_detail", args=[self.object.pk])
 
 
-class SongDeleteView(LoginRequiredMixin, DeleteView):
-    model = Song
+class SongDeleteView(LoginRequiredMixin, CachedObjectMixin, DeleteView):
+    queryset = Song.objects.select_related("album")
     template_name = "song_delete.html"
     success_url = reverse_lazy("home")
 
     def dispatch(self, request, *args, **kwargs):
         user = self.request.user
 
-        if not (is_artist(user) or is_admin(user)):
+        if not can_manage_music(user):
             return HttpResponseForbidden(
                 "You must be an artist or DottifyAdmin"
             )
 
         self.object = self.get_object()
 
-        if is_admin(user):
+        if can_edit_album(user, self.object.album):
             return super().dispatch(request, *args, **kwargs)
-
-        if is_artist(user):
-            album = self.object.album
-            if (
-                album
-                and album.artist_account
-                and album.artist_account.user_id == user.id
-            ):
-                return super().dispatch(request, *args, **kwargs)
         return HttpResponseForbidden("You cant delete this Song")
 
     def delete(self, request, *args, **kwargs):
@@ -350,25 +338,53 @@ class UserRedirectView(DetailView):
 
     def get(self, request, *args, **kwargs):
         pk = kwargs["pk"]
-        profile = get_object_or_404(DottifyUser, pk=pk)
+        profile = get_object_or_404(
+            DottifyUser.objects.only("display_slug"), pk=pk
+        )
         return redirect(
             "user_detail",
             pk=pk,
-            display_slug=slugify(profile.display_name)
+            display_slug=profile.display_slug
+        )
+
+
+def profile_playlists(profile):
+    # The playlists with their songs and albums, cached per profile under
+    # its playlists_changed_at, which signals.py sets on playlist changes.
+    # Song and album renames show once DOTTIFY_PROFILE_CACHE_SECONDS pass.
+    changed = profile.playlists_changed_at
+    key = (
+        f"dottify:user-page:{profile.pk}:"
+        f"{changed.timestamp() if changed else 0}"
+    )
+    playlists = cache.get(key)
+    metrics.record_cache("user-page", playlists is not None)
+    if playlists is None:
+        songs = Song.objects.select_related("album").only(
+            "id", "title", "album__id", "album__title"
+        )
+        playlists = list(
+            Playlist.objects.filter(owner=profile)
+            .order_by("id")
+            .prefetch_related(Prefetch("songs", queryset=songs))
         )
+        cache.set(
+            key,
+            playlists,
+            getattr(settings, "DOTTIFY_PROFILE_CACHE_SECONDS", 300)
+        )
+    return playlists
 
 
-class UserDetailView(DetailView):
+class UserDetailView(CachedObjectMixin, DetailView):
+    # One query for the profile on a cache hit, three on a miss.
     model = DottifyUser
     template_name = "user_detail.html"
     context_object_name = "profile"
 
-    def get_object(self, queryset=None):
-        return get_object_or_404(DottifyUser, pk=self.kwargs["pk"])
-
     def dispatch(self, request, *args, **kwargs):
         self.object = self.get_object()
-        correct = slugify(self.object.display_name)
+        correct = self.object.display_slug
         if self.kwargs.get("display_slug") != correct:
             return redirect(
                 "user_detail",
@@ -379,5 +395,29 @@ class UserDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        ctx["playlists"] = Playlist.objects.filter(owner=self.object)
+        ctx["playlists"] = profile_playlists(self.object)
         return ctx
+
+
+@require_safe
+def media_file(request, name):
+    return media_response(request, name)
+
+
+def metrics_view(request):
+    # Staff, or a scraper sending "Authorization: Bearer <token>". The peer
+    # address is not trusted: behind a proxy every request is local.
+    token = getattr(settings, "DOTTIFY_METRICS_TOKEN", None)
+    sent = request.headers.get("Authorization", "")
+    if not (
+        request.user.is_staff
+        or (
+            token
+            and hmac.compare_digest(sent.encode(), f"Bearer {token}".encode())
+        )
+    ):
+        return HttpResponseForbidden("Metrics are internal only")
+    return HttpResponse(
+        metrics.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
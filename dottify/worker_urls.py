@@ -0,0 +1,5 @@
+# ROOT_URLCONF for the worker role (see settings.py). Workers serve no
+# requests, and Django's URL checks, which most commands run, would
+# otherwise import the API views and DRF.
+
+urlpatterns = []